@@ -0,0 +1,268 @@
+"""接口基准：在几种规模的合成数据上测量 main.py 中每个接口的冷/热耗时，输出 JSON 报告
+
+用法：
+    python -m benchmarks.bench_endpoints [--sizes 20,200,1000] [--repeat 5] [--output report.json]
+                                         [--messages N] [--tool-result-size BYTES] [--cjk-ratio R]
+                                         [--compare 旧报告.json] [--threshold 1.25]
+
+对每个规模（每个来源的会话数）用 benchmarks.corpus 生成数据，然后：
+    - 冷：每个接口在新的子进程、空的索引缓存中作为第一个请求执行（包含建索引、解析等首次开销）
+    - 热：同一子进程中依次请求所有接口，先预热一次，再重复 --repeat 次取最小值/中位数/p95
+子进程的 HOME 指向生成的数据，SESSION_VIEWER_CACHE_DIR 指向临时目录；默认关闭后台监听
+（SESSION_VIEWER_WATCH=off，请求中检查文件变化），--watch 时使用默认的监听方式。
+
+报告包含运行环境、生成参数、每个规模的数据量和每个接口的状态码、响应字节数和耗时（毫秒）。
+指定 --compare 时与旧报告逐项对比热耗时中位数，超过 --threshold 倍的接口视为退化，退出码为 1。
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.corpus import CorpusOptions, generate_corpus
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+SOURCES = ("claude", "codex", "gemini")
+
+# (名称, 路径模板)；{id}/{tool}/{q} 取自 corpus.json 中的样本，每个来源各测一次
+ENDPOINTS = [
+    ("sessions", "/api/sessions?source={source}"),
+    ("projects", "/api/projects?source={source}"),
+    ("detail", "/api/sessions/{id}?source={source}"),
+    ("messages", "/api/sessions/{id}/messages?source={source}&limit=50"),
+    ("tool_result", "/api/sessions/{id}/tool-results/{tool}?source={source}"),
+    ("context", "/api/sessions/{id}/context?source={source}"),
+    ("search", "/api/search?q={q}&source={source}"),
+    ("search_stream", "/api/search/stream?q={q}&source={source}"),
+    ("usage_summary", "/api/usage/summary?source={source}"),
+    ("usage_detail", "/api/usage/detail?source={source}&days=30"),
+]
+
+
+def endpoint_requests(manifest: dict) -> List[Tuple[str, str, str]]:
+    """返回 [(名称, 来源, URL)]，包含根路径"""
+    requests = [("root", "-", "/")]
+    query = manifest["search_terms"][0]
+    for source in SOURCES:
+        sample = manifest["samples"].get(source)
+        if not sample or not sample["session_id"]:
+            continue
+        for name, template in ENDPOINTS:
+            if "{tool}" in template and not sample["tool_id"]:
+                continue
+            url = template.format(source=source, id=sample["session_id"], tool=sample["tool_id"], q=query)
+            requests.append((name, source, url))
+    return requests
+
+
+# ---------- 子进程：实际发送请求 ----------
+
+def run_worker(home: str, urls: List[str], repeat: int) -> List[dict]:
+    """在当前进程中加载应用并依次请求 urls；repeat 为 0 时只测第一次请求"""
+    from fastapi.testclient import TestClient
+    import main
+
+    results = []
+    with TestClient(main.app) as client:
+        for url in urls:
+            start = time.perf_counter()
+            response = client.get(url)
+            first_ms = (time.perf_counter() - start) * 1000
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+            results.append({
+                "url": url,
+                "status": response.status_code,
+                "bytes": len(response.content),
+                "first_ms": first_ms,
+                "timings_ms": timings,
+            })
+    return results
+
+
+def spawn_worker(home: Path, urls: List[str], repeat: int, watch: bool) -> List[dict]:
+    """在新的子进程（空的索引缓存）中执行 run_worker"""
+    cache_dir = tempfile.mkdtemp(prefix="bench-cache-")
+    env = dict(os.environ, HOME=str(home), SESSION_VIEWER_CACHE_DIR=cache_dir)
+    if not watch:
+        env["SESSION_VIEWER_WATCH"] = "off"
+    try:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_endpoints", "--worker", str(home), "--repeat", str(repeat)],
+            input=json.dumps(urls), capture_output=True, text=True, cwd=BACKEND_DIR, env=env, check=True,
+        ).stdout
+    except subprocess.CalledProcessError as e:
+        print(f"Error running benchmark worker: {e.stderr[-2000:]}")
+        raise
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# ---------- 主进程：生成数据、汇总报告 ----------
+
+def summarize_timings(timings: List[float]) -> Optional[Dict[str, float]]:
+    if not timings:
+        return None
+    ordered = sorted(timings)
+    return {
+        "min": round(ordered[0], 3),
+        "median": round(statistics.median(ordered), 3),
+        "p95": round(ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))], 3),
+    }
+
+
+def bench_size(workdir: Path, options: CorpusOptions, repeat: int, watch: bool) -> dict:
+    home = workdir / f"sessions-{options.sessions}"
+    shutil.rmtree(home, ignore_errors=True)
+    start = time.perf_counter()
+    manifest = generate_corpus(home, options)
+    print(f"[{options.sessions} sessions/source] generated {manifest['files']} files, "
+          f"{manifest['bytes'] / 1e6:.1f} MB in {time.perf_counter() - start:.1f}s")
+
+    requests = endpoint_requests(manifest)
+    urls = [url for _, _, url in requests]
+    cold = [spawn_worker(home, [url], 0, watch)[0] for url in urls]
+    warm = spawn_worker(home, urls, repeat, watch)
+
+    endpoints = []
+    for (name, source, url), cold_result, warm_result in zip(requests, cold, warm):
+        endpoints.append({
+            "name": name,
+            "source": source,
+            "url": url,
+            "status": warm_result["status"],
+            "bytes": warm_result["bytes"],
+            "cold_ms": round(cold_result["first_ms"], 3),
+            "warm_ms": summarize_timings(warm_result["timings_ms"]),
+        })
+    return {
+        "sessions_per_source": options.sessions,
+        "corpus": {"files": manifest["files"], "bytes": manifest["bytes"], "samples": manifest["samples"]},
+        "endpoints": endpoints,
+    }
+
+
+def print_run(run: dict) -> None:
+    print(f"  {'endpoint':<14} {'source':<7} {'status':>6} {'bytes':>10} {'cold ms':>9} "
+          f"{'warm min':>9} {'median':>9} {'p95':>9}")
+    for e in run["endpoints"]:
+        warm = e["warm_ms"] or {"min": 0, "median": 0, "p95": 0}
+        print(f"  {e['name']:<14} {e['source']:<7} {e['status']:>6} {e['bytes']:>10} {e['cold_ms']:>9.1f} "
+              f"{warm['min']:>9.2f} {warm['median']:>9.2f} {warm['p95']:>9.2f}")
+    print()
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=BACKEND_DIR, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(report: dict, baseline: dict, threshold: float) -> List[str]:
+    """对比热耗时中位数，返回退化的接口描述"""
+    def index(r: dict) -> Dict[Tuple[int, str, str], dict]:
+        return {
+            (run["sessions_per_source"], e["name"], e["source"]): e
+            for run in r["runs"] for e in run["endpoints"]
+        }
+
+    old = index(baseline)
+    regressions = []
+    for key, e in sorted(index(report).items()):
+        before = old.get(key)
+        if not before or not before["warm_ms"] or not e["warm_ms"]:
+            continue
+        ratio = e["warm_ms"]["median"] / max(before["warm_ms"]["median"], 1e-6)
+        cold_ratio = e["cold_ms"] / max(before["cold_ms"], 1e-6)
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"  {key[0]:>6} {key[1]:<14} {key[2]:<7} warm x{ratio:5.2f}  cold x{cold_ratio:5.2f}{flag}")
+        if flag:
+            regressions.append(f"{key[1]} ({key[2]}, {key[0]} sessions): warm median x{ratio:.2f}")
+    return regressions
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    defaults = CorpusOptions()
+    arg_parser.add_argument("--sizes", default="20,200,1000", help="每个来源的会话数，逗号分隔")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="热请求的重复次数")
+    arg_parser.add_argument("--messages", type=int, default=defaults.messages)
+    arg_parser.add_argument("--tool-result-size", type=int, default=defaults.tool_result_size)
+    arg_parser.add_argument("--cjk-ratio", type=float, default=defaults.cjk_ratio)
+    arg_parser.add_argument("--seed", type=int, default=defaults.seed)
+    arg_parser.add_argument("--workdir", help="生成数据的目录（默认临时目录，结束后删除）")
+    arg_parser.add_argument("--output", default="bench-report.json", help="JSON 报告路径")
+    arg_parser.add_argument("--compare", help="与旧报告对比")
+    arg_parser.add_argument("--threshold", type=float, default=1.25, help="热耗时中位数超过旧报告的倍数视为退化")
+    arg_parser.add_argument("--watch", action="store_true", help="使用后台监听（默认关闭）")
+    arg_parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.worker:
+        # 子进程：从标准输入读取 URL 列表，结果以一行 JSON 输出
+        results = run_worker(args.worker, json.loads(sys.stdin.read()), args.repeat)
+        print(json.dumps(results))
+        return
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="bench-corpus-"))
+    sizes = [int(x) for x in args.sizes.split(",") if x]
+    report = {
+        "generated_at": datetime.now().astimezone().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "watch": args.watch,
+        "repeat": args.repeat,
+        "options": {
+            "messages": args.messages,
+            "tool_result_size": args.tool_result_size,
+            "cjk_ratio": args.cjk_ratio,
+            "seed": args.seed,
+        },
+        "runs": [],
+    }
+    try:
+        for size in sizes:
+            options = CorpusOptions(
+                sessions=size, messages=args.messages, tool_result_size=args.tool_result_size,
+                cjk_ratio=args.cjk_ratio, seed=args.seed,
+            )
+            run = bench_size(workdir, options, args.repeat, args.watch)
+            print_run(run)
+            report["runs"].append(run)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"Report written to {args.output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare_reports(report, baseline, args.threshold)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""内部记录基准：解析时构建 Pydantic 模型（旧做法）与 __slots__ 记录（现做法）的对比
+
+用法：
+    python -m benchmarks.bench_records [会话目录] [--top N] [--repeat N]
+
+默认取 ~/.claude/projects 下最大的 N 个会话文件，用同一个会话详情解析器分别解析：
+    - pydantic：把解析器中的记录类型替换回带校验的 Message / ToolCall / SessionDetail（旧做法）
+    - records：MessageRecord / ToolCallRecord / SessionRecord（现做法）
+输出每秒构建的对象数（消息 + 工具调用）和解析结果每条消息常驻的字节数（tracemalloc，含消息文本），
+以及在 API 边界把记录转换为 Pydantic 模型（to_model）或直接转换为响应结构（to_dict）的耗时。
+最后对摘要索引中的全部会话，对比读取时构建 SessionSummary 与 SummaryRecord。
+"""
+import argparse
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+import parser as claude_parser
+import session_index
+from common import parse_jsonl_with
+from models import ToolCall, Message, FileChange, SessionSummary, SessionDetail
+from records import TOOL_RESULT_PREVIEW_CHARS
+
+
+class LegacyToolCall(ToolCall):
+    """旧做法：工具调用直接是 Pydantic 模型"""
+
+    def set_result(self, result: Optional[str]) -> None:
+        if result is None:
+            self.result, self.result_size, self.result_truncated = None, None, False
+            return
+        self.result_size = len(result.encode("utf-8"))
+        self.result_truncated = len(result) > TOOL_RESULT_PREVIEW_CHARS
+        self.result = result[:TOOL_RESULT_PREVIEW_CHARS]
+
+
+@contextmanager
+def pydantic_models() -> Iterator[None]:
+    """临时把解析器中的记录类型替换为 Pydantic 模型（构造参数相同）"""
+    patches = [
+        (claude_parser, "ToolCallRecord", LegacyToolCall),
+        (claude_parser, "MessageRecord", Message),
+        (claude_parser, "FileChangeRecord", FileChange),
+        (claude_parser, "SessionRecord", SessionDetail),
+        (session_index, "SummaryRecord", SessionSummary),
+    ]
+    saved = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, value in patches:
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+
+
+def best_of(func: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    """返回 (最佳耗时秒数, 结果)"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def retained_bytes(func: Callable[[], Any]) -> Tuple[int, Any]:
+    """返回 (结果常驻的字节数, 结果)"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        return tracemalloc.get_traced_memory()[0] - before, result
+    finally:
+        tracemalloc.stop()
+
+
+def count_objects(detail: Any) -> Tuple[int, int]:
+    messages = len(detail.messages)
+    return messages, messages + sum(len(m.tool_calls or []) for m in detail.messages)
+
+
+def largest_sessions(root: Path, top: int) -> List[Path]:
+    files = [p for p in root.glob("*/*.jsonl") if not p.stem.startswith("agent-")] if root.exists() else []
+    return sorted(files, key=lambda p: p.stat().st_size, reverse=True)[:top]
+
+
+def bench_session(path: Path, repeat: int) -> None:
+    parse = lambda: parse_jsonl_with(claude_parser.detail_parser, path)
+    detail = parse()
+    if detail is None:
+        return
+    messages, objects = count_objects(detail)
+    print(f"{path.name}: {messages} messages, {objects - messages} tool calls, "
+          f"file {path.stat().st_size / 1e6:.1f} MB")
+    print(f"  {'variant':<9} {'parse ms':>9} {'objects/s':>11} {'bytes/msg':>10}")
+
+    for variant in ("pydantic", "records"):
+        if variant == "pydantic":
+            with pydantic_models():
+                seconds, _ = best_of(parse, repeat)
+                size, _ = retained_bytes(parse)
+        else:
+            seconds, _ = best_of(parse, repeat)
+            size, _ = retained_bytes(parse)
+        print(f"  {variant:<9} {seconds * 1000:9.1f} {objects / seconds:11,.0f} {size / messages:10,.0f}")
+
+    for name in ("to_model", "to_dict"):
+        seconds, _ = best_of(getattr(detail, name), repeat)
+        print(f"  {name:<9} {seconds * 1000:9.1f} {objects / seconds:11,.0f}")
+    print()
+
+
+def bench_summaries(repeat: int) -> None:
+    index = claude_parser.summary_index
+    index.refresh()
+    for variant in ("pydantic", "records"):
+        if variant == "pydantic":
+            with pydantic_models():
+                seconds, sessions = best_of(lambda: index.sessions(refresh=False), repeat)
+                size, _ = retained_bytes(lambda: index.sessions(refresh=False))
+        else:
+            seconds, sessions = best_of(lambda: index.sessions(refresh=False), repeat)
+            size, _ = retained_bytes(lambda: index.sessions(refresh=False))
+        if not sessions:
+            return
+        print(f"  summaries {variant:<9} {len(sessions)} sessions {seconds * 1000:8.1f} ms "
+              f"{len(sessions) / seconds:11,.0f} objects/s {size / len(sessions):8,.0f} bytes/session")
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("root", nargs="?", default=str(claude_parser.PROJECTS_DIR))
+    arg_parser.add_argument("--top", type=int, default=3)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    files = largest_sessions(Path(args.root), args.top)
+    if not files:
+        print(f"No session files under {args.root}")
+        return
+    for path in files:
+        bench_session(path, args.repeat)
+    if Path(args.root) == claude_parser.PROJECTS_DIR:
+        bench_summaries(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
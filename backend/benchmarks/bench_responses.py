@@ -0,0 +1,98 @@
+"""会话详情响应基准：序列化 + 压缩 + 传输 + 解压的总耗时
+
+用法：
+    python -m benchmarks.bench_responses [会话目录] [--top N] [--repeat N] [--mbps 100,1000]
+
+默认取 ~/.claude/projects 下最大的 N 个会话文件，解析为 SessionDetail 后对比：
+    - 序列化：Pydantic 转换为 JSON 兼容结构后，用标准库 json（FastAPI 默认）或 orjson 输出
+    - 压缩：不压缩 / gzip / br（需安装 brotli）
+    - 传输：按给定带宽估算，加上客户端解压耗时
+"""
+import argparse
+import gzip
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from starlette.responses import JSONResponse
+
+from parser import detail_cache
+from responses import FastJSONResponse, brotli, compress
+
+
+def best_of(func: Callable[[], object], repeat: int) -> Tuple[float, object]:
+    """返回 (最佳耗时毫秒, 结果)"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def largest_sessions(root: Path, top: int) -> List[Path]:
+    files = [p for p in root.glob("*/*.jsonl") if not p.stem.startswith("agent-")] if root.exists() else []
+    return sorted(files, key=lambda p: p.stat().st_size, reverse=True)[:top]
+
+
+def bench_session(path: Path, repeat: int, links: List[float]) -> None:
+    detail = detail_cache.get(path)
+    if detail is None:
+        return
+    print(f"{path.name}: {len(detail.messages)} messages, file {path.stat().st_size / 1e6:.1f} MB")
+
+    dump_ms, content = best_of(lambda: detail.model_dump(mode="json"), repeat)
+    renderers = [
+        ("json", lambda: JSONResponse(None).render(content)),
+        ("orjson", lambda: FastJSONResponse(None).render(content)),
+    ]
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    decompressors = {
+        "identity": lambda body: body,
+        "gzip": gzip.decompress,
+        "br": brotli.decompress if brotli is not None else None,
+    }
+
+    header = f"  {'serializer':<8} {'encoding':<9} {'ser ms':>8} {'comp ms':>8} {'size MB':>8} {'decomp ms':>9}"
+    header += "".join(f" {f'total@{mbps:g}Mbps':>16}" for mbps in links)
+    print(header)
+    for name, render in renderers:
+        render_ms, body = best_of(render, repeat)
+        serialize_ms = dump_ms + render_ms
+        for encoding in encodings:
+            if encoding == "identity":
+                compress_ms, payload = 0.0, body
+            else:
+                compress_ms, payload = best_of(lambda: compress(body, encoding), repeat)
+            decompress_ms, _ = best_of(lambda: decompressors[encoding](payload), repeat)
+            row = (
+                f"  {name:<8} {encoding:<9} {serialize_ms:8.1f} {compress_ms:8.1f} "
+                f"{len(payload) / 1e6:8.2f} {decompress_ms:9.1f}"
+            )
+            for mbps in links:
+                transfer_ms = len(payload) * 8 / (mbps * 1e6) * 1000
+                row += f" {serialize_ms + compress_ms + transfer_ms + decompress_ms:14.1f}ms"
+            print(row)
+    print()
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("root", nargs="?", default=str(Path.home() / ".claude" / "projects"))
+    arg_parser.add_argument("--top", type=int, default=3)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--mbps", default="100,1000", help="估算传输时间用的带宽（Mbit/s），逗号分隔")
+    args = arg_parser.parse_args()
+
+    links = [float(x) for x in args.mbps.split(",") if x]
+    files = largest_sessions(Path(args.root), args.top)
+    if not files:
+        print(f"No session files under {args.root}")
+        return
+    for path in files:
+        bench_session(path, args.repeat, links)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""时间戳解析基准：dateutil 与 parse_timestamp（fromisoformat 快速路径 + 缓存）对比
+
+用法：
+    python -m benchmarks.bench_timestamps [会话目录] [--max-files N] [--repeat N]
+
+默认读取 ~/.claude/projects 下的 JSONL 文件，收集每条记录的 timestamp；
+目录不存在或没有时间戳时生成同格式的模拟数据。
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+from dateutil import parser as date_parser
+
+from common import parse_timestamp, _parse_timestamp_cached
+
+
+def collect_timestamps(root: Path, max_files: int) -> List[str]:
+    """按文件中的顺序收集时间戳字符串（每条记录一个）"""
+    timestamps = []
+    files = sorted(root.rglob("*.jsonl"))[:max_files] if root.exists() else []
+    for path in files:
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    ts = json.loads(line).get("timestamp")
+                except (ValueError, AttributeError):
+                    continue
+                if isinstance(ts, str) and ts:
+                    timestamps.append(ts)
+    return timestamps
+
+
+def synthetic_timestamps(count: int) -> List[str]:
+    """模拟 Claude 会话：毫秒精度、以 Z 结尾、间隔数秒"""
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        (start + timedelta(seconds=i * 7, milliseconds=i % 1000)).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+        for i in range(count)
+    ]
+
+
+def bench(label: str, func, timestamps: List[str], repeat: int, before=None) -> float:
+    """返回每条记录的最佳耗时（微秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        for ts in timestamps:
+            func(ts)
+        best = min(best, time.perf_counter() - start)
+    per_record = best / len(timestamps) * 1e6
+    print(f"{label:<28} {per_record:8.3f} us/record  {best * 1000:9.1f} ms total")
+    return per_record
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("root", nargs="?", default=str(Path.home() / ".claude" / "projects"))
+    arg_parser.add_argument("--max-files", type=int, default=2000)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    timestamps = collect_timestamps(Path(args.root), args.max_files)
+    source = args.root
+    if not timestamps:
+        timestamps = synthetic_timestamps(50000)
+        source = "synthetic"
+    print(f"{len(timestamps)} timestamps ({len(set(timestamps))} unique) from {source}\n")
+
+    # 结果必须与 dateutil 一致
+    mismatches = sum(1 for ts in timestamps if parse_timestamp(ts) != date_parser.parse(ts))
+    if mismatches:
+        print(f"WARNING: {mismatches} timestamps parsed differently from dateutil\n")
+
+    baseline = bench("dateutil.parser.parse", date_parser.parse, timestamps, args.repeat)
+    cold = bench("parse_timestamp (cold)", parse_timestamp, timestamps, args.repeat,
+                 before=_parse_timestamp_cached.cache_clear)
+    # 模拟同一批记录被摘要/详情/搜索/统计再次解析
+    _parse_timestamp_cached.cache_clear()
+    warm_sample = timestamps[-_parse_timestamp_cached.cache_info().maxsize:]
+    for ts in warm_sample:
+        parse_timestamp(ts)
+    warm = bench("parse_timestamp (memo hit)", parse_timestamp, warm_sample, args.repeat)
+
+    print(f"\nspeedup: {baseline / cold:.1f}x cold, {baseline / warm:.1f}x on memo hits")
+
+
+if __name__ == "__main__":
+    main()
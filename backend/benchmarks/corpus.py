@@ -0,0 +1,417 @@
+"""合成会话数据生成器：在指定目录下生成三个来源的假会话，用于基准测试
+
+用法：
+    python -m benchmarks.corpus 输出目录 [--sessions N] [--messages N] [--tool-result-size BYTES]
+                                        [--cjk-ratio R] [--sources claude,codex,gemini] [--seed N]
+
+输出目录作为 HOME 使用，生成：
+    - .claude/projects/<编码后的项目路径>/<uuid>.jsonl：用户/助手消息、thinking、工具调用与结果、
+      file-history-snapshot，部分会话附带 agent-*.jsonl 子代理文件
+    - .codex/sessions/YYYY/MM/DD/rollout-*.jsonl：session_meta、消息、reasoning、函数调用与输出、token_count
+    - .gemini/tmp/<项目哈希>/chats/session-*.json：整体 JSON，包含工具调用结果和 token 统计
+并写入 corpus.json：生成参数、文件数/字节数，以及每个来源中消息最多的会话 ID、
+其中最大的工具结果 ID 和可命中的搜索词，供 bench_endpoints 使用。
+
+会话数为每个来源的数量；每个会话的消息数和工具结果大小围绕给定值随机浮动。
+同一 seed 生成的内容相同，时间均相对于生成时刻（使今日、本月统计有数据）。
+"""
+import argparse
+import json
+import math
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+ASCII_WORDS = (
+    "the function returns a list of files that match the pattern and then we update the index "
+    "cache database query refactor parser session search token usage error handler config deploy "
+    "test build release async await request response stream buffer offset schema migration"
+).split()
+CJK_WORDS = (
+    "修复 登录 问题 重构 数据库 索引 缓存 搜索 性能 优化 部署 函数 接口 测试 配置 会话 "
+    "解析 文件 项目 用户 消息 工具 结果 分页 统计 错误 日志 模块 组件 页面 样式 请求"
+).split()
+
+# 每个来源中保证存在、可用于搜索基准的词
+SEARCH_TERMS = ("数据库", "refactor")
+
+CLAUDE_TOOLS = ("Bash", "Read", "Edit", "Write", "Grep", "Glob", "TodoWrite", "Task")
+CODEX_TOOLS = ("shell_command", "apply_patch")
+GEMINI_TOOLS = ("run_shell_command", "read_file", "replace", "write_file", "search_file_content", "glob")
+
+
+class CorpusOptions(NamedTuple):
+    sessions: int = 50             # 每个来源的会话数
+    messages: int = 40             # 每个会话的平均消息数（user/assistant 记录）
+    tool_result_size: int = 2000   # 工具结果的平均字节数（对数正态分布，少数结果远大于平均值）
+    cjk_ratio: float = 0.3         # 文本中中文词的比例
+    projects: int = 8              # 项目数
+    agent_ratio: float = 0.2       # 附带 agent-* 子代理文件的 Claude 会话比例
+    days: int = 60                 # 会话时间分布在最近多少天内
+    sources: Tuple[str, ...] = ("claude", "codex", "gemini")
+    seed: int = 1
+
+
+class _Sample:
+    """记录每个来源中消息最多的会话，作为详情类接口的基准对象"""
+    __slots__ = ("session_id", "messages", "tool_id", "tool_result_size")
+
+    def __init__(self):
+        self.session_id: Optional[str] = None
+        self.messages = -1
+        self.tool_id: Optional[str] = None
+        self.tool_result_size = -1
+
+    def offer(self, session_id: str, messages: int, tools: List[Tuple[str, int]]) -> None:
+        if messages <= self.messages:
+            return
+        self.session_id, self.messages = session_id, messages
+        self.tool_id, self.tool_result_size = max(tools, key=lambda t: t[1]) if tools else (None, -1)
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "messages": self.messages,
+            "tool_id": self.tool_id,
+            "tool_result_size": self.tool_result_size,
+        }
+
+
+class _Generator:
+    def __init__(self, home: Path, options: CorpusOptions):
+        self.home = home
+        self.options = options
+        self.rng = random.Random(options.seed)
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.files = 0
+        self.bytes = 0
+        # 工具结果从预先生成的文本中截取，避免逐字节随机生成
+        self._filler = self._lines(4000)
+
+    # ---------- 文本 ----------
+
+    def _word(self) -> str:
+        if self.rng.random() < self.options.cjk_ratio:
+            return self.rng.choice(CJK_WORDS)
+        return self.rng.choice(ASCII_WORDS)
+
+    def text(self, words: int) -> str:
+        return " ".join(self._word() for _ in range(words))
+
+    def _lines(self, count: int) -> str:
+        lines = []
+        for i in range(count):
+            indent = "    " * self.rng.randint(0, 3)
+            lines.append(f"{i + 1:>5}\t{indent}{self.text(self.rng.randint(3, 12))}")
+        return "\n".join(lines)
+
+    def tool_result(self) -> str:
+        """大小服从均值为 tool_result_size 的对数正态分布（上限为均值的 50 倍）"""
+        mean = max(1, self.options.tool_result_size)
+        size = min(int(self.rng.lognormvariate(math.log(mean) - 0.5, 1.0)), mean * 50)
+        size = max(size, 1)
+        start = self.rng.randrange(len(self._filler))
+        text = (self._filler[start:] + "\n" + self._filler) * (size // len(self._filler) + 1)
+        return text[:size]
+
+    def message_count(self) -> int:
+        mean = max(2, self.options.messages)
+        return self.rng.randint(max(2, mean // 2), mean * 3 // 2)
+
+    def start_time(self) -> datetime:
+        return self.now - timedelta(seconds=self.rng.randint(3600, self.options.days * 86400))
+
+    @staticmethod
+    def ts(t: datetime) -> str:
+        return t.strftime("%Y-%m-%dT%H:%M:%S.") + f"{t.microsecond // 1000:03d}Z"
+
+    def step(self, t: datetime) -> datetime:
+        return t + timedelta(seconds=self.rng.randint(2, 90), milliseconds=self.rng.randint(0, 999))
+
+    def project_cwd(self, index: int) -> str:
+        return f"/home/dev/code/project{index % max(1, self.options.projects)}"
+
+    def write(self, path: Path, data: str) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        body = data.encode("utf-8")
+        path.write_bytes(body)
+        self.files += 1
+        self.bytes += len(body)
+
+    @staticmethod
+    def jsonl(records: List[dict]) -> str:
+        return "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in records)
+
+    # ---------- Claude ----------
+
+    def _claude_tool_input(self, name: str) -> dict:
+        path = f"/home/dev/code/src/{self.rng.choice(ASCII_WORDS)}_{self.rng.randint(1, 99)}.py"
+        if name == "Bash":
+            return {"command": f"pytest -q tests/test_{self.rng.choice(ASCII_WORDS)}.py", "description": self.text(5)}
+        if name == "Read":
+            return {"file_path": path}
+        if name == "Edit":
+            return {"file_path": path, "old_string": self.text(8), "new_string": self.text(10)}
+        if name == "Write":
+            return {"file_path": path, "content": self._lines(self.rng.randint(5, 40))}
+        if name in ("Grep", "Glob"):
+            return {"pattern": self.rng.choice(ASCII_WORDS), "path": "/home/dev/code"}
+        if name == "TodoWrite":
+            return {"todos": [{"content": self.text(6), "status": "pending"} for _ in range(self.rng.randint(1, 5))]}
+        return {"description": self.text(4), "prompt": self.text(30)}
+
+    def claude_session(self, index: int, sample: _Sample) -> None:
+        cwd = self.project_cwd(index)
+        project_dir = self.home / ".claude" / "projects" / cwd.replace("/", "-")
+        session_id = str(uuid.UUID(int=self.rng.getrandbits(128)))
+        t = self.start_time()
+        base = {"isSidechain": False, "userType": "external", "cwd": cwd, "sessionId": session_id,
+                "version": "2.0.14", "gitBranch": "main"}
+        records: List[dict] = []
+        tools: List[Tuple[str, int]] = []
+        parent = None
+        target = self.message_count()
+        count = 0
+        search_words = list(SEARCH_TERMS)
+
+        def add(record: dict) -> None:
+            nonlocal parent
+            record_uuid = str(uuid.UUID(int=self.rng.getrandbits(128)))
+            records.append({**base, "parentUuid": parent, **record, "uuid": record_uuid, "timestamp": self.ts(t)})
+            parent = record_uuid
+
+        if self.rng.random() < 0.3:
+            records.append({"type": "summary", "summary": self.text(6), "leafUuid": str(uuid.UUID(int=self.rng.getrandbits(128)))})
+        while count < target:
+            prompt = self.text(self.rng.randint(5, 60))
+            if search_words:
+                prompt += " " + search_words.pop()
+            add({"type": "user", "message": {"role": "user", "content": prompt}})
+            count += 1
+            for _ in range(self.rng.randint(0, 3)):
+                t = self.step(t)
+                name = self.rng.choice(CLAUDE_TOOLS)
+                tool_id = f"toolu_{self.rng.getrandbits(96):024x}"
+                content = []
+                if self.rng.random() < 0.5:
+                    content.append({"type": "thinking", "thinking": self.text(40), "signature": "sig"})
+                if self.rng.random() < 0.5:
+                    content.append({"type": "text", "text": self.text(self.rng.randint(5, 30))})
+                content.append({"type": "tool_use", "id": tool_id, "name": name, "input": self._claude_tool_input(name)})
+                add({"type": "assistant", "requestId": f"req_{self.rng.getrandbits(64):016x}",
+                     "message": self._claude_assistant(content)})
+                t = self.step(t)
+                result = self.tool_result()
+                record = {"type": "user", "message": {"role": "user", "content": [
+                    {"tool_use_id": tool_id, "type": "tool_result", "content": result, "is_error": False}
+                ]}}
+                if name == "Bash":
+                    record["toolUseResult"] = {"stdout": result[:4000], "stderr": "", "interrupted": False}
+                add(record)
+                tools.append((tool_id, len(result.encode("utf-8"))))
+                count += 2
+            t = self.step(t)
+            add({"type": "assistant", "requestId": f"req_{self.rng.getrandbits(64):016x}",
+                 "message": self._claude_assistant([{"type": "text", "text": self.text(self.rng.randint(10, 120))}])})
+            count += 1
+            if self.rng.random() < 0.2:
+                records.append({"type": "file-history-snapshot", "messageId": parent, "isSnapshotUpdate": False,
+                                "snapshot": {"messageId": parent, "timestamp": self.ts(t), "trackedFileBackups": {
+                                    f"/home/dev/code/src/{w}.py": {"backupFileName": f"{self.rng.getrandbits(64):016x}@v{v}",
+                                                                  "version": v, "backupTime": self.ts(t)}
+                                    for v, w in enumerate(self.rng.sample(ASCII_WORDS, 2), 1)
+                                }}})
+            t = self.step(t) + timedelta(minutes=self.rng.randint(0, 10))
+
+        self.write(project_dir / f"{session_id}.jsonl", self.jsonl(records))
+        sample.offer(session_id, count, tools)
+
+        if self.rng.random() < self.options.agent_ratio:
+            agent = [dict(r, isSidechain=True) for r in records[:6] if r.get("type") in ("user", "assistant")]
+            self.write(project_dir / f"agent-{self.rng.getrandbits(32):08x}.jsonl", self.jsonl(agent))
+
+    def _claude_assistant(self, content: List[dict]) -> dict:
+        return {
+            "id": f"msg_{self.rng.getrandbits(96):024x}",
+            "type": "message",
+            "role": "assistant",
+            "model": self.rng.choice(("claude-sonnet-4-5-20250929", "claude-opus-4-5-20251101", "claude-3-5-haiku-20241022")),
+            "content": content,
+            "stop_reason": "tool_use" if content[-1]["type"] == "tool_use" else "end_turn",
+            "usage": {
+                "input_tokens": self.rng.randint(1, 500),
+                "output_tokens": self.rng.randint(10, 2000),
+                "cache_creation_input_tokens": self.rng.randint(0, 5000),
+                "cache_read_input_tokens": self.rng.randint(0, 150000),
+            },
+        }
+
+    # ---------- Codex ----------
+
+    def codex_session(self, index: int, sample: _Sample) -> None:
+        t = self.start_time()
+        session_id = str(uuid.UUID(int=self.rng.getrandbits(128)))
+        model = self.rng.choice(("gpt-5-codex", "gpt-5.1-codex", "codex-mini-latest"))
+        name = f"rollout-{t.strftime('%Y-%m-%dT%H-%M-%S')}-{session_id}"
+        records = [{"timestamp": self.ts(t), "type": "session_meta", "payload": {
+            "id": session_id, "timestamp": self.ts(t), "cwd": self.project_cwd(index),
+            "originator": "codex_cli_rs", "cli_version": "0.46.0", "model": model,
+        }}]
+        tools: List[Tuple[str, int]] = []
+        target = self.message_count()
+        count = 0
+        search_words = list(SEARCH_TERMS)
+
+        def item(payload: dict, record_type: str = "response_item") -> None:
+            records.append({"timestamp": self.ts(t), "type": record_type, "payload": payload})
+
+        while count < target:
+            prompt = self.text(self.rng.randint(5, 60))
+            if search_words:
+                prompt += " " + search_words.pop()
+            item({"type": "message", "role": "user", "content": [{"type": "input_text", "text": prompt}]})
+            count += 1
+            item({"type": "turn_context", "cwd": self.project_cwd(index), "model": model}, "turn_context")
+            for _ in range(self.rng.randint(0, 3)):
+                t = self.step(t)
+                item({"type": "reasoning", "summary": [{"type": "summary_text", "text": self.text(20)}]})
+                call_id = f"call_{self.rng.getrandbits(96):024x}"
+                tool = self.rng.choice(CODEX_TOOLS)
+                arguments = {"command": ["bash", "-lc", f"rg {self.rng.choice(ASCII_WORDS)}"]} if tool == "shell_command" \
+                    else {"input": "*** Begin Patch\n" + self._lines(8) + "\n*** End Patch"}
+                item({"type": "function_call", "name": tool, "arguments": json.dumps(arguments), "call_id": call_id})
+                count += 1
+                t = self.step(t)
+                output = self.tool_result()
+                item({"type": "function_call_output", "call_id": call_id,
+                      "output": json.dumps({"output": output, "metadata": {"exit_code": 0}}, ensure_ascii=False)})
+                tools.append((call_id, len(records[-1]["payload"]["output"].encode("utf-8"))))
+            t = self.step(t)
+            item({"type": "message", "role": "assistant",
+                  "content": [{"type": "output_text", "text": self.text(self.rng.randint(10, 120))}]})
+            count += 1
+            item({"type": "token_count", "info": {
+                "model": model,
+                "last_token_usage": {
+                    "input_tokens": self.rng.randint(1000, 50000),
+                    "cached_input_tokens": self.rng.randint(0, 40000),
+                    "output_tokens": self.rng.randint(10, 3000),
+                },
+            }}, "event_msg")
+            t = self.step(t) + timedelta(minutes=self.rng.randint(0, 10))
+
+        self.write(self.home / ".codex" / "sessions" / t.strftime("%Y/%m/%d") / f"{name}.jsonl", self.jsonl(records))
+        sample.offer(name, count, tools)
+
+    # ---------- Gemini ----------
+
+    def gemini_session(self, index: int, sample: _Sample) -> None:
+        t = self.start_time()
+        start = t
+        project_hash = f"{index % max(1, self.options.projects):02d}" * 32
+        messages = []
+        tools: List[Tuple[str, int]] = []
+        target = self.message_count()
+        search_words = list(SEARCH_TERMS)
+        while len(messages) < target:
+            prompt = self.text(self.rng.randint(5, 60))
+            if search_words:
+                prompt += " " + search_words.pop()
+            messages.append({"id": str(uuid.UUID(int=self.rng.getrandbits(128))), "timestamp": self.ts(t),
+                             "type": "user", "content": prompt})
+            t = self.step(t)
+            calls = []
+            for i in range(self.rng.randint(0, 3)):
+                call_id = f"{self.rng.choice(GEMINI_TOOLS)}-{self.rng.getrandbits(48)}"
+                output = self.tool_result()
+                calls.append({
+                    "id": call_id,
+                    "name": call_id.rsplit("-", 1)[0],
+                    "args": {"path": f"/home/dev/code/src/{self.rng.choice(ASCII_WORDS)}.py"},
+                    "result": [{"functionResponse": {"id": call_id, "name": call_id.rsplit("-", 1)[0],
+                                                     "response": {"output": output}}}],
+                    "status": "success",
+                    "timestamp": self.ts(t),
+                })
+                tools.append((call_id, len(output.encode("utf-8"))))
+            message = {"id": str(uuid.UUID(int=self.rng.getrandbits(128))), "timestamp": self.ts(t),
+                       "type": "gemini", "content": self.text(self.rng.randint(10, 120)),
+                       "thoughts": [{"subject": self.text(3), "description": self.text(20), "timestamp": self.ts(t)}],
+                       "model": self.rng.choice(("gemini-2.5-pro", "gemini-2.5-flash")),
+                       "tokens": {"input": self.rng.randint(1000, 30000), "output": self.rng.randint(10, 2000),
+                                  "cached": self.rng.randint(0, 20000), "thoughts": 0, "tool": 0}}
+            if calls:
+                message["toolCalls"] = calls
+            messages.append(message)
+            t = self.step(t) + timedelta(minutes=self.rng.randint(0, 10))
+
+        name = f"session-{start.strftime('%Y-%m-%dT%H-%M')}-{self.rng.getrandbits(32):08x}"
+        data = {"sessionId": str(uuid.UUID(int=self.rng.getrandbits(128))), "projectHash": project_hash,
+                "startTime": self.ts(start), "lastUpdated": self.ts(t), "messages": messages}
+        self.write(self.home / ".gemini" / "tmp" / project_hash / "chats" / f"{name}.json",
+                   json.dumps(data, ensure_ascii=False, indent=2))
+        sample.offer(name, len(messages), tools)
+
+
+def generate_corpus(home: Path, options: CorpusOptions = CorpusOptions()) -> dict:
+    """在 home 下生成会话数据，返回（并写入 home/corpus.json 的）清单"""
+    generator = _Generator(home, options)
+    builders = {
+        "claude": generator.claude_session,
+        "codex": generator.codex_session,
+        "gemini": generator.gemini_session,
+    }
+    samples: Dict[str, dict] = {}
+    for source in options.sources:
+        sample = _Sample()
+        for index in range(options.sessions):
+            builders[source](index, sample)
+        samples[source] = sample.to_dict()
+
+    manifest = {
+        "options": options._asdict(),
+        "files": generator.files,
+        "bytes": generator.bytes,
+        "search_terms": list(SEARCH_TERMS),
+        "samples": samples,
+    }
+    (home / "corpus.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=2))
+    return manifest
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("home", help="输出目录（作为 HOME 使用）")
+    defaults = CorpusOptions()
+    arg_parser.add_argument("--sessions", type=int, default=defaults.sessions, help="每个来源的会话数")
+    arg_parser.add_argument("--messages", type=int, default=defaults.messages, help="每个会话的平均消息数")
+    arg_parser.add_argument("--tool-result-size", type=int, default=defaults.tool_result_size,
+                            help="工具结果的平均字节数")
+    arg_parser.add_argument("--cjk-ratio", type=float, default=defaults.cjk_ratio, help="中文词比例（0~1）")
+    arg_parser.add_argument("--projects", type=int, default=defaults.projects)
+    arg_parser.add_argument("--agent-ratio", type=float, default=defaults.agent_ratio)
+    arg_parser.add_argument("--days", type=int, default=defaults.days)
+    arg_parser.add_argument("--sources", default=",".join(defaults.sources))
+    arg_parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = arg_parser.parse_args()
+
+    options = CorpusOptions(
+        sessions=args.sessions,
+        messages=args.messages,
+        tool_result_size=args.tool_result_size,
+        cjk_ratio=args.cjk_ratio,
+        projects=args.projects,
+        agent_ratio=args.agent_ratio,
+        days=args.days,
+        sources=tuple(s for s in args.sources.split(",") if s),
+        seed=args.seed,
+    )
+    manifest = generate_corpus(Path(args.home), options)
+    print(f"{manifest['files']} files, {manifest['bytes'] / 1e6:.1f} MB under {args.home}")
+
+
+if __name__ == "__main__":
+    main()
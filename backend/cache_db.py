@@ -0,0 +1,235 @@
+"""本地缓存数据库（SQLite），供摘要索引等持久化缓存共用"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from common import epoch_seconds
+
+
+# 缓存目录，可通过环境变量 SESSION_VIEWER_CACHE_DIR 覆盖
+CACHE_DIR = Path(os.environ.get(
+    "SESSION_VIEWER_CACHE_DIR",
+    str(Path.home() / ".cache" / "claude-session-viewer")
+))
+CACHE_DB_PATH = CACHE_DIR / "index.db"
+
+_lock = threading.RLock()
+_conn: Optional[sqlite3.Connection] = None
+# 共享连接是否为文件数据库（退化为内存数据库时无法另开读连接）
+_file_backed = False
+# 每个线程的只读连接
+_readers = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """打开缓存数据库；目录不可写时退化为内存数据库"""
+    global _file_backed
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(CACHE_DB_PATH), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        _file_backed = True
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error opening cache db {CACHE_DB_PATH}: {e}")
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        _file_backed = False
+    conn.execute("PRAGMA synchronous=NORMAL")
+    # 各来源的时间戳格式不一（Z / +00:00 / 不带时区），SQL 中比较时间时统一转换为 Unix 时间戳
+    conn.create_function("epoch", 1, epoch_seconds, deterministic=True)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS schema_versions ("
+        "name TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+    )
+    conn.commit()
+    return conn
+
+
+@contextmanager
+def connection() -> Iterator[sqlite3.Connection]:
+    """获取共享连接（串行访问），退出时提交事务，异常时回滚"""
+    global _conn
+    with _lock:
+        if _conn is None:
+            _conn = _connect()
+        try:
+            yield _conn
+            _conn.commit()
+        except Exception:
+            _conn.rollback()
+            raise
+
+
+@contextmanager
+def read_connection() -> Iterator[sqlite3.Connection]:
+    """只读查询使用的连接：每个线程一个独立连接，不持有共享连接的锁
+
+    WAL 模式下多个读取可以与写入并发执行（如 source=all 时各来源的查询），读取到的是已提交的数据。
+    退化为内存数据库时使用共享连接。
+    """
+    global _conn
+    with _lock:
+        if _conn is None:
+            _conn = _connect()
+    if not _file_backed:
+        with connection() as conn:
+            yield conn
+        return
+    conn = getattr(_readers, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(str(CACHE_DB_PATH), check_same_thread=False)
+        conn.execute("PRAGMA query_only=ON")
+        conn.create_function("epoch", 1, epoch_seconds, deterministic=True)
+        _readers.conn = conn
+    yield conn
+
+
+def ensure_schema(name: str, version: int, tables: List[str], statements: List[str]) -> None:
+    """按版本号建表；版本变化时删除旧表重建（缓存数据可随时重新生成）"""
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT version FROM schema_versions WHERE name = ?", (name,)
+        ).fetchone()
+        if row and row[0] == version:
+            return
+        for table in tables:
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+        for statement in statements:
+            conn.execute(statement)
+        conn.execute(
+            "INSERT OR REPLACE INTO schema_versions (name, version) VALUES (?, ?)",
+            (name, version)
+        )
+
+
+# 当前请求内已 stat 过的文件（见 stat_scope），不在请求中时为 None
+_stat_cache: ContextVar[Optional[Dict[str, Optional[os.stat_result]]]] = ContextVar(
+    "session_viewer_stat_cache", default=None
+)
+
+
+@contextmanager
+def stat_scope() -> Iterator[None]:
+    """在范围内缓存 stat 结果：同一请求中数据版本（ETag）和随后索引的 diff 对每个文件只 stat 一次
+
+    范围内看到的是第一次 stat 时的文件状态，因此只用于单个请求；后台线程不在范围内，总是重新 stat。
+    线程池中的计算需复制调用方的 context 才能共用（见 coalesce.run_coalesced）。
+    """
+    token = _stat_cache.set({})
+    try:
+        yield
+    finally:
+        _stat_cache.reset(token)
+
+
+class StatScopeMiddleware:
+    """每个 HTTP 请求一个 stat_scope（包括流式响应的生成过程）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with stat_scope():
+            await self.app(scope, receive, send)
+
+
+def stat_file(path: Path) -> Optional[os.stat_result]:
+    """os.stat，在 stat_scope 内复用同一文件的结果；文件不存在时返回 None"""
+    cache = _stat_cache.get()
+    key = str(path)
+    if cache is not None and key in cache:
+        return cache[key]
+    try:
+        st = os.stat(path)
+    except OSError:
+        st = None
+    if cache is not None:
+        cache[key] = st
+    return st
+
+
+def sort_by_mtime(paths: Iterable[Path]) -> List[Path]:
+    """按修改时间倒序排列（stat 结果与请求内的其他 stat 共用）；已不存在的文件排在最后"""
+    def mtime(path: Path) -> float:
+        st = stat_file(path)
+        return st.st_mtime if st is not None else 0.0
+    return sorted(paths, key=mtime, reverse=True)
+
+
+def file_signature(path: Path, fresh: bool = False) -> Optional[Tuple[int, int]]:
+    """文件签名 (mtime_ns, size)；文件不存在时返回 None
+
+    Args:
+        fresh: 不使用 stat_scope 中的结果（写入前确认文件是否变化时需要最新状态）
+    """
+    if fresh:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+    else:
+        st = stat_file(path)
+        if st is None:
+            return None
+    return st.st_mtime_ns, st.st_size
+
+
+def diff_files(
+    table: str,
+    source: str,
+    files: Iterable[Path],
+    indexed_only: bool = False,
+) -> Tuple[Dict[str, Tuple[int, int]], List[str], List[str]]:
+    """对比文件签名与表中记录（需有 path/source/mtime_ns/size 列）
+
+    Args:
+        files: 该来源的全部文件；indexed_only 时为发生变化的路径，
+            只检查其中已在表中的文件（未收录的路径直接忽略）
+
+    Returns:
+        (当前文件签名, 新增或变更的路径, 已删除的路径)
+    """
+    with connection() as conn:
+        if indexed_only:
+            indexed = {}
+            for path in {str(p) for p in files}:
+                row = conn.execute(
+                    f"SELECT mtime_ns, size FROM {table} WHERE path = ? AND source = ?", (path, source)
+                ).fetchone()
+                if row:
+                    indexed[path] = (row[0], row[1])
+            files = [Path(p) for p in indexed]
+        else:
+            indexed = {
+                row[0]: (row[1], row[2])
+                for row in conn.execute(
+                    f"SELECT path, mtime_ns, size FROM {table} WHERE source = ?", (source,)
+                )
+            }
+
+    signatures: Dict[str, Tuple[int, int]] = {}
+    for path in files:
+        signature = file_signature(path)
+        if signature:
+            signatures[str(path)] = signature
+
+    changed = [p for p, sig in signatures.items() if indexed.get(p) != sig]
+    removed = [p for p in indexed if p not in signatures]
+    return signatures, changed, removed
+
+
+def load_rows(table: str, columns: str, paths: Iterable[str]) -> Dict[str, tuple]:
+    """按路径读取表中已有记录的若干列"""
+    rows: Dict[str, tuple] = {}
+    with connection() as conn:
+        for path in paths:
+            row = conn.execute(f"SELECT {columns} FROM {table} WHERE path = ?", (path,)).fetchone()
+            if row:
+                rows[path] = row
+    return rows
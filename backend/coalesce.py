@@ -0,0 +1,61 @@
+"""请求合并（single-flight）与重计算线程池
+
+相同的计算（按 endpoint、来源和参数组成的 key 区分）同时只执行一次，
+并发的请求等待同一个结果；计算在独立的有界线程池中执行，不占用 FastAPI 的默认线程池。
+计算中各阶段的耗时（见 metrics）计入每个等待它的请求。
+计算在发起它的请求的 context 中执行（如请求内的 stat 缓存，见 cache_db.stat_scope）。
+
+环境变量：
+    SESSION_VIEWER_HEAVY_WORKERS: 重计算线程数，默认 4
+"""
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+import metrics
+
+T = TypeVar("T")
+
+HEAVY_WORKERS = int(os.environ.get("SESSION_VIEWER_HEAVY_WORKERS", "4"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(HEAVY_WORKERS, thread_name_prefix="session-viewer-heavy")
+    return _executor
+
+
+async def run_coalesced(key: Hashable, func: Callable[..., T], *args: Any) -> T:
+    """在重计算线程池中执行 func(*args)；已有相同 key 的计算在进行时直接等待其结果"""
+    future = _inflight.get(key)
+    if future is None:
+        metrics.count_cache("coalesce", "miss")
+        future = asyncio.get_running_loop().run_in_executor(
+            _get_executor(), contextvars.copy_context().run, metrics.collect, func, *args
+        )
+        _inflight[key] = future
+
+        def _done(f: "asyncio.Future[Any]") -> None:
+            if _inflight.get(key) is f:
+                del _inflight[key]
+
+        future.add_done_callback(_done)
+    else:
+        metrics.count_cache("coalesce", "hit")
+    # 某个请求断开时不取消其他请求共享的计算
+    result, timings = await asyncio.shield(future)
+    metrics.merge(timings)
+    return result
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
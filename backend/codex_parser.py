@@ -1,17 +1,26 @@
 """JSONL 解析器 - 解析 Codex 会话数据"""
 import json
 import os
-from datetime import datetime
+from datetime import timezone
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import Iterator, List, Optional, Any
 
-from common import parse_timestamp, parse_jsonl_file
-from models import (
-    Message, SessionSummary, SessionDetail,
-    SearchResult, Project, ToolCall, TokenUsage, UsageSummary, UsageDetail, DailyUsage
+from common import (
+    parse_timestamp, epoch_seconds, iter_jsonl, iter_jsonl_matches, track_time_range, time_range,
+    IncrementalParser, JsonlTailCache,
 )
-from collections import defaultdict
-from datetime import timedelta
+from cache_db import sort_by_mtime
+from session_index import SessionCursor, SummaryIndex
+from search_index import SearchIndex
+from search_query import SearchQuery, make_snippet, scan_file_filter, scan_needles
+from corpus_version import CorpusVersion
+from session_locator import SessionLocator, walk_dirs
+from usage_index import UsageIndex
+from message_index import MessageIndex, new_message_index_state
+from usage_rollup import new_usage_rollup, add_usage, copy_usage_rollup, summarize_usage, detail_usage
+from models import MessagePage, SearchResult, Project, UsageSummary, UsageDetail
+from records import ToolCallRecord, MessageRecord, SummaryRecord, SessionRecord
+from compressor import FILE_EDIT_TOOLS, Turn, TurnBuilder
 
 
 CODEX_DIR = Path.home() / ".codex"
@@ -108,172 +117,208 @@ def get_codex_session_files() -> List[Path]:
     """获取 Codex 会话文件列表"""
     if not CODEX_SESSIONS_DIR.exists():
         return []
-    return sorted(CODEX_SESSIONS_DIR.rglob("*.jsonl"), key=lambda x: x.stat().st_mtime, reverse=True)
+    return sort_by_mtime(CODEX_SESSIONS_DIR.rglob("*.jsonl"))
 
 
-def get_codex_sessions() -> List[SessionSummary]:
-    """获取 Codex 会话摘要列表"""
-    sessions: List[SessionSummary] = []
-    for session_file in get_codex_session_files():
-        summary = get_codex_session_summary(session_file)
-        if summary:
-            sessions.append(summary)
-    sessions.sort(key=lambda x: x.updated_at, reverse=True)
-    return sessions
-
+def _new_codex_summary_state() -> dict:
+    return {
+        "project_path": "codex",
+        "project_name": "codex",
+        "title": "(无标题)",
+        "message_count": 0,
+        "tools": [],
+    }
 
-def get_codex_session_summary(session_file: Path) -> Optional[SessionSummary]:
-    """解析 Codex 会话摘要"""
-    records = parse_jsonl_file(session_file)
-    if not records:
-        return None
 
-    project_path = "codex"
-    project_name = "codex"
-    title = "(无标题)"
-    timestamps = []
-    message_count = 0
-    tool_calls = set()
+def _feed_codex_summary(state: dict, record: dict) -> None:
+    """累加一条记录到 Codex 会话摘要状态（状态可 JSON 序列化，供摘要索引断点续读）"""
+    ts = record.get("timestamp")
+    if ts:
+        track_time_range(state, ts)
 
-    for record in records:
-        ts = record.get("timestamp")
-        if ts:
-            timestamps.append(parse_timestamp(ts))
-
-        record_type = record.get("type")
-        if record_type == "session_meta":
-            payload = record.get("payload", {})
-            cwd = payload.get("cwd")
-            if cwd:
-                project_path = codex_project_path_to_name(cwd)
-                project_name = project_path.split("/")[-1] if "/" in project_path else project_path
-        elif record_type == "response_item":
-            payload = record.get("payload", {})
-            payload_type = payload.get("type")
-            if payload_type == "message":
-                role = payload.get("role")
-                if role in ("user", "assistant"):
-                    message_count += 1
+    record_type = record.get("type")
+    if record_type == "session_meta":
+        payload = record.get("payload", {})
+        cwd = payload.get("cwd")
+        if cwd:
+            project_path = codex_project_path_to_name(cwd)
+            state["project_path"] = project_path
+            state["project_name"] = project_path.split("/")[-1] if "/" in project_path else project_path
+    elif record_type == "response_item":
+        payload = record.get("payload", {})
+        payload_type = payload.get("type")
+        if payload_type == "message":
+            role = payload.get("role")
+            if role in ("user", "assistant"):
+                state["message_count"] += 1
+                if role == "user" and state["title"] == "(无标题)":
                     content = extract_codex_content(payload.get("content", []))
-                    if role == "user" and title == "(无标题)" and content:
-                        title = content[:100] + ("..." if len(content) > 100 else "")
-            elif payload_type == "function_call":
-                name = payload.get("name", "unknown")
-                tool_calls.add(map_codex_tool_name(name))
+                    if content:
+                        state["title"] = content[:100] + ("..." if len(content) > 100 else "")
+        elif payload_type == "function_call":
+            name = map_codex_tool_name(payload.get("name", "unknown"))
+            if name not in state["tools"]:
+                state["tools"].append(name)
 
-    if message_count == 0:
+
+def _finish_codex_summary(state: dict, session_file: Path) -> Optional[SummaryRecord]:
+    if state["message_count"] == 0:
         return None
 
-    created_at = min(timestamps) if timestamps else datetime.now()
-    updated_at = max(timestamps) if timestamps else datetime.now()
+    created_at, updated_at = time_range(state)
 
-    return SessionSummary(
+    return SummaryRecord(
         id=session_file.stem,
-        project_path=project_path,
-        project_name=project_name,
-        title=title,
+        project_path=state["project_path"],
+        project_name=state["project_name"],
+        title=state["title"],
         created_at=created_at,
         updated_at=updated_at,
-        message_count=message_count,
-        tool_calls=sorted(list(tool_calls)),
+        message_count=state["message_count"],
+        tool_calls=sorted(state["tools"]),
         source="codex"
     )
 
 
-def get_codex_session_detail(session_id: str) -> Optional[SessionDetail]:
-    """获取 Codex 会话详情"""
-    for session_file in get_codex_session_files():
-        if session_file.stem == session_id:
-            return get_codex_session_detail_by_file(session_file)
-    return None
+codex_summary_parser = IncrementalParser(_new_codex_summary_state, _feed_codex_summary, _finish_codex_summary)
 
 
-def get_codex_session_detail_by_file(session_file: Path) -> Optional[SessionDetail]:
-    """解析 Codex 会话详情"""
-    records = parse_jsonl_file(session_file)
-    if not records:
+def _codex_summary_head_done(state: dict) -> bool:
+    """探测文件开头时读到 session_meta（项目路径）和首条用户消息（标题）即可停止"""
+    return state["project_path"] != "codex" and state["title"] != "(无标题)"
+
+
+codex_summary_index = SummaryIndex(
+    "codex", get_codex_session_files, codex_summary_parser, head_probe=_codex_summary_head_done
+)
+
+codex_corpus_version = CorpusVersion("codex", get_codex_session_files, codex_summary_index)
+
+
+def get_codex_sessions(
+    limit: Optional[int] = None, project: Optional[str] = None, after: Optional[SessionCursor] = None
+) -> List[SummaryRecord]:
+    """获取 Codex 会话摘要列表（按更新时间倒序，由摘要索引提供）；limit / project / after 见 SummaryIndex.sessions"""
+    return codex_summary_index.sessions(limit=limit, project=project, after=after)
+
+
+codex_session_locator = SessionLocator(
+    lambda: walk_dirs(CODEX_SESSIONS_DIR),
+    lambda: CODEX_SESSIONS_DIR.rglob("*.jsonl") if CODEX_SESSIONS_DIR.exists() else [],
+)
+
+
+def find_codex_session_file(session_id: str) -> Optional[Path]:
+    """按会话 ID 查找 Codex 会话文件"""
+    return codex_session_locator.find(session_id)
+
+
+def get_codex_session_detail(session_id: str) -> Optional[SessionRecord]:
+    """获取 Codex 会话详情"""
+    session_file = find_codex_session_file(session_id)
+    if session_file is None:
         return None
+    return get_codex_session_detail_by_file(session_file)
 
-    project_path = "codex"
-    project_name = "codex"
-    timestamps = []
 
-    tool_results: Dict[str, str] = {}
-    for record in records:
-        ts = record.get("timestamp")
-        if ts:
-            timestamps.append(parse_timestamp(ts))
+def _new_codex_detail_state() -> dict:
+    return {
+        "records": 0,
+        "project_path": "codex",
+        "project_name": "codex",
+        "messages": [],
+        "tool_calls": {},    # call_id -> ToolCallRecord，等待回填结果
+        "tool_results": {},  # call_id -> 先于调用出现的输出
+    }
 
-        if record.get("type") == "session_meta":
-            payload = record.get("payload", {})
-            cwd = payload.get("cwd")
-            if cwd:
-                project_path = codex_project_path_to_name(cwd)
-                project_name = project_path.split("/")[-1] if "/" in project_path else project_path
 
-        if record.get("type") == "response_item":
-            payload = record.get("payload", {})
-            if payload.get("type") == "function_call_output":
-                call_id = payload.get("call_id")
-                output = payload.get("output")
-                if call_id and isinstance(output, str):
-                    tool_results[call_id] = output
-
-    messages: List[Message] = []
-    for record in records:
-        if record.get("type") != "response_item":
-            continue
+def _feed_codex_detail(state: dict, record: dict) -> None:
+    """累加一条记录到 Codex 会话详情状态"""
+    state["records"] += 1
+    ts = record.get("timestamp")
+    if ts:
+        track_time_range(state, ts)
 
+    record_type = record.get("type")
+    if record_type == "session_meta":
         payload = record.get("payload", {})
-        payload_type = payload.get("type")
-        timestamp = parse_timestamp(record.get("timestamp", ""))
+        cwd = payload.get("cwd")
+        if cwd:
+            project_path = codex_project_path_to_name(cwd)
+            state["project_path"] = project_path
+            state["project_name"] = project_path.split("/")[-1] if "/" in project_path else project_path
+        return
+
+    if record_type != "response_item":
+        return
+
+    payload = record.get("payload", {})
+    payload_type = payload.get("type")
+
+    if payload_type == "function_call_output":
+        call_id = payload.get("call_id")
+        output = payload.get("output")
+        if call_id and isinstance(output, str):
+            # ToolCallRecord 中只保留预览，完整输出不驻留内存
+            tool_call = state["tool_calls"].get(call_id)
+            if tool_call is not None:
+                tool_call.set_result(output)
+            else:
+                state["tool_results"][call_id] = output
+        return
+
+    timestamp = parse_timestamp(record.get("timestamp", ""))
+
+    if payload_type == "message":
+        role = payload.get("role")
+        if role not in ("user", "assistant"):
+            return
+        content = extract_codex_content(payload.get("content", []))
+        state["messages"].append(MessageRecord(
+            uuid=payload.get("id", ""),
+            type=role,
+            content=content,
+            timestamp=timestamp,
+            tool_use=None,
+            tool_calls=None
+        ))
 
-        if payload_type == "message":
-            role = payload.get("role")
-            if role not in ("user", "assistant"):
-                continue
-            content = extract_codex_content(payload.get("content", []))
-            messages.append(Message(
-                uuid=payload.get("id", ""),
-                type=role,
-                content=content,
-                timestamp=timestamp,
-                tool_use=None,
-                tool_calls=None
-            ))
+    elif payload_type == "function_call":
+        call_id = payload.get("call_id", "")
+        name = map_codex_tool_name(payload.get("name", "unknown"))
+        tool_call = ToolCallRecord(
+            id=call_id,
+            name=name,
+            input=parse_codex_arguments(payload.get("arguments")),
+        )
+        tool_call.set_result(state["tool_results"].get(call_id))
+        state["tool_calls"][call_id] = tool_call
+        state["messages"].append(MessageRecord(
+            uuid=call_id,
+            type="assistant",
+            content="",
+            timestamp=timestamp,
+            tool_use=None,
+            tool_calls=[tool_call]
+        ))
 
-        elif payload_type == "function_call":
-            call_id = payload.get("call_id", "")
-            name = map_codex_tool_name(payload.get("name", "unknown"))
-            tool_calls = [
-                ToolCall(
-                    id=call_id,
-                    name=name,
-                    input=parse_codex_arguments(payload.get("arguments")),
-                    result=tool_results.get(call_id)
-                )
-            ]
-            messages.append(Message(
-                uuid=call_id,
-                type="assistant",
-                content="",
-                timestamp=timestamp,
-                tool_use=None,
-                tool_calls=tool_calls
-            ))
 
+def _finish_codex_detail(state: dict, session_file: Path) -> Optional[SessionRecord]:
+    if not state["records"]:
+        return None
+
+    messages = list(state["messages"])
     first_user_msg = next((m for m in messages if m.type == "user" and m.content), None)
     title = first_user_msg.content[:100] if first_user_msg else "(无标题)"
     if first_user_msg and len(first_user_msg.content) > 100:
         title += "..."
 
-    created_at = min(timestamps) if timestamps else datetime.now()
-    updated_at = max(timestamps) if timestamps else datetime.now()
+    created_at, updated_at = time_range(state)
 
-    return SessionDetail(
+    return SessionRecord(
         id=session_file.stem,
-        project_path=project_path,
-        project_name=project_name,
+        project_path=state["project_path"],
+        project_name=state["project_name"],
         title=title,
         created_at=created_at,
         updated_at=updated_at,
@@ -283,34 +328,240 @@ def get_codex_session_detail_by_file(session_file: Path) -> Optional[SessionDeta
     )
 
 
-def search_codex_sessions(query: str, limit: int = 50) -> List[SearchResult]:
-    """全文搜索 Codex 会话"""
-    results: List[SearchResult] = []
-    query_lower = query.lower()
+codex_detail_parser = IncrementalParser(_new_codex_detail_state, _feed_codex_detail, _finish_codex_detail)
+
+# 最近打开的会话详情：活跃会话追加内容后只解析新增的行
+codex_detail_cache = JsonlTailCache(codex_detail_parser, max_files=8, name="codex_detail")
+
+
+def _new_codex_message_index_state() -> dict:
+    state = new_message_index_state()
+    state.update({"records": 0, "project_path": "codex", "project_name": "codex", "title": None})
+    return state
+
+
+def _feed_codex_message_index(state: dict, offset: int, record: dict) -> None:
+    """记录可见消息和工具输出所在行的偏移（判断条件与 _feed_codex_detail 一致）"""
+    state["records"] += 1
+    ts = record.get("timestamp")
+    if ts:
+        track_time_range(state, ts)
+
+    record_type = record.get("type")
+    if record_type == "session_meta":
+        cwd = record.get("payload", {}).get("cwd")
+        if cwd:
+            project_path = codex_project_path_to_name(cwd)
+            state["project_path"] = project_path
+            state["project_name"] = project_path.split("/")[-1] if "/" in project_path else project_path
+        return
+
+    if record_type != "response_item":
+        return
+
+    payload = record.get("payload", {})
+    payload_type = payload.get("type")
+
+    if payload_type == "function_call_output":
+        call_id = payload.get("call_id")
+        if call_id:
+            state["tool_results"][call_id] = offset
+    elif payload_type == "message":
+        role = payload.get("role")
+        if role not in ("user", "assistant"):
+            return
+        state["offsets"].append(offset)
+        if state["title"] is None and role == "user":
+            content = extract_codex_content(payload.get("content", []))
+            if content:
+                state["title"] = content[:100] + ("..." if len(content) > 100 else "")
+    elif payload_type == "function_call":
+        state["offsets"].append(offset)
+
+
+def _finish_codex_message_index(state: dict, session_file: Path) -> Optional[SessionRecord]:
+    """会话信息（不含消息），与 _finish_codex_detail 一致"""
+    if not state["records"]:
+        return None
+
+    created_at, updated_at = time_range(state)
+
+    return SessionRecord(
+        id=session_file.stem,
+        project_path=state["project_path"],
+        project_name=state["project_name"],
+        title=state["title"] or "(无标题)",
+        created_at=created_at,
+        updated_at=updated_at,
+        messages=[],
+        file_changes=[],
+        source="codex"
+    )
+
+
+codex_message_index = MessageIndex(
+    IncrementalParser(_new_codex_message_index_state, _feed_codex_message_index, _finish_codex_message_index),
+    codex_detail_parser,
+    name="codex_messages",
+)
+
+
+def get_codex_session_messages(session_id: str, cursor: int = 0, limit: int = 50) -> Optional[MessagePage]:
+    """分页获取 Codex 会话消息"""
+    session_file = find_codex_session_file(session_id)
+    if session_file is None:
+        return None
+    return codex_message_index.page(session_file, cursor, limit)
+
+
+def get_codex_session_detail_by_file(session_file: Path) -> Optional[SessionRecord]:
+    """解析 Codex 会话详情"""
+    return codex_detail_cache.get(session_file)
+
+
+def get_codex_session_tool_result(session_id: str, tool_id: str) -> Optional[str]:
+    """获取工具调用的完整输出（会话详情中只有预览）；按消息索引中的偏移只读取输出所在的一行"""
+    session_file = find_codex_session_file(session_id)
+    if session_file is None:
+        return None
+    record = codex_message_index.tool_result_record(session_file, tool_id)
+    payload = (record or {}).get("payload", {})
+    if payload.get("type") != "function_call_output" or payload.get("call_id") != tool_id:
+        return None
+    output = payload.get("output")
+    return output if isinstance(output, str) else None
+
+
+# 压缩上下文只需要 message 和 function_call 记录（不含 function_call_output，输出行不解码）
+CODEX_CONTEXT_PREFILTER = (b'"message"', b'"function_call"')
+
+
+def _feed_codex_context(state: TurnBuilder, record: dict) -> None:
+    """按对话轮次累加消息（判断条件与 _feed_codex_detail 一致），不处理工具输出"""
+    if record.get("type") != "response_item":
+        return
+    payload = record.get("payload", {})
+    payload_type = payload.get("type")
+    if payload_type == "message":
+        role = payload.get("role")
+        if role == "user":
+            state.add_user(extract_codex_content(payload.get("content", [])))
+        elif role == "assistant":
+            state.add_assistant(extract_codex_content(payload.get("content", [])))
+    elif payload_type == "function_call":
+        name = map_codex_tool_name(payload.get("name", "unknown"))
+        # 只有文件修改会出现在压缩结果中，其他工具不解析参数
+        if name in FILE_EDIT_TOOLS:
+            state.add_assistant("", [(name, parse_codex_arguments(payload.get("arguments")).get("file_path", ""))])
+
+
+# 最近压缩过的会话的对话轮次：活跃会话追加内容后只解析新增的行
+codex_context_cache = JsonlTailCache(
+    IncrementalParser(
+        TurnBuilder, _feed_codex_context, lambda state, _path: state.turns(), prefilter=CODEX_CONTEXT_PREFILTER
+    ),
+    max_files=8,
+    name="codex_context",
+)
+
+
+def get_codex_session_turns(session_id: str) -> Optional[List[Turn]]:
+    """Codex 会话的对话轮次（用于压缩上下文），直接从原始记录构建，不构建会话详情"""
+    session_file = find_codex_session_file(session_id)
+    if session_file is None:
+        return None
+    return codex_context_cache.get(session_file)
+
+
+def _new_codex_search_state() -> dict:
+    return {"project_name": "codex", "docs": []}
+
+
+# 搜索只需要 session_meta（项目路径）和 message 记录
+CODEX_SEARCH_PREFILTER = (b'"session_meta"', b'"message"')
+
+
+def _feed_codex_search(state: dict, record: dict) -> None:
+    """提取可被全文索引的消息文本"""
+    record_type = record.get("type")
+    if record_type == "session_meta":
+        cwd = record.get("payload", {}).get("cwd")
+        if cwd:
+            project_path = codex_project_path_to_name(cwd)
+            state["project_name"] = project_path.split("/")[-1] if "/" in project_path else project_path
+        return
+    if record_type != "response_item":
+        return
+    payload = record.get("payload", {})
+    if payload.get("type") != "message":
+        return
+    role = payload.get("role")
+    if role not in ("user", "assistant"):
+        return
+    content = extract_codex_content(payload.get("content", []))
+    if content:
+        state["docs"].append((role, content, record.get("timestamp", "")))
+
+
+def _finish_codex_search(state: dict, _session_file: Path) -> str:
+    return state["project_name"]
+
+
+codex_search_index = SearchIndex(
+    "codex",
+    get_codex_session_files,
+    IncrementalParser(
+        _new_codex_search_state, _feed_codex_search, _finish_codex_search,
+        prefilter=CODEX_SEARCH_PREFILTER
+    ),
+    codex_summary_index,
+)
+
+
+def search_codex_sessions(query: SearchQuery, limit: int = 50) -> List[SearchResult]:
+    """全文搜索 Codex 会话（优先使用全文索引，按相关度排序）"""
+    results = codex_search_index.search(query, limit)
+    if results is not None:
+        return results
+    return list(iter_scan_codex_sessions(query, limit))
+
+
+def iter_search_codex_sessions(query: SearchQuery, limit: int = 50) -> Iterator[SearchResult]:
+    """流式全文搜索 Codex 会话：每找到一条结果立即产出"""
+    if codex_search_index.available:
+        return codex_search_index.iter_search(query, limit)
+    return iter_scan_codex_sessions(query, limit)
+
+
+def iter_scan_codex_sessions(query: SearchQuery, limit: int = 50) -> Iterator[SearchResult]:
+    """逐文件扫描搜索 Codex 会话（全文索引不可用时使用）"""
+    count = 0
+    # 先在原始字节中查找，只解码包含查询词的行；session_meta 行同时保留，用于确定项目
+    needles = scan_needles(query.expr)
+    if needles is not None:
+        needles += (b'"session_meta"',)
+    titles = codex_summary_index.titles()
+    may_match = scan_file_filter(query, codex_summary_index)
 
     for session_file in get_codex_session_files():
-        records = parse_jsonl_file(session_file)
-        if not records:
+        if not may_match(session_file):
             continue
-
         project_name = "codex"
-        title = "(无标题)"
+        # 会话标题取自摘要索引
+        title = titles.get(str(session_file), "(无标题)")
+        title = title[:50] + ("..." if len(title) > 50 else "")
 
+        if needles is None:
+            records = iter_jsonl(session_file, CODEX_SEARCH_PREFILTER)
+        else:
+            records = iter_jsonl_matches(session_file, needles)
         for record in records:
             if record.get("type") == "session_meta":
                 cwd = record.get("payload", {}).get("cwd")
                 if cwd:
                     project_path = codex_project_path_to_name(cwd)
                     project_name = project_path.split("/")[-1] if "/" in project_path else project_path
-            if record.get("type") == "response_item":
-                payload = record.get("payload", {})
-                if payload.get("type") == "message" and payload.get("role") == "user":
-                    content = extract_codex_content(payload.get("content", []))
-                    if content:
-                        title = content[:50] + ("..." if len(content) > 50 else "")
-                        break
-
-        for record in records:
+                continue
             if record.get("type") != "response_item":
                 continue
             payload = record.get("payload", {})
@@ -319,62 +570,29 @@ def search_codex_sessions(query: str, limit: int = 50) -> List[SearchResult]:
             role = payload.get("role")
             if role not in ("user", "assistant"):
                 continue
+            if not query.accepts(role, epoch_seconds(record.get("timestamp"))):
+                continue
 
             content = extract_codex_content(payload.get("content", []))
-            if query_lower in content.lower():
-                idx = content.lower().find(query_lower)
-                start = max(0, idx - 50)
-                end = min(len(content), idx + len(query) + 50)
-                matched = content[start:end]
-                if start > 0:
-                    matched = "..." + matched
-                if end < len(content):
-                    matched = matched + "..."
-
-                results.append(SearchResult(
+            if content and query.matches(content):
+                yield SearchResult(
                     session_id=session_file.stem,
                     project_name=project_name,
                     title=title,
                     timestamp=parse_timestamp(record.get("timestamp", "")),
-                    matched_content=matched,
+                    matched_content=make_snippet(content, query),
                     message_type=role,
                     source="codex"
-                ))
-
-                if len(results) >= limit:
-                    return results
+                )
 
-    return results
+                count += 1
+                if count >= limit:
+                    return
 
 
 def get_codex_projects() -> List[Project]:
-    """获取 Codex 项目列表（按 cwd 聚合）"""
-    projects: Dict[str, Project] = {}
-
-    for session_file in get_codex_session_files():
-        records = parse_jsonl_file(session_file)
-        if not records:
-            continue
-        project_path = "codex"
-        for record in records:
-            if record.get("type") == "session_meta":
-                cwd = record.get("payload", {}).get("cwd")
-                if cwd:
-                    project_path = codex_project_path_to_name(cwd)
-                break
-        project_name = project_path.split("/")[-1] if "/" in project_path else project_path
-        if project_path in projects:
-            projects[project_path].session_count += 1
-        else:
-            projects[project_path] = Project(
-                path=project_path,
-                name=project_name,
-                session_count=1
-            )
-
-    project_list = list(projects.values())
-    project_list.sort(key=lambda x: x.session_count, reverse=True)
-    return project_list
+    """获取 Codex 项目列表（按 cwd 聚合，由摘要索引提供）"""
+    return codex_summary_index.projects()
 
 
 def _extract_token_event(record: dict) -> Optional[dict]:
@@ -435,167 +653,43 @@ def _calculate_codex_cost(input_tokens: int, cached_input_tokens: int, output_to
     return cost
 
 
-def get_codex_usage_summary() -> UsageSummary:
-    """获取 Codex 使用量摘要：今日、本月、总计"""
-    from datetime import timezone
+def _feed_codex_usage(rollup: dict, record: dict) -> None:
+    """累加一条 token_count 事件到按日/按模型的聚合结果"""
+    last_usage = _extract_token_event(record)
+    if not last_usage:
+        return
 
-    now_local = datetime.now()
-    today = now_local.date()
-    first_of_month = today.replace(day=1)
+    timestamp_str = record.get("timestamp", "")
+    if not timestamp_str:
+        return
 
-    today_usage = TokenUsage()
-    month_usage = TokenUsage()
-    total_usage = TokenUsage()
+    try:
+        ts_utc = parse_timestamp(timestamp_str)
+        if ts_utc.tzinfo is None:
+            ts_utc = ts_utc.replace(tzinfo=timezone.utc)
+        ts_date = ts_utc.astimezone().date()
+    except Exception:
+        return
 
-    for jsonl_file in get_codex_session_files():
-        records = parse_jsonl_file(jsonl_file)
-        for record in records:
-            last_usage = _extract_token_event(record)
-            if not last_usage:
-                continue
+    model = _normalize_codex_model_name(_extract_model_name(record))
+    input_tokens = last_usage.get("input_tokens", 0)
+    output_tokens = last_usage.get("output_tokens", 0)
+    cache_read = last_usage.get("cached_input_tokens", 0)
+    cost = _calculate_codex_cost(input_tokens, cache_read, output_tokens, model)
+    add_usage(rollup, ts_date.isoformat(), model, input_tokens, output_tokens, 0, cache_read, cost)
 
-            timestamp_str = record.get("timestamp", "")
-            if not timestamp_str:
-                continue
 
-            try:
-                ts_utc = parse_timestamp(timestamp_str)
-                if ts_utc.tzinfo is None:
-                    ts_utc = ts_utc.replace(tzinfo=timezone.utc)
-                ts_local = ts_utc.astimezone()
-                ts_date = ts_local.date()
-            except Exception:
-                continue
+codex_usage_index = UsageIndex(
+    "codex", get_codex_session_files,
+    IncrementalParser(new_usage_rollup, _feed_codex_usage, copy_usage_rollup, prefilter=(b'"token_count"',))
+)
 
-            input_tokens = last_usage.get("input_tokens", 0)
-            output_tokens = last_usage.get("output_tokens", 0)
-            cache_read = last_usage.get("cached_input_tokens", 0)
-            model = _normalize_codex_model_name(_extract_model_name(record))
-            cost = _calculate_codex_cost(input_tokens, cache_read, output_tokens, model)
-
-            total_usage.input_tokens += input_tokens
-            total_usage.output_tokens += output_tokens
-            total_usage.cache_read_tokens += cache_read
-            total_usage.cost_usd += cost
-
-            if ts_date >= first_of_month:
-                month_usage.input_tokens += input_tokens
-                month_usage.output_tokens += output_tokens
-                month_usage.cache_read_tokens += cache_read
-                month_usage.cost_usd += cost
-
-            if ts_date == today:
-                today_usage.input_tokens += input_tokens
-                today_usage.output_tokens += output_tokens
-                today_usage.cache_read_tokens += cache_read
-                today_usage.cost_usd += cost
-
-    for usage in (today_usage, month_usage, total_usage):
-        usage.total_tokens = (
-            usage.input_tokens +
-            usage.output_tokens +
-            usage.cache_creation_tokens +
-            usage.cache_read_tokens
-        )
 
-    return UsageSummary(
-        today=today_usage,
-        this_month=month_usage,
-        total=total_usage
-    )
+def get_codex_usage_summary() -> UsageSummary:
+    """获取 Codex 使用量摘要：今日、本月、总计"""
+    return summarize_usage([codex_usage_index.rollup()])
 
 
 def get_codex_usage_detail(days: int = 30) -> UsageDetail:
     """获取 Codex 详细使用量统计"""
-    from datetime import timezone
-
-    daily_data: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
-        "models": set(),
-        "input_tokens": 0,
-        "output_tokens": 0,
-        "cache_creation_tokens": 0,
-        "cache_read_tokens": 0,
-        "cost_usd": 0.0
-    })
-
-    model_data: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
-        "input_tokens": 0,
-        "output_tokens": 0,
-        "cache_creation_tokens": 0,
-        "cache_read_tokens": 0,
-        "total_tokens": 0,
-        "cost_usd": 0.0
-    })
-
-    today = datetime.now().date()
-    cutoff_date = today - timedelta(days=days)
-
-    for jsonl_file in get_codex_session_files():
-        records = parse_jsonl_file(jsonl_file)
-        for record in records:
-            last_usage = _extract_token_event(record)
-            if not last_usage:
-                continue
-
-            timestamp_str = record.get("timestamp", "")
-            if not timestamp_str:
-                continue
-
-            try:
-                ts_utc = parse_timestamp(timestamp_str)
-                if ts_utc.tzinfo is None:
-                    ts_utc = ts_utc.replace(tzinfo=timezone.utc)
-                ts_local = ts_utc.astimezone()
-                ts_date = ts_local.date()
-            except Exception:
-                continue
-
-            if ts_date < cutoff_date:
-                continue
-
-            date_str = ts_date.isoformat()
-            model = _normalize_codex_model_name(_extract_model_name(record))
-            input_tokens = last_usage.get("input_tokens", 0)
-            output_tokens = last_usage.get("output_tokens", 0)
-            cache_read = last_usage.get("cached_input_tokens", 0)
-            cost = _calculate_codex_cost(input_tokens, cache_read, output_tokens, model)
-
-            daily_data[date_str]["models"].add(model)
-            daily_data[date_str]["input_tokens"] += input_tokens
-            daily_data[date_str]["output_tokens"] += output_tokens
-            daily_data[date_str]["cache_read_tokens"] += cache_read
-            daily_data[date_str]["cost_usd"] += cost
-
-            model_data[model]["input_tokens"] += input_tokens
-            model_data[model]["output_tokens"] += output_tokens
-            model_data[model]["cache_read_tokens"] += cache_read
-            model_data[model]["cost_usd"] += cost
-
-    daily_usage = []
-    for date_str, data in sorted(daily_data.items(), reverse=True):
-        total = (data["input_tokens"] + data["output_tokens"] +
-                 data["cache_creation_tokens"] + data["cache_read_tokens"])
-        models = sorted([m for m in data["models"] if m != "unknown"])
-        daily_usage.append(DailyUsage(
-            date=date_str,
-            models=models,
-            input_tokens=data["input_tokens"],
-            output_tokens=data["output_tokens"],
-            cache_creation_tokens=data["cache_creation_tokens"],
-            cache_read_tokens=data["cache_read_tokens"],
-            total_tokens=total,
-            cost_usd=data["cost_usd"]
-        ))
-
-    by_model = {}
-    for model, data in model_data.items():
-        if model == "unknown":
-            continue
-        data["total_tokens"] = (data["input_tokens"] + data["output_tokens"] +
-                                data["cache_creation_tokens"] + data["cache_read_tokens"])
-        by_model[model] = data
-
-    return UsageDetail(
-        daily_usage=daily_usage,
-        by_model=by_model
-    )
+    return detail_usage([codex_usage_index.rollup()], days)
@@ -1,31 +1,523 @@
 """共享工具函数"""
 import json
-from datetime import datetime
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import List
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
 from dateutil import parser as date_parser
 
+import metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 用于识别文件被重写（而非追加）的开头字节数
+HEAD_PROBE_SIZE = 128
+
+# JSON 解码器：安装了 orjson 时默认使用，可通过 SESSION_VIEWER_JSON=json 强制使用标准库
+JSON_DECODER = os.environ.get("SESSION_VIEWER_JSON", "orjson" if orjson else "json").lower()
+json_loads: Callable[[Union[bytes, str]], Any] = (
+    orjson.loads if orjson is not None and JSON_DECODER == "orjson" else json.loads
+)
+
+# 行预过滤：只解码包含其中任一字节串的行，例如 (b'"usage"',)
+LinePrefilter = Optional[Tuple[bytes, ...]]
+
+# 时间戳解析结果的缓存条数（同一条记录会在摘要、详情、搜索、统计中各解析一次）
+TIMESTAMP_CACHE_SIZE = 8192
+
+
+@lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)
+def _parse_timestamp_cached(ts: str) -> datetime:
+    """各来源写入的都是 ISO-8601（UTC 时以 Z 结尾），优先用 fromisoformat；
+    其他格式交给 dateutil，仍无法解析时抛出异常（不缓存）"""
+    with metrics.phase("timestamp"):
+        try:
+            if ts[-1] in "Zz":
+                return datetime.fromisoformat(ts[:-1]).replace(tzinfo=timezone.utc)
+            return datetime.fromisoformat(ts)
+        except ValueError:
+            return date_parser.parse(ts)
+
+
+metrics.register_cache_stats("timestamp", lambda: _parse_timestamp_cached.cache_info()[:2])
+
 
 def parse_timestamp(ts: str) -> datetime:
     """解析时间戳"""
+    if not ts:
+        return datetime.now()
     try:
-        return date_parser.parse(ts)
+        return _parse_timestamp_cached(ts)
     except Exception:
         return datetime.now()
 
 
-def parse_jsonl_file(file_path: Path) -> List[dict]:
-    """解析单个 JSONL 文件"""
-    records: List[dict] = []
+def epoch_seconds(ts: Optional[str]) -> Optional[float]:
+    """时间戳字符串 -> Unix 时间戳（不带时区的按本地时间）；为空或无法解析时返回 None"""
+    if not ts:
+        return None
     try:
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        return _parse_timestamp_cached(ts).timestamp()
+    except Exception:
+        return None
+
+
+def track_time_range(state: dict, ts: str) -> None:
+    """在可 JSON 序列化的 state 中维护最早/最晚时间戳"""
+    dt = parse_timestamp(ts)
+    value = dt.timestamp()
+    if state.get("created_ts") is None or value < state["created_ts"]:
+        state["created_ts"] = value
+        state["created_at"] = dt.isoformat()
+    if state.get("updated_ts") is None or value > state["updated_ts"]:
+        state["updated_ts"] = value
+        state["updated_at"] = dt.isoformat()
+
+
+def time_range(state: dict) -> Tuple[datetime, datetime]:
+    """从 track_time_range 维护的 state 中取出 (created_at, updated_at)"""
+    if state.get("created_at") is None:
+        return datetime.now(), datetime.now()
+    return datetime.fromisoformat(state["created_at"]), datetime.fromisoformat(state["updated_at"])
+
+
+def _decode_jsonl_line(line: bytes) -> Optional[dict]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json_loads(line)
+    except ValueError:
+        # 含非法 UTF-8 等情况：忽略无法解码的字节后用标准库重试
+        try:
+            return json.loads(line.decode("utf-8", errors="ignore"))
+        except ValueError:
+            return None
+
+
+def _prefilter_match(line: bytes, prefilter: LinePrefilter) -> bool:
+    if not prefilter:
+        return True
+    for needle in prefilter:
+        if needle in line:
+            return True
+    return False
+
+
+class JsonlCheckpoint(NamedTuple):
+    """JSONL 文件的读取进度"""
+    inode: int
+    offset: int  # 已完整消费的字节偏移
+    head: bytes  # 文件开头若干字节，用于识别文件被重写
+
+
+class JsonlStream:
+    """流式读取追加写入的 JSONL 文件，逐行解码，峰值内存只取决于最长的一行
+
+    用法：
+        with JsonlStream(path, checkpoint) as stream:
+            if stream.reset:
+                ...  # 从文件开头重新读取（首次读取或文件被重写）
+            for record in stream:
+                ...
+        stream.checkpoint  # 新的读取进度
+
+    末尾尚未写完的行（无换行且无法解析）会留到下次读取；
+    指定 prefilter 时，不包含任一字节串的行直接跳过，不做 JSON 解码。
+    指定 end 时读到该字节偏移所在的行为止（按读取的字节数，而不是产出的记录数）。
+    文件无法读取时不产生记录，checkpoint 保持不变。
+    """
+
+    def __init__(
+        self,
+        file_path: Path,
+        checkpoint: Optional[JsonlCheckpoint] = None,
+        prefilter: LinePrefilter = None,
+        end: Optional[int] = None,
+    ):
+        self.file_path = file_path
+        self.checkpoint = checkpoint
+        self.prefilter = prefilter
+        self.end = end
+        self.reset = False
+        # 最近产出的记录所在行的起始字节偏移
+        self.record_offset = 0
+        self._file = None
+
+    def __enter__(self) -> "JsonlStream":
+        try:
+            self._file = open(self.file_path, "rb")
+            st = os.fstat(self._file.fileno())
+            head = self._file.read(HEAD_PROBE_SIZE)
+            offset = 0
+            checkpoint = self.checkpoint
+            if (
+                checkpoint is not None
+                and checkpoint.inode == st.st_ino
+                and checkpoint.offset <= st.st_size
+                and head[:len(checkpoint.head)] == checkpoint.head
+            ):
+                offset = checkpoint.offset
+            self._file.seek(offset)
+        except OSError as e:
+            print(f"Error parsing {self.file_path}: {e}")
+            self.close()
+            return self
+        self.reset = offset == 0
+        self.checkpoint = JsonlCheckpoint(st.st_ino, offset, head)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __iter__(self) -> Iterator[dict]:
+        if self._file is None:
+            return
+        inode, offset, head = self.checkpoint
+        start_offset = offset
+        # 读取/解码耗时在局部累计（不含调用方处理记录的时间），结束时计入一次
+        busy = decode = 0.0
+        clock = metrics.clock()
+        resumed = clock()
+        try:
+            for line in self._file:
+                complete = line.endswith(b"\n")
+                if _prefilter_match(line, self.prefilter):
+                    decode_start = clock()
+                    record = _decode_jsonl_line(line)
+                    decode += clock() - decode_start
+                    if record is None and not complete:
+                        break
+                elif complete:
+                    record = None
+                else:
+                    # 末尾无换行的行不匹配时可能尚未写完，留到下次读取
+                    break
+                self.record_offset = offset
+                offset += len(line)
+                if record is not None:
+                    busy += clock() - resumed
+                    yield record
+                    resumed = clock()
+                if self.end is not None and offset >= self.end:
+                    break
+        except OSError as e:
+            print(f"Error parsing {self.file_path}: {e}")
+        finally:
+            self.checkpoint = JsonlCheckpoint(inode, offset, head)
+            busy += clock() - resumed
+            metrics.record("read", busy - decode, offset - start_offset)
+            metrics.record("json", decode)
+
+
+def iter_jsonl(file_path: Path, prefilter: LinePrefilter = None) -> Iterator[dict]:
+    """逐条产出整个 JSONL 文件的记录（不保留在内存中）"""
+    with JsonlStream(file_path, prefilter=prefilter) as stream:
+        yield from stream
+
+
+def iter_jsonl_range(file_path: Path, start: int, end: Optional[int] = None) -> Iterator[dict]:
+    """逐条产出字节范围 [start, end) 内的记录（start 需为行首偏移）"""
+    position = start
+    busy = decode = 0.0
+    clock = metrics.clock()
+    resumed = clock()
+    try:
+        with open(file_path, "rb") as f:
+            f.seek(start)
             for line in f:
-                line = line.strip()
-                if line:
-                    try:
-                        records.append(json.loads(line))
-                    except json.JSONDecodeError:
-                        continue
-    except Exception as e:
+                if end is not None and position >= end:
+                    break
+                position += len(line)
+                decode_start = clock()
+                record = _decode_jsonl_line(line)
+                decode += clock() - decode_start
+                if record is not None:
+                    busy += clock() - resumed
+                    yield record
+                    resumed = clock()
+    except OSError as e:
         print(f"Error parsing {file_path}: {e}")
-    return records
+    finally:
+        busy += clock() - resumed
+        metrics.record("read", busy - decode, position - start)
+        metrics.record("json", decode)
+
+
+def read_jsonl_record(file_path: Path, offset: int) -> Optional[dict]:
+    """读取 offset 处的一行记录"""
+    return next(iter_jsonl_range(file_path, offset), None)
+
+
+# mmap 字节预过滤：每次转换为小写并查找的块大小
+SCAN_CHUNK_SIZE = 1 << 20
+
+
+def search_needles(query: str) -> Optional[Tuple[bytes, ...]]:
+    """子串查询在 JSONL 原始字节中的形式（小写、按 JSON 转义，含 \\uXXXX 转义的写法）
+
+    消息文本是 JSON 字符串的子串（多段以换行拼接），因此内容中包含 query 时原始字节中必然包含其转义形式。
+    字节比较只能忽略 ASCII 的大小写：query 含换行或有大小写之分的非 ASCII 字符时无法预过滤，返回 None。
+    """
+    if "\n" in query or "\r" in query:
+        return None
+    if any(ord(c) > 127 and c.lower() != c.upper() for c in query):
+        return None
+    lower = query.lower()
+    needles = {json.dumps(lower, ensure_ascii=False)[1:-1].encode(), json.dumps(lower)[1:-1].encode()}
+    return tuple(sorted(needles))
+
+
+def _iter_hit_lines(mm: mmap.mmap, needles: Tuple[bytes, ...]) -> Iterator[Tuple[int, int]]:
+    """按顺序产出包含任一 needle（ASCII 不区分大小写）的行的 [start, end) 范围，每行一次"""
+    size = len(mm)
+    overlap = max(len(n) for n in needles) - 1
+    line_end = 0
+    position = 0
+    while position < size:
+        chunk_end = min(size, position + SCAN_CHUNK_SIZE)
+        chunk = mm[position:min(size, chunk_end + overlap)].lower()
+        hits = []
+        for needle in needles:
+            i = chunk.find(needle)
+            while i >= 0 and position + i < chunk_end:
+                hits.append(position + i)
+                i = chunk.find(needle, i + 1)
+        for hit in sorted(hits):
+            if hit < line_end:
+                continue
+            start = mm.rfind(b"\n", 0, hit) + 1
+            line_end = mm.find(b"\n", hit)
+            line_end = size if line_end < 0 else line_end + 1
+            yield start, line_end
+        position = chunk_end
+
+
+def _open_mmap(file_path: Path) -> Optional[mmap.mmap]:
+    try:
+        with open(file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        print(f"Error parsing {file_path}: {e}")
+        return None
+
+
+def bytes_contain(data: bytes, needles: Tuple[bytes, ...]) -> bool:
+    """已读入内存的原始字节中是否包含任一 needle（ASCII 不区分大小写，needles 见 search_needles）"""
+    lowered = data.lower()
+    return any(needle in lowered for needle in needles)
+
+
+def iter_jsonl_matches(file_path: Path, needles: Tuple[bytes, ...]) -> Iterator[dict]:
+    """mmap 整个文件按字节查找 needles，只解码包含命中的行（没有命中的文件不解码任何一行）"""
+    mm = _open_mmap(file_path)
+    if mm is None:
+        return
+    scanned = len(mm)
+    busy = decode = 0.0
+    clock = metrics.clock()
+    resumed = clock()
+    try:
+        with mm:
+            for start, end in _iter_hit_lines(mm, needles):
+                decode_start = clock()
+                record = _decode_jsonl_line(mm[start:end])
+                decode += clock() - decode_start
+                if record is not None:
+                    busy += clock() - resumed
+                    yield record
+                    resumed = clock()
+    finally:
+        busy += clock() - resumed
+        # 字节数按整个文件计（mmap 查找会读取全部内容）
+        metrics.record("read", busy - decode, scanned)
+        metrics.record("json", decode)
+
+
+class IncrementalParser(NamedTuple):
+    """按记录增量构建结果：new_state() -> feed(state, record)* -> finish(state, path)
+
+    prefilter 为可选的行预过滤（见 LinePrefilter），feed 不关心的行不会被解码。
+    """
+    new_state: Callable[[], Any]
+    feed: Callable[[Any, dict], None]
+    finish: Callable[[Any, Path], Any]
+    prefilter: LinePrefilter = None
+
+
+def parse_jsonl_with(parser: IncrementalParser, file_path: Path) -> Any:
+    """用增量解析器一次性解析整个文件"""
+    state = parser.new_state()
+    for record in iter_jsonl(file_path, parser.prefilter):
+        parser.feed(state, record)
+    return parser.finish(state, file_path)
+
+
+class _TailEntry:
+    __slots__ = ("signature", "checkpoint", "state", "lock")
+
+    def __init__(self):
+        self.signature: Optional[Tuple[int, int]] = None
+        self.checkpoint: Optional[JsonlCheckpoint] = None
+        self.state: Any = None
+        # 解析和 finish 都在条目自己的锁内进行，只阻塞同一文件的请求
+        self.lock = threading.Lock()
+
+
+class JsonlTailCache:
+    """内存缓存：记住每个文件的读取进度和解析状态，文件追加时只解析新增的行
+
+    Args:
+        parser: 增量解析器
+        max_files: 最多缓存的文件数（LRU 淘汰），None 表示不限
+        name: 指标中的缓存名称（命中 hit / 只解析新增的行 append / 从头解析 miss）
+    """
+
+    def __init__(self, parser: IncrementalParser, max_files: Optional[int] = None, name: str = "jsonl_tail"):
+        self.parser = parser
+        self.max_files = max_files
+        self.name = name
+        self._entries: "OrderedDict[str, _TailEntry]" = OrderedDict()
+        # 只保护 _entries 本身，不在其中解析文件
+        self._lock = threading.Lock()
+
+    def get(self, file_path: Path) -> Any:
+        """返回文件最新内容对应的 finish(state, path) 结果
+
+        新文件解析成功后才放入缓存；同一新文件并发未命中时可能解析两次，保留先放入的条目。
+        解析出错时丢弃该文件的条目（状态可能只累加了一部分）并抛出异常。
+        """
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            self.discard(file_path)
+            return self._finish(self.parser.new_state(), file_path)
+        signature = (st.st_mtime_ns, st.st_size)
+        key = str(file_path)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        cached = entry is not None
+        if not cached:
+            entry = _TailEntry()
+
+        with entry.lock:
+            if entry.signature != signature:
+                try:
+                    with JsonlStream(file_path, entry.checkpoint, self.parser.prefilter) as stream:
+                        reset = stream.reset or entry.state is None
+                        if reset:
+                            entry.state = self.parser.new_state()
+                        self._consume(entry.state, stream)
+                except BaseException:
+                    if cached:
+                        self._remove(key, entry)
+                    raise
+                entry.signature = signature
+                entry.checkpoint = stream.checkpoint
+                metrics.count_cache(self.name, "miss" if reset else "append")
+            else:
+                metrics.count_cache(self.name, "hit")
+            result = self._finish(entry.state, file_path)
+
+        if not cached:
+            with self._lock:
+                self._entries.setdefault(key, entry)
+                self._entries.move_to_end(key)
+                if self.max_files is not None:
+                    while len(self._entries) > self.max_files:
+                        self._entries.popitem(last=False)
+        return result
+
+    def _remove(self, key: str, entry: _TailEntry) -> None:
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+
+    def _consume(self, state: Any, stream: JsonlStream) -> None:
+        for record in stream:
+            self.parser.feed(state, record)
+
+    def _finish(self, state: Any, file_path: Path) -> Any:
+        return self.parser.finish(state, file_path)
+
+    def discard(self, file_path: Path) -> None:
+        with self._lock:
+            self._entries.pop(str(file_path), None)
+
+    def retain(self, file_paths: List[Path]) -> None:
+        """丢弃不在 file_paths 中的缓存（文件已删除）"""
+        keep = {str(p) for p in file_paths}
+        with self._lock:
+            for key in [k for k in self._entries if k not in keep]:
+                del self._entries[key]
+
+
+class FileCache:
+    """内存缓存：整体解析的文件（如 Gemini 的 JSON 会话）按 (mtime_ns, size) 缓存解析结果
+
+    Args:
+        load: 解析函数 load(path)，返回 None 表示无法解析（不缓存）
+        max_files: 最多缓存的文件数（LRU 淘汰）
+        name: 指标中的缓存名称（命中 hit / 重新解析 miss）
+    """
+
+    def __init__(self, load: Callable[[Path], Any], max_files: int = 8, name: str = "file"):
+        self.load = load
+        self.max_files = max_files
+        self.name = name
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_path: Path) -> Any:
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            self.discard(file_path)
+            return None
+        signature = (st.st_mtime_ns, st.st_size)
+        key = str(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                metrics.count_cache(self.name, "hit")
+                return entry[1]
+        # 解析在锁外进行，不阻塞其他文件的命中；同一文件并发未命中时可能解析两次
+        metrics.count_cache(self.name, "miss")
+        value = self.load(file_path)
+        if value is not None:
+            with self._lock:
+                self._entries[key] = (signature, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_files:
+                    self._entries.popitem(last=False)
+        return value
+
+    def discard(self, file_path: Path) -> None:
+        with self._lock:
+            self._entries.pop(str(file_path), None)
+
+    def retain(self, file_paths: List[Path]) -> None:
+        """丢弃不在 file_paths 中的缓存（文件已删除）"""
+        keep = {str(p) for p in file_paths}
+        with self._lock:
+            for key in [k for k in self._entries if k not in keep]:
+                del self._entries[key]
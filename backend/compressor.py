@@ -1,59 +1,218 @@
-"""会话压缩模块 - 将历史对话压缩为紧凑的 Markdown 格式"""
-from typing import List
-from models import Message, ToolCall
+"""会话压缩模块 - 将历史对话压缩为紧凑的 Markdown 格式
 
+各来源的解析器直接从原始记录构建对话轮次（TurnBuilder），不构建完整的会话详情，
+也不读取工具结果；compress_turns 按 token 预算渲染：从最新的轮次开始完整保留，
+放不下的较早轮次压缩为一行摘要，再放不下的省略。
 
-def compress_session(messages: List[Message]) -> str:
+环境变量：
+    SESSION_VIEWER_CONTEXT_TOKENS: 默认的 token 预算，默认 32000，0 表示不限
+"""
+import os
+from typing import Iterable, List, Optional, Tuple
+
+DEFAULT_MAX_TOKENS = int(os.environ.get("SESSION_VIEWER_CONTEXT_TOKENS", "32000"))
+
+# 只有这些工具调用会出现在压缩结果中（文件修改记录）
+FILE_EDIT_TOOLS = ("Edit", "Write")
+
+# 超出预算时，完整保留的轮次最多占用的比例，其余留给较早轮次的摘要
+FULL_TURNS_SHARE = 0.8
+# 摘要中用户问题的最大长度（字符）
+SUMMARY_CHARS = 80
+
+
+def estimate_tokens(text: str) -> int:
+    """本地估算 token 数：ASCII 约 4 个字符 1 个 token，中文等非 ASCII 字符约 1 个字符 1 个 token
+
+    只做一次 UTF-8 编码（C 实现），不逐字符遍历：非 ASCII 字符多为 3 字节，按多出的字节数折算。
+    """
+    chars = len(text)
+    if text.isascii():
+        return (chars + 3) // 4
+    wide = (len(text.encode("utf-8", errors="replace")) - chars) // 2
+    return (chars - wide + 3) // 4 + wide
+
+
+class Turn:
+    """一轮对话：用户问题 + 其后的 assistant 回答和文件修改"""
+    __slots__ = ("user", "answers", "edits")
+
+    def __init__(self, user: str):
+        self.user = user
+        self.answers: List[str] = []
+        self.edits: List[Tuple[str, str]] = []  # (工具名, 文件路径)
+
+    def copy(self) -> "Turn":
+        turn = Turn(self.user)
+        turn.answers = list(self.answers)
+        turn.edits = list(self.edits)
+        return turn
+
+
+class TurnBuilder:
+    """按消息顺序把对话分组为轮次（可作为 IncrementalParser 的状态，随文件追加继续累加）
+
+    一轮 = 用户消息 + 若干 assistant 消息（包含工具调用）；第一条用户消息之前的 assistant 消息忽略。
     """
-    压缩会话内容为 Markdown 格式
+    __slots__ = ("_turns",)
+
+    def __init__(self):
+        self._turns: List[Turn] = []
 
-    保留：用户问题 + Claude 结论性回答 + 文件修改记录
-    删除：thinking、过渡性文字、探索性工具调用结果
+    def add_user(self, content: str) -> None:
+        self._turns.append(Turn(content))
+
+    def add_assistant(self, content: str, tools: Iterable[Tuple[str, str]] = ()) -> None:
+        """tools 为 (工具名, 文件路径)，只保留文件修改"""
+        if not self._turns:
+            return
+        turn = self._turns[-1]
+        if content:
+            turn.answers.append(content)
+        for name, file_path in tools:
+            if name in FILE_EDIT_TOOLS:
+                turn.edits.append((name, file_path))
+
+    def turns(self) -> List[Turn]:
+        """当前的轮次列表；只有最后一轮还会被后续记录修改，返回它的副本"""
+        if not self._turns:
+            return []
+        return self._turns[:-1] + [self._turns[-1].copy()]
+
+
+def compress_turns(turns: List[Turn], max_tokens: Optional[int] = None) -> str:
+    """
+    按 token 预算把对话轮次渲染为 Markdown
+
+    全部轮次放得下时完整输出；否则从最新的轮次开始完整保留（最多占预算的 FULL_TURNS_SHARE），
+    更早的轮次各压缩为一行摘要，预算用完后更早的轮次只记录省略的数量。
+    最新一轮本身超出预算时截断其内容。只渲染用得到的轮次，耗时与预算而不是会话长度相关。
 
     Args:
-        messages: 消息列表
+        turns: 对话轮次（见 TurnBuilder）
+        max_tokens: token 预算（按 estimate_tokens 估算），None 表示不限
 
     Returns:
         压缩后的 Markdown 字符串
     """
-    # 过滤掉非对话消息
-    dialog_messages = [m for m in messages if m.type in ('user', 'assistant')]
-
-    if not dialog_messages:
+    if not turns:
         return "无对话内容"
 
-    lines = ["## 历史对话", ""]
-    turns = _group_into_turns(dialog_messages)
+    header = ["## 历史对话", ""]
+    if max_tokens is None:
+        lines = list(header)
+        for i, turn in enumerate(turns, 1):
+            lines.extend(_render_turn(i, turn))
+        return "\n".join(lines)
+
+    budget = max_tokens - estimate_tokens("\n".join(header))
+    full_limit = int(budget * FULL_TURNS_SHARE)
+    # 从最新的轮次向前完整渲染，直到超出预算
+    blocks: List[List[str]] = []
+    used = 0
+    within_share = 0  # 在 full_limit 以内的轮次数
+    for i in range(len(turns), 0, -1):
+        block = _render_turn(i, turns[i - 1])
+        used += estimate_tokens("\n".join(block)) + 1
+        if used > budget:
+            break
+        blocks.append(block)
+        if used <= full_limit:
+            within_share += 1
+    else:
+        # 全部放得下
+        return "\n".join(header + [line for block in reversed(blocks) for line in block])
+
+    blocks = blocks[:within_share]
+    if not blocks:
+        newest = len(turns)
+        blocks = [_render_turn(newest, _truncate_turn(turns[-1], full_limit))]
+    used = sum(estimate_tokens("\n".join(block)) + 1 for block in blocks)
+
+    # 更早的轮次从新到旧压缩为摘要，直到预算用完
+    first_full = len(turns) - len(blocks) + 1
+    summaries: List[str] = []
+    summary_title = ["---", "### 较早的对话（已压缩）", ""]
+    used += estimate_tokens("\n".join(summary_title)) + 1
+    omitted = first_full - 1
+    for i in range(first_full - 1, 0, -1):
+        line = _summarize_turn(i, turns[i - 1])
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        summaries.append(line)
+        used += cost
+        omitted -= 1
+
+    lines = list(header)
+    if omitted:
+        lines.append(f"> 更早的 {omitted} 轮对话已省略")
+        lines.append("")
+    if summaries:
+        lines.extend(summary_title)
+        lines.extend(reversed(summaries))
+        lines.append("")
+    for block in reversed(blocks):
+        lines.extend(block)
+    return "\n".join(lines)
+
+
+def _render_turn(index: int, turn: Turn) -> List[str]:
+    lines = ["---", f"### 第{index}轮", ""]
 
-    for i, turn in enumerate(turns, 1):
-        lines.append("---")
-        lines.append(f"### 第{i}轮")
+    # 完整用户问题
+    if turn.user:
+        lines.append(f"**用户**：{turn.user}")
         lines.append("")
 
-        # 完整用户问题
-        if turn.get('user'):
-            lines.append(f"**用户**：{turn['user']}")
-            lines.append("")
-
-        # Claude 回答（清理过渡性文字）
-        if turn.get('assistant'):
-            answer = _clean_assistant_text(turn['assistant'])
-            if answer:
-                lines.append(f"**Claude**：{answer}")
-                lines.append("")
-
-        # 只保留有价值的工具详情（Edit/Write）
-        valuable_tools = [t for t in turn.get('tool_details', [])
-                        if t['name'] in ('Edit', 'Write')]
-        if valuable_tools:
-            lines.append("**文件修改**：")
-            for tool in valuable_tools:
-                path = tool.get('input_summary', '')
-                filename = path.split('/')[-1] if path else ''
-                lines.append(f"- {tool['name']}: {filename}")
-            lines.append("")
+    # Claude 回答（清理过渡性文字）
+    answer = _clean_assistant_text("\n\n".join(turn.answers))
+    if answer:
+        lines.append(f"**Claude**：{answer}")
+        lines.append("")
 
-    return "\n".join(lines)
+    # 只保留有价值的工具详情（Edit/Write）
+    if turn.edits:
+        lines.append("**文件修改**：")
+        for name, path in turn.edits:
+            lines.append(f"- {name}: {_file_name(path)}")
+        lines.append("")
+
+    return lines
+
+
+def _summarize_turn(index: int, turn: Turn) -> str:
+    """一轮对话的一行摘要：用户问题的开头 + 修改过的文件"""
+    question = " ".join(turn.user.split())
+    if len(question) > SUMMARY_CHARS:
+        question = question[:SUMMARY_CHARS] + "…"
+    line = f"- 第{index}轮：{question or '（无用户输入）'}"
+    if turn.edits:
+        names = list(dict.fromkeys(_file_name(path) for _, path in turn.edits))
+        line += f"（修改 {', '.join(names)}）"
+    return line
+
+
+def _truncate_turn(turn: Turn, max_tokens: int) -> Turn:
+    """把一轮对话截断到约 max_tokens：用户问题保留开头（最多占四分之一），回答保留结尾的结论"""
+    user = _truncate_text(turn.user, max_tokens // 4, keep_end=False)
+    answer = "\n\n".join(turn.answers)
+    rest = max(max_tokens - estimate_tokens(user) - 10 * len(turn.edits), 0)
+    truncated = Turn(user)
+    truncated.answers = [_truncate_text(answer, rest, keep_end=True)]
+    truncated.edits = list(turn.edits)
+    return truncated
+
+
+def _truncate_text(text: str, max_tokens: int, keep_end: bool) -> str:
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    # 按平均每个 token 的字符数折算保留的长度
+    chars = max(int(len(text) * max_tokens / tokens) - 20, 0)
+    if keep_end:
+        return "…（前文已截断）\n\n" + text[len(text) - chars:] if chars else "…（已截断）"
+    return text[:chars] + "…（已截断）" if chars else "…（已截断）"
 
 
 def _clean_assistant_text(text: str) -> str:
@@ -65,47 +224,5 @@ def _clean_assistant_text(text: str) -> str:
     return '\n\n'.join(paragraphs)
 
 
-def _group_into_turns(messages: List[Message]) -> List[dict]:
-    """
-    将消息分组为对话轮次
-    一轮 = 用户消息 + 若干 assistant 消息（包含工具调用）
-    """
-    turns = []
-    current_turn = None
-
-    for msg in messages:
-        if msg.type == 'user':
-            # 新的一轮开始
-            if current_turn:
-                turns.append(current_turn)
-            current_turn = {
-                'user': msg.content,
-                'assistant': '',
-                'tool_details': []
-            }
-        elif msg.type == 'assistant' and current_turn:
-            # 累积 assistant 回答
-            if msg.content:
-                if current_turn['assistant']:
-                    current_turn['assistant'] += "\n\n"
-                current_turn['assistant'] += msg.content
-
-            # 提取工具调用
-            if msg.tool_calls:
-                for tool in msg.tool_calls:
-                    current_turn['tool_details'].append({
-                        'name': tool.name,
-                        'input_summary': _get_file_path(tool),
-                    })
-
-    # 添加最后一轮
-    if current_turn:
-        turns.append(current_turn)
-
-    return turns
-
-
-def _get_file_path(tool: ToolCall) -> str:
-    """从工具调用中提取文件路径"""
-    input_data = tool.input or {}
-    return input_data.get('file_path', '')
+def _file_name(path: str) -> str:
+    return path.split('/')[-1] if path else ''
@@ -0,0 +1,105 @@
+"""会话数据版本 - 用于 HTTP 条件请求（ETag / Last-Modified / 304）
+
+每个来源一个版本号：由后台监听维护时为变化计数（文件变化时加一，无需任何文件操作）；
+未监听时由所有会话文件的 (路径, mtime, 大小) 计算指纹，只需 stat，不解析文件；
+stat 结果在请求内与随后索引的 diff 共用（见 cache_db.stat_scope），每个文件只 stat 一次。
+摘要索引在后台补全探测结果后（见 session_index）版本号也会变化。
+所有校验值都包含 RESPONSE_VERSION，响应格式变化后客户端缓存的旧响应不会再被 304 复用。
+"""
+import hashlib
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Callable, List, NamedTuple, Optional
+
+import metrics
+from cache_db import stat_file
+
+# 响应格式版本：响应的字段或内容变化时递增（如新增 incomplete、工具结果预览）
+RESPONSE_VERSION = 2
+
+# 进程启动标识：重启后计数从 0 开始，需与之前发出的 ETag 区分
+_BOOT_ID = format(time.time_ns(), "x")
+
+
+class Validators(NamedTuple):
+    """HTTP 缓存校验值"""
+    etag: str           # 已加引号的 ETag
+    last_modified: str  # HTTP 日期格式
+
+
+def file_validators(file_path: Path) -> Optional[Validators]:
+    """单个文件的校验值；文件不存在时返回 None"""
+    st = stat_file(file_path)
+    if st is None:
+        return None
+    etag = f'"v{RESPONSE_VERSION}-{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}"'
+    return Validators(etag, formatdate(st.st_mtime, usegmt=True))
+
+
+class CorpusVersion:
+    """单个来源的数据版本
+
+    提供与索引相同的 refresh(paths=None) 方法和 watched 属性，
+    放入 WatchTarget.indexes 后由后台监听在文件变化时递增版本。
+
+    Args:
+        source: 数据来源
+        list_files: 列出该来源所有会话文件（含统计用的文件）
+        summary_index: 同来源的摘要索引，其 generation 计入版本号
+    """
+
+    def __init__(self, source: str, list_files: Callable[[], List[Path]], summary_index: Any = None):
+        self.source = source
+        self.list_files = list_files
+        self.summary_index = summary_index
+        self.watched = False
+        self._generation = 0
+        self._modified_at = time.time()
+        self._lock = threading.Lock()
+
+    def refresh(self, paths: Optional[List[Path]] = None) -> None:
+        """文件发生变化（由后台监听调用）"""
+        with self._lock:
+            self._generation += 1
+            self._modified_at = time.time()
+
+    @metrics.timed("fs")
+    def validators(self) -> Validators:
+        """当前版本对应的 ETag 和 Last-Modified"""
+        completed = getattr(self.summary_index, "generation", 0)
+        if self.watched:
+            with self._lock:
+                generation, modified_at = self._generation, self._modified_at
+            return Validators(
+                f'"{self.source}-v{RESPONSE_VERSION}-{_BOOT_ID}-{generation}-{completed}"',
+                formatdate(modified_at, usegmt=True)
+            )
+
+        digest = hashlib.sha1()
+        latest = 0.0
+        dirs = set()
+        for path in sorted(self.list_files()):
+            st = stat_file(path)
+            if st is None:
+                continue
+            digest.update(f"{path}\0{st.st_mtime_ns}\0{st.st_size}\n".encode())
+            latest = max(latest, st.st_mtime)
+            dirs.add(path.parent)
+        # 删除文件不会改变其余文件的 mtime，但会更新所在目录的 mtime
+        for directory in dirs:
+            st = stat_file(directory)
+            if st is not None:
+                latest = max(latest, st.st_mtime)
+        return Validators(
+            f'"{self.source}-v{RESPONSE_VERSION}-{digest.hexdigest()[:20]}-{_BOOT_ID}-{completed}"',
+            formatdate(latest or time.time(), usegmt=True)
+        )
+
+
+def combine_validators(parts: List[Validators]) -> Validators:
+    """多个来源合并后的校验值：任一来源变化时 ETag 都会变化，Last-Modified 取最晚的一个"""
+    digest = hashlib.sha1("\0".join(v.etag for v in parts).encode()).hexdigest()[:20]
+    last_modified = max(parts, key=lambda v: parsedate_to_datetime(v.last_modified)).last_modified
+    return Validators(f'"all-{digest}"', last_modified)
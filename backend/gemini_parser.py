@@ -1,16 +1,23 @@
 """JSONL 解析器 - 解析 Gemini CLI 会话数据"""
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Optional, Dict, Any
-
-from common import parse_timestamp
-from models import (
-    Message, SessionSummary, SessionDetail,
-    SearchResult, Project, ToolCall, TokenUsage, UsageSummary, UsageDetail, DailyUsage
-)
-from collections import defaultdict
-from datetime import timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import metrics
+from cache_db import sort_by_mtime
+from common import parse_timestamp, epoch_seconds, json_loads, bytes_contain, FileCache
+from session_index import SessionCursor, SummaryIndex
+from search_index import SearchIndex
+from search_query import SearchQuery, make_snippet, scan_file_filter, scan_needles
+from corpus_version import CorpusVersion
+from session_locator import SessionLocator, walk_dirs
+from usage_index import UsageIndex
+from message_index import page_from_detail
+from usage_rollup import new_usage_rollup, add_usage, summarize_usage, detail_usage
+from models import MessagePage, SearchResult, Project, UsageSummary, UsageDetail
+from records import ToolCallRecord, MessageRecord, SummaryRecord, SessionRecord
+from compressor import Turn, TurnBuilder
 
 
 GEMINI_DIR = Path.home() / ".gemini"
@@ -44,7 +51,7 @@ def get_gemini_session_files() -> List[Path]:
     """获取 Gemini 会话文件列表"""
     if not GEMINI_TMP_DIR.exists():
         return []
-    return sorted(GEMINI_TMP_DIR.rglob("chats/session-*.json"), key=lambda x: x.stat().st_mtime, reverse=True)
+    return sort_by_mtime(GEMINI_TMP_DIR.rglob("chats/session-*.json"))
 
 
 def map_gemini_tool_name(name: str) -> str:
@@ -52,9 +59,25 @@ def map_gemini_tool_name(name: str) -> str:
     return GEMINI_TOOL_NAME_MAP.get(name, name or "unknown")
 
 
-def _load_gemini_session_data(session_file: Path) -> Optional[dict]:
+def _load_gemini_session_data(session_file: Path, needles: Optional[Tuple[bytes, ...]] = None) -> Optional[dict]:
+    """needles 不为 None 时（见 search_needles），原始字节中不包含查询词的文件不解析，直接返回 None"""
+    try:
+        with metrics.phase("read") as read:
+            raw = session_file.read_bytes()
+            read.nbytes = len(raw)
+    except Exception:
+        return None
+    if needles is not None and not bytes_contain(raw, needles):
+        return None
     try:
-        return json.loads(session_file.read_text(encoding="utf-8", errors="ignore"))
+        with metrics.phase("json"):
+            return json_loads(raw)
+    except ValueError:
+        pass
+    except Exception:
+        return None
+    try:
+        return json.loads(raw.decode("utf-8", errors="ignore"))
     except Exception:
         return None
 
@@ -84,18 +107,7 @@ def _extract_tool_result(result: Any) -> Optional[str]:
     return None
 
 
-def get_gemini_sessions() -> List[SessionSummary]:
-    """获取 Gemini 会话摘要列表"""
-    sessions: List[SessionSummary] = []
-    for session_file in get_gemini_session_files():
-        summary = get_gemini_session_summary(session_file)
-        if summary:
-            sessions.append(summary)
-    sessions.sort(key=lambda x: x.updated_at, reverse=True)
-    return sessions
-
-
-def get_gemini_session_summary(session_file: Path) -> Optional[SessionSummary]:
+def get_gemini_session_summary(session_file: Path) -> Optional[SummaryRecord]:
     """解析 Gemini 会话摘要"""
     data = _load_gemini_session_data(session_file)
     if not data:
@@ -135,7 +147,7 @@ def get_gemini_session_summary(session_file: Path) -> Optional[SessionSummary]:
     created_at = min(timestamps) if timestamps else datetime.now()
     updated_at = max(timestamps) if timestamps else datetime.now()
 
-    return SessionSummary(
+    return SummaryRecord(
         id=session_file.stem,
         project_path=project_path,
         project_name=project_name,
@@ -148,19 +160,62 @@ def get_gemini_session_summary(session_file: Path) -> Optional[SessionSummary]:
     )
 
 
+gemini_summary_index = SummaryIndex("gemini", get_gemini_session_files, get_gemini_session_summary)
+
+gemini_corpus_version = CorpusVersion("gemini", get_gemini_session_files, gemini_summary_index)
+
+
+def get_gemini_sessions(
+    limit: Optional[int] = None, project: Optional[str] = None, after: Optional[SessionCursor] = None
+) -> List[SummaryRecord]:
+    """获取 Gemini 会话摘要列表（按更新时间倒序，由摘要索引提供）；limit / project / after 见 SummaryIndex.sessions"""
+    return gemini_summary_index.sessions(limit=limit, project=project, after=after)
+
+
+gemini_session_locator = SessionLocator(
+    lambda: walk_dirs(GEMINI_TMP_DIR),
+    lambda: GEMINI_TMP_DIR.rglob("chats/session-*.json") if GEMINI_TMP_DIR.exists() else [],
+)
+
+
+def find_gemini_session_file(session_id: str) -> Optional[Path]:
+    """按会话 ID 查找 Gemini 会话文件"""
+    return gemini_session_locator.find(session_id)
 
 
-def get_gemini_session_detail(session_id: str) -> Optional[SessionDetail]:
+def get_gemini_session_detail(session_id: str) -> Optional[SessionRecord]:
     """获取 Gemini 会话详情"""
-    # session_id 可能包含特殊字符，需要查找匹配的文件
-    for session_file in get_gemini_session_files():
-        if session_file.stem == session_id:
-            return get_gemini_session_detail_by_file(session_file)
-    return None
+    session_file = find_gemini_session_file(session_id)
+    if session_file is None:
+        return None
+    return get_gemini_session_detail_by_file(session_file)
 
 
-def get_gemini_session_detail_by_file(session_file: Path) -> Optional[SessionDetail]:
-    """通过文件解析 Gemini 会话详情"""
+def get_gemini_session_messages(session_id: str, cursor: int = 0, limit: int = 50) -> Optional[MessagePage]:
+    """分页获取 Gemini 会话消息（会话文件为整体 JSON，解析结果缓存后分页）"""
+    detail = get_gemini_session_detail(session_id)
+    if detail is None:
+        return None
+    return page_from_detail(detail, cursor, limit)
+
+
+def get_gemini_session_tool_result(session_id: str, tool_id: str) -> Optional[str]:
+    """获取工具调用的完整结果（会话详情中只有预览），从已解析的会话缓存中读取"""
+    session_file = find_gemini_session_file(session_id)
+    if session_file is None:
+        return None
+    parsed = gemini_detail_cache.get(session_file)
+    return parsed[1].get(tool_id) if parsed else None
+
+
+def get_gemini_session_detail_by_file(session_file: Path) -> Optional[SessionRecord]:
+    """通过文件解析 Gemini 会话详情（按 mtime/大小缓存，翻页和读取工具结果不再重复解析）"""
+    parsed = gemini_detail_cache.get(session_file)
+    return parsed[0] if parsed else None
+
+
+def _parse_gemini_session(session_file: Path) -> Optional[Tuple[SessionRecord, Dict[str, str]]]:
+    """解析整个 Gemini 会话文件：(会话详情, 工具调用 ID -> 完整结果)"""
     data = _load_gemini_session_data(session_file)
     if not data:
         return None
@@ -168,7 +223,8 @@ def get_gemini_session_detail_by_file(session_file: Path) -> Optional[SessionDet
     project_path = "gemini"
     project_name = "gemini"
     timestamps: List[datetime] = []
-    messages: List[Message] = []
+    messages: List[MessageRecord] = []
+    tool_results: Dict[str, str] = {}
 
     for msg in data.get("messages", []):
         if msg.get("timestamp"):
@@ -178,7 +234,7 @@ def get_gemini_session_detail_by_file(session_file: Path) -> Optional[SessionDet
         timestamp = parse_timestamp(msg.get("timestamp", ""))
         if msg_type == "user":
             content = msg.get("content", "")
-            messages.append(Message(
+            messages.append(MessageRecord(
                 uuid=msg.get("id", ""),
                 type="user",
                 content=content if isinstance(content, str) else "",
@@ -188,17 +244,21 @@ def get_gemini_session_detail_by_file(session_file: Path) -> Optional[SessionDet
             ))
         elif msg_type == "gemini":
             content = msg.get("content", "")
-            parsed_tool_calls: List[ToolCall] = []
+            parsed_tool_calls: List[ToolCallRecord] = []
             for i, call_data in enumerate(msg.get("toolCalls", []) or []):
                 tool_name = call_data.get("name", "unknown")
-                parsed_tool_calls.append(ToolCall(
+                tool_call = ToolCallRecord(
                     id=call_data.get("id", f"call_{i}"),
                     name=map_gemini_tool_name(tool_name),
                     input=call_data.get("args", {}) or {},
-                    result=_extract_tool_result(call_data.get("result"))
-                ))
-
-            messages.append(Message(
+                )
+                result = _extract_tool_result(call_data.get("result"))
+                tool_call.set_result(result)
+                if result is not None:
+                    tool_results.setdefault(tool_call.id, result)
+                parsed_tool_calls.append(tool_call)
+
+            messages.append(MessageRecord(
                 uuid=msg.get("id", ""),
                 type="assistant",
                 content=content if isinstance(content, str) else "",
@@ -214,7 +274,7 @@ def get_gemini_session_detail_by_file(session_file: Path) -> Optional[SessionDet
     created_at = min(timestamps) if timestamps else datetime.now()
     updated_at = max(timestamps) if timestamps else datetime.now()
 
-    return SessionDetail(
+    return SessionRecord(
         id=session_file.stem,
         project_path=project_path,
         project_name=project_name,
@@ -224,214 +284,171 @@ def get_gemini_session_detail_by_file(session_file: Path) -> Optional[SessionDet
         messages=messages,
         file_changes=[],  # Gemini 日志目前不直接提供文件变更
         source="gemini"
-    )
+    ), tool_results
+
 
+# 最近打开的 Gemini 会话：文件为整体 JSON，无法增量解析，未变化时直接复用解析结果
+# （详情中的工具结果只有预览，完整结果随缓存一起保留，供按需读取）
+gemini_detail_cache = FileCache(_parse_gemini_session, max_files=8, name="gemini_detail")
 
-def search_gemini_sessions(query: str, limit: int = 50) -> List[SearchResult]:
-    """全文搜索 Gemini 会话"""
-    results: List[SearchResult] = []
-    query_lower = query.lower()
+
+def get_gemini_session_turns(session_id: str) -> Optional[List[Turn]]:
+    """Gemini 会话的对话轮次（用于压缩上下文）；会话文件为整体 JSON，但不构建会话详情、不提取工具结果"""
+    session_file = find_gemini_session_file(session_id)
+    if session_file is None:
+        return None
+    data = _load_gemini_session_data(session_file)
+    if not data:
+        return None
+
+    builder = TurnBuilder()
+    for msg in data.get("messages", []):
+        msg_type = msg.get("type")
+        content = msg.get("content", "")
+        content = content if isinstance(content, str) else ""
+        if msg_type == "user":
+            builder.add_user(content)
+        elif msg_type == "gemini":
+            tools = [
+                (map_gemini_tool_name(call.get("name", "unknown")), (call.get("args") or {}).get("file_path", ""))
+                for call in msg.get("toolCalls", []) or []
+            ]
+            builder.add_assistant(content, tools)
+    return builder.turns()
+
+
+def _extract_gemini_search_docs(session_file: Path) -> Tuple[str, List[Tuple[str, str, str]]]:
+    """提取可被全文索引的消息文本：(project_name, [(message_type, content, timestamp)])"""
+    docs = []
+    data = _load_gemini_session_data(session_file)
+    for msg in (data or {}).get("messages", []):
+        msg_type = msg.get("type")
+        content = msg.get("content")
+        if msg_type in ("user", "gemini") and isinstance(content, str) and content:
+            message_type = "user" if msg_type == "user" else "assistant"
+            docs.append((message_type, content, msg.get("timestamp", "")))
+    return "gemini", docs
+
+
+gemini_search_index = SearchIndex(
+    "gemini",
+    get_gemini_session_files,
+    _extract_gemini_search_docs,
+    gemini_summary_index,
+)
+
+
+def search_gemini_sessions(query: SearchQuery, limit: int = 50) -> List[SearchResult]:
+    """全文搜索 Gemini 会话（优先使用全文索引，按相关度排序）"""
+    results = gemini_search_index.search(query, limit)
+    if results is not None:
+        return results
+    return list(iter_scan_gemini_sessions(query, limit))
+
+
+def iter_search_gemini_sessions(query: SearchQuery, limit: int = 50) -> Iterator[SearchResult]:
+    """流式全文搜索 Gemini 会话：每找到一条结果立即产出"""
+    if gemini_search_index.available:
+        return gemini_search_index.iter_search(query, limit)
+    return iter_scan_gemini_sessions(query, limit)
+
+
+def iter_scan_gemini_sessions(query: SearchQuery, limit: int = 50) -> Iterator[SearchResult]:
+    """逐文件扫描搜索 Gemini 会话（全文索引不可用时使用）"""
+    count = 0
+    # 原始字节中不含查询词的文件无需解析
+    needles = scan_needles(query.expr)
+    titles = gemini_summary_index.titles()
+    may_match = scan_file_filter(query, gemini_summary_index)
 
     for session_file in get_gemini_session_files():
-        data = _load_gemini_session_data(session_file)
+        if not may_match(session_file):
+            continue
+        data = _load_gemini_session_data(session_file, needles)
         if not data:
             continue
 
         project_name = "gemini"
-        title = "(无标题)"
-        for msg in data.get("messages", []):
-            if msg.get("type") == "user":
-                content = msg.get("content", "")
-                if isinstance(content, str) and content:
-                    title = content[:50] + ("..." if len(content) > 50 else "")
-                    break
+        # 会话标题取自摘要索引
+        title = titles.get(str(session_file), "(无标题)")
+        title = title[:50] + ("..." if len(title) > 50 else "")
 
         for msg in data.get("messages", []):
             msg_type = msg.get("type")
-            content_to_search = ""
-            message_type = "unknown"
             if msg_type == "user":
-                content_to_search = msg.get("content", "") if isinstance(msg.get("content"), str) else ""
                 message_type = "user"
             elif msg_type == "gemini":
-                content_to_search = msg.get("content", "") if isinstance(msg.get("content"), str) else ""
                 message_type = "assistant"
+            else:
+                continue
+            if not query.accepts(message_type, epoch_seconds(msg.get("timestamp"))):
+                continue
 
-            if query_lower in content_to_search.lower():
-                idx = content_to_search.lower().find(query_lower)
-                start = max(0, idx - 50)
-                end = min(len(content_to_search), idx + len(query) + 50)
-                matched = content_to_search[start:end]
-                if start > 0:
-                    matched = "..." + matched
-                if end < len(content_to_search):
-                    matched = matched + "..."
-
-                results.append(SearchResult(
+            content_to_search = msg.get("content", "") if isinstance(msg.get("content"), str) else ""
+            if content_to_search and query.matches(content_to_search):
+                yield SearchResult(
                     session_id=session_file.stem,
                     project_name=project_name,
                     title=title,
                     timestamp=parse_timestamp(msg.get("timestamp", "")),
-                    matched_content=matched,
+                    matched_content=make_snippet(content_to_search, query),
                     message_type=message_type,
                     source="gemini"
-                ))
+                )
 
-                if len(results) >= limit:
-                    return results
-    return results
+                count += 1
+                if count >= limit:
+                    return
 
 
 def get_gemini_projects() -> List[Project]:
-    """获取 Gemini 项目列表（按 cwd 聚合）"""
-    session_count = len(get_gemini_session_files())
-    if session_count == 0:
-        return []
-    return [Project(path="gemini", name="gemini", session_count=session_count)]
+    """获取 Gemini 项目列表（由摘要索引提供）"""
+    return gemini_summary_index.projects()
 
 
-def get_gemini_usage_summary() -> UsageSummary:
-    """获取 Gemini 使用量摘要：今日、本月、总计"""
-    from datetime import timezone
-
-    now_local = datetime.now()
-    today = now_local.date()
-    first_of_month = today.replace(day=1)
+def _load_gemini_usage_rollup(session_file: Path) -> dict:
+    """将单个 Gemini 会话文件的 token 使用量聚合为按日/按模型的结果"""
+    rollup = new_usage_rollup()
+    data = _load_gemini_session_data(session_file)
+    if not data:
+        return rollup
+    for record in data.get("messages", []):
+        if record.get("type") != "gemini" or not record.get("tokens"):
+            continue
 
-    today_usage = TokenUsage()
-    month_usage = TokenUsage()
-    total_usage = TokenUsage()
+        timestamp_str = record.get("timestamp", "")
+        if not timestamp_str:
+            continue
 
-    for jsonl_file in get_gemini_session_files():
-        data = _load_gemini_session_data(jsonl_file)
-        if not data:
+        try:
+            ts_utc = parse_timestamp(timestamp_str).replace(tzinfo=timezone.utc)
+            ts_date = ts_utc.astimezone().date()
+        except Exception:
             continue
-        for record in data.get("messages", []):
-            if record.get("type") != "gemini" or not record.get("tokens"):
-                continue
 
-            usage_data = record["tokens"]
-            input_tokens = usage_data.get("input", 0)
-            output_tokens = usage_data.get("output", 0)
-            cache_read = usage_data.get("cached", 0)
+        usage_data = record["tokens"]
+        add_usage(
+            rollup,
+            ts_date.isoformat(),
+            record.get("model", "gemini"),
+            usage_data.get("input", 0),
+            usage_data.get("output", 0),
+            0,
+            usage_data.get("cached", 0),
+            0.0,
+        )
+    return rollup
 
-            timestamp_str = record.get("timestamp", "")
-            if not timestamp_str:
-                continue
 
-            try:
-                ts_utc = parse_timestamp(timestamp_str).replace(tzinfo=timezone.utc)
-                ts_local = ts_utc.astimezone()
-                ts_date = ts_local.date()
-            except Exception:
-                continue
+# Gemini 会话文件整体重写，(mtime, size) 变化时重新统计整个文件
+gemini_usage_index = UsageIndex("gemini", get_gemini_session_files, _load_gemini_usage_rollup, skip_unknown=False)
 
-            # 累加到总计
-            total_usage.input_tokens += input_tokens
-            total_usage.output_tokens += output_tokens
-            total_usage.cache_read_tokens += cache_read
-
-            # 累加到当月
-            if ts_date >= first_of_month:
-                month_usage.input_tokens += input_tokens
-                month_usage.output_tokens += output_tokens
-                month_usage.cache_read_tokens += cache_read
-
-            # 累加到当天
-            if ts_date == today:
-                today_usage.input_tokens += input_tokens
-                today_usage.output_tokens += output_tokens
-                today_usage.cache_read_tokens += cache_read
-
-    for usage in (today_usage, month_usage, total_usage):
-        usage.total_tokens = (usage.input_tokens + usage.output_tokens +
-                              usage.cache_creation_tokens + usage.cache_read_tokens)
-        usage.cost_usd = 0.0
-
-    return UsageSummary(
-        today=today_usage,
-        this_month=month_usage,
-        total=total_usage
-    )
+
+def get_gemini_usage_summary() -> UsageSummary:
+    """获取 Gemini 使用量摘要：今日、本月、总计"""
+    return summarize_usage([gemini_usage_index.rollup()])
 
 
 def get_gemini_usage_detail(days: int = 30) -> UsageDetail:
     """获取 Gemini 详细使用量统计"""
-    from datetime import timezone
-
-    daily_data = defaultdict(lambda: {
-        "models": set(), "input": 0, "output": 0, "cache_read": 0, "cache_create": 0
-    })
-    model_data = defaultdict(lambda: {
-        "input": 0, "output": 0, "cache_read": 0, "cache_create": 0
-    })
-
-    today = datetime.now().date()
-    cutoff_date = today - timedelta(days=days)
-
-    for jsonl_file in get_gemini_session_files():
-        data = _load_gemini_session_data(jsonl_file)
-        if not data:
-            continue
-        for record in data.get("messages", []):
-            if record.get("type") != "gemini" or not record.get("tokens"):
-                continue
-
-            timestamp_str = record.get("timestamp", "")
-            if not timestamp_str:
-                continue
-            
-            try:
-                ts_utc = parse_timestamp(timestamp_str).replace(tzinfo=timezone.utc)
-                ts_local = ts_utc.astimezone()
-                ts_date = ts_local.date()
-            except Exception:
-                continue
-
-            if ts_date < cutoff_date:
-                continue
-
-            usage_data = record["tokens"]
-            input_tokens = usage_data.get("input", 0)
-            output_tokens = usage_data.get("output", 0)
-            cache_read = usage_data.get("cached", 0)
-            model = record.get("model", "gemini")
-            
-            date_str = ts_date.isoformat()
-            daily_data[date_str]["models"].add(model)
-            daily_data[date_str]["input"] += input_tokens
-            daily_data[date_str]["output"] += output_tokens
-            daily_data[date_str]["cache_read"] += cache_read
-
-            model_data[model]["input"] += input_tokens
-            model_data[model]["output"] += output_tokens
-            model_data[model]["cache_read"] += cache_read
-
-    daily_usage = []
-    for date_str, data in sorted(daily_data.items(), reverse=True):
-        daily_usage.append(DailyUsage(
-            date=date_str,
-            models=sorted(list(data["models"])),
-            input_tokens=data["input"],
-            output_tokens=data["output"],
-            cache_creation_tokens=data.get("cache_create", 0),
-            cache_read_tokens=data.get("cache_read", 0),
-            total_tokens=data["input"] + data["output"] + data.get("cache_read", 0) + data.get("cache_create", 0),
-            cost_usd=0.0
-        ))
-    
-    by_model_processed = {}
-    for model, data in model_data.items():
-        by_model_processed[model] = {
-            "input_tokens": data["input"],
-            "output_tokens": data["output"],
-            "cache_creation_tokens": data.get("cache_create", 0),
-            "cache_read_tokens": data.get("cache_read", 0),
-            "total_tokens": data["input"] + data["output"] + data.get("cache_read", 0) + data.get("cache_create", 0),
-            "cost_usd": 0.0
-        }
-
-    return UsageDetail(
-        daily_usage=daily_usage,
-        by_model=by_model_processed
-    )
+    return detail_usage([gemini_usage_index.rollup()], days, gemini_usage_index.skip_unknown)
@@ -1,17 +1,51 @@
 """FastAPI 主入口"""
-from fastapi import FastAPI, HTTPException, Query
+import json
+from contextlib import asynccontextmanager
+from datetime import date
+from email.utils import parsedate_to_datetime
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Iterator, List, Optional, Tuple
 
-from models import SessionSummary, SessionDetail, SearchResult, Project, UsageSummary, UsageDetail
-from session_service import get_all_sessions, get_session_detail, search_sessions, get_all_projects
+from models import SessionSummary, SessionDetail, MessagePage, SearchResult, Project, UsageSummary, UsageDetail
+from session_service import (
+    get_session_page, get_session_detail, get_session_messages, search_sessions, iter_search_sessions,
+    get_all_projects, get_watch_targets, get_corpus_validators, get_session_validators, get_tool_result,
+    get_compressed_context, shutdown_source_executor, SearchSourceError,
+)
 from usage_service import get_usage_summary, get_usage_detail
-from compressor import compress_session
+from compressor import DEFAULT_MAX_TOKENS
+from cache_db import StatScopeMiddleware
+from corpus_version import Validators
+from session_index import SessionCursor
+from responses import CompressionMiddleware, FastJSONResponse
+from metrics import METRICS_ENABLED, PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, count_cache, phase, render_metrics
+from search_query import SearchQuery, parse_query
+from coalesce import run_coalesced, shutdown_executor
+from scan_pool import shutdown_pool
+from watcher import start_watcher
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动时开启后台文件监听，退出时停止监听并关闭线程池/进程池"""
+    watcher = start_watcher(get_watch_targets())
+    yield
+    if watcher:
+        watcher.stop()
+    shutdown_executor()
+    shutdown_source_executor()
+    shutdown_pool()
+
 
 app = FastAPI(
     title="Claude Session Viewer API",
     description="查看和搜索 Claude Code 历史会话",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # 配置 CORS
@@ -21,7 +55,78 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(CompressionMiddleware)
+# 同一请求中数据版本（ETag）和索引刷新共用 stat 结果
+app.add_middleware(StatScopeMiddleware)
+# 最外层：Server-Timing 需包含压缩耗时，请求耗时需包含其他中间件
+app.add_middleware(MetricsMiddleware)
+
+
+def _is_fresh(request: Request, validators: Validators) -> bool:
+    """客户端缓存的版本是否仍有效（If-None-Match 优先于 If-Modified-Since）"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or validators.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(validators.last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _cache_headers(validators: Validators) -> dict:
+    # no-cache：浏览器可以缓存，但每次使用前需带校验值确认
+    return {"ETag": validators.etag, "Last-Modified": validators.last_modified, "Cache-Control": "no-cache"}
+
+
+def _not_modified(request: Request, response: Response, validators: Optional[Validators]) -> Optional[Response]:
+    """数据未变化时返回 304 响应；否则在 response 上设置校验头，返回 None"""
+    if validators is None:
+        return None
+    if _is_fresh(request, validators):
+        count_cache("http_304", "hit")
+        return Response(status_code=304, headers=_cache_headers(validators))
+    count_cache("http_304", "miss")
+    response.headers.update(_cache_headers(validators))
+    return None
+
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """解析单段 Range（bytes=start-end / start- / -suffix），返回闭区间 (start, end)
+
+    无法满足时返回 (size, size)；格式不支持（如多段）时返回 None，按完整内容响应。
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return size, size
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return size, size
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def _daily(validators: Validators) -> Validators:
+    """统计结果还取决于当天日期（今日、本月、最近 N 天）"""
+    return validators._replace(etag=f'{validators.etag[:-1]}-{date.today().isoformat()}"')
 
 
 @app.get("/")
@@ -31,82 +136,269 @@ def root():
 
 
 @app.get("/api/sessions", response_model=List[SessionSummary])
-def list_sessions(
-    project: Optional[str] = Query(None, description="按项目路径筛选"),
-    source: Optional[str] = Query("claude", description="数据来源: claude/codex/gemini"),
-    limit: int = Query(100, ge=1, le=500, description="返回数量限制")
+async def list_sessions(
+    request: Request,
+    response: Response,
+    project: Optional[str] = Query(None, description="按项目路径筛选（精确匹配）"),
+    source: Optional[str] = Query("claude", description="数据来源: claude/codex/gemini/all"),
+    limit: int = Query(100, ge=1, le=500, description="返回数量限制"),
+    cursor: Optional[str] = Query(None, description="分页游标，取上一页响应头 X-Next-Cursor")
 ):
-    """获取会话列表"""
-    sessions = get_all_sessions(source)
+    """获取会话列表；还有下一页时在响应头 X-Next-Cursor 中返回游标"""
+    try:
+        after = SessionCursor.decode(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    validators = await run_coalesced(("version", source), get_corpus_validators, source)
+    not_modified = _not_modified(request, response, validators)
+    if not_modified:
+        return not_modified
+    # 项目筛选、游标和数量限制下推到摘要索引，多个来源时按更新时间归并
+    sessions, next_cursor = await run_coalesced(
+        ("sessions", source, project, after, limit), get_session_page, source, limit, project or None, after
+    )
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor.encode()
+    with phase("model"):
+        return [s.to_model() for s in sessions]
 
-    # 按项目筛选
-    if project:
-        sessions = [s for s in sessions if project in s.project_path]
 
-    return sessions[:limit]
+def _session_detail_content(session_id: str, source: Optional[str]) -> Optional[dict]:
+    """会话详情的响应内容（结构同 SessionDetail；大会话的转换较慢，与解析一起在线程池中执行）"""
+    session = get_session_detail(session_id, source)
+    if not session:
+        return None
+    with phase("model"):
+        return session.to_dict()
 
 
 @app.get("/api/sessions/{session_id}", response_model=SessionDetail)
-def get_session(
+async def get_session(
+    request: Request,
+    response: Response,
     session_id: str,
     source: Optional[str] = Query("claude", description="数据来源: claude/codex/gemini")
 ):
     """获取会话详情"""
-    session = get_session_detail(session_id, source)
-    if not session:
+    validators = await run_coalesced(
+        ("session_version", session_id, source), get_session_validators, session_id, source
+    )
+    not_modified = _not_modified(request, response, validators)
+    if not_modified:
+        return not_modified
+    content = await run_coalesced(("session_content", session_id, source), _session_detail_content, session_id, source)
+    if not content:
         raise HTTPException(status_code=404, detail="Session not found")
-    return session
+    # 直接返回响应，跳过按 response_model 的再次校验
+    return FastJSONResponse(content, headers=dict(response.headers))
+
+
+@app.get("/api/sessions/{session_id}/messages", response_model=MessagePage)
+async def list_session_messages(
+    request: Request,
+    response: Response,
+    session_id: str,
+    source: Optional[str] = Query("claude", description="数据来源: claude/codex/gemini"),
+    cursor: Optional[str] = Query(None, description="分页游标，取上一页返回的 next_cursor"),
+    limit: int = Query(50, ge=1, le=500, description="每页消息数")
+):
+    """分页获取会话消息，第一页附带会话信息"""
+    try:
+        start = int(cursor) if cursor else 0
+    except ValueError:
+        start = -1
+    if start < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    validators = await run_coalesced(
+        ("session_version", session_id, source), get_session_validators, session_id, source
+    )
+    not_modified = _not_modified(request, response, validators)
+    if not_modified:
+        return not_modified
+
+    page = await run_coalesced(
+        ("messages", session_id, source, start, limit), get_session_messages, session_id, source, start, limit
+    )
+    if not page:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return page
+
+
+@app.get("/api/sessions/{session_id}/tool-results/{tool_id}")
+async def get_session_tool_result(
+    request: Request,
+    session_id: str,
+    tool_id: str,
+    source: Optional[str] = Query("claude", description="数据来源: claude/codex/gemini"),
+):
+    """获取工具调用的完整结果（会话详情中只有预览），返回 UTF-8 纯文本
+
+    支持 Range 请求（按 UTF-8 字节计算）分段获取很大的输出。
+    """
+    validators = await run_coalesced(
+        ("session_version", session_id, source), get_session_validators, session_id, source
+    )
+    headers = {"Accept-Ranges": "bytes"}
+    if validators is not None:
+        if _is_fresh(request, validators):
+            count_cache("http_304", "hit")
+            return Response(status_code=304, headers=_cache_headers(validators))
+        count_cache("http_304", "miss")
+        headers.update(_cache_headers(validators))
+
+    result = await run_coalesced(
+        ("tool_result", session_id, source, tool_id), get_tool_result, session_id, tool_id, source
+    )
+    if result is None:
+        raise HTTPException(status_code=404, detail="Tool result not found")
+    body = result.encode("utf-8")
+    media_type = "text/plain; charset=utf-8"
+
+    # If-Range 与当前版本不符时忽略 Range，返回完整内容
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    current = (validators.etag, validators.last_modified) if validators is not None else ()
+    if range_header and (if_range is None or if_range in current):
+        byte_range = _parse_range(range_header, len(body))
+        if byte_range is not None:
+            start, end = byte_range
+            if start >= len(body):
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(body)}"})
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+            return Response(body[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
 
 
 @app.get("/api/sessions/{session_id}/context")
-def get_session_context(
+async def get_session_context(
     session_id: str,
     source: Optional[str] = Query("claude", description="数据来源: claude/codex/gemini"),
+    max_tokens: int = Query(
+        DEFAULT_MAX_TOKENS, ge=0, description="token 预算（估算值），超出时从最早的轮次开始压缩或省略；0 表示不限"
+    ),
 ):
     """获取压缩后的会话上下文，用于继续对话"""
-    session = get_session_detail(session_id, source)
-    if not session:
+    if 0 < max_tokens < 256:
+        raise HTTPException(status_code=400, detail="max_tokens must be 0 or at least 256")
+    context = await run_coalesced(
+        ("context", session_id, source, max_tokens), get_compressed_context, session_id, source, max_tokens or None
+    )
+    if context is None:
         raise HTTPException(status_code=404, detail="Session not found")
-
-    context = compress_session(messages=session.messages)
     return {"context": context}
 
 
+def _parse_search_query(q: str) -> SearchQuery:
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Search query cannot be empty")
+    try:
+        return parse_query(q)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/api/search", response_model=List[SearchResult])
-def search(
-    q: str = Query(..., min_length=1, description="搜索关键词"),
-    source: Optional[str] = Query("claude", description="数据来源: claude/codex/gemini"),
+async def search(
+    q: str = Query(..., min_length=1, description="搜索查询（语法见 search_query）"),
+    source: Optional[str] = Query("claude", description="数据来源: claude/codex/gemini/all"),
     limit: int = Query(50, ge=1, le=200, description="返回数量限制")
 ):
     """全文搜索"""
-    if not q.strip():
-        raise HTTPException(status_code=400, detail="Search query cannot be empty")
-    return search_sessions(q, limit, source)
+    query = _parse_search_query(q)
+    return await run_coalesced(("search", q, source, limit), search_sessions, query, limit, source)
+
+
+@app.get("/api/search/stream")
+def search_stream(
+    q: str = Query(..., min_length=1, description="搜索查询（语法见 search_query）"),
+    source: Optional[str] = Query("claude", description="数据来源: claude/codex/gemini/all"),
+    limit: int = Query(50, ge=1, le=200, description="返回数量限制"),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$", description="输出格式: ndjson/sse")
+):
+    """流式全文搜索：每找到一条结果立即发送
+
+    ndjson 每行一个 SearchResult；sse 每条结果为一个 result 事件，结束时发送 done 事件。
+    某个来源出错时结果不完整，流以错误结束：ndjson 最后一行为 {"error": ...}，sse 发送 error 事件（不再发送 done）。
+    """
+    results = iter_search_sessions(_parse_search_query(q), limit, source)
+
+    def ndjson() -> Iterator[str]:
+        try:
+            for result in results:
+                yield result.model_dump_json() + "\n"
+        except SearchSourceError as e:
+            yield json.dumps({"error": str(e), "source": e.source}) + "\n"
+
+    def sse() -> Iterator[str]:
+        try:
+            for result in results:
+                yield f"event: result\ndata: {result.model_dump_json()}\n\n"
+        except SearchSourceError as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e), 'source': e.source})}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+
+    if format == "sse":
+        body, media_type = sse(), "text/event-stream"
+    else:
+        body, media_type = ndjson(), "application/x-ndjson"
+    # 禁止反向代理缓冲，保证结果逐条到达
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
 
 
 @app.get("/api/projects", response_model=List[Project])
-def list_projects(
-    source: Optional[str] = Query("claude", description="数据来源: claude/codex/gemini")
+async def list_projects(
+    request: Request,
+    response: Response,
+    source: Optional[str] = Query("claude", description="数据来源: claude/codex/gemini/all")
 ):
     """获取项目列表"""
-    return get_all_projects(source)
+    validators = await run_coalesced(("version", source), get_corpus_validators, source)
+    not_modified = _not_modified(request, response, validators)
+    if not_modified:
+        return not_modified
+    return await run_coalesced(("projects", source), get_all_projects, source)
 
 
 @app.get("/api/usage/summary", response_model=UsageSummary)
-def usage_summary(
-    source: Optional[str] = Query("claude", description="数据来源: claude/codex/gemini")
+async def usage_summary(
+    request: Request,
+    response: Response,
+    source: Optional[str] = Query("claude", description="数据来源: claude/codex/gemini/all")
 ):
     """获取使用量摘要：今日、本月、总计"""
-    return get_usage_summary(source)
+    validators = await run_coalesced(("version", source), get_corpus_validators, source)
+    not_modified = _not_modified(request, response, _daily(validators))
+    if not_modified:
+        return not_modified
+    return await run_coalesced(("usage_summary", source), get_usage_summary, source)
 
 
 @app.get("/api/usage/detail", response_model=UsageDetail)
-def usage_detail(
+async def usage_detail(
+    request: Request,
+    response: Response,
     days: int = Query(30, ge=1, le=365, description="统计天数"),
-    source: Optional[str] = Query("claude", description="数据来源: claude/codex/gemini"),
+    source: Optional[str] = Query("claude", description="数据来源: claude/codex/gemini/all"),
 ):
     """获取详细使用量统计"""
-    return get_usage_detail(days, source)
+    validators = await run_coalesced(("version", source), get_corpus_validators, source)
+    not_modified = _not_modified(request, response, _daily(validators))
+    if not_modified:
+        return not_modified
+    return await run_coalesced(("usage_detail", days, source), get_usage_detail, days, source)
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus 文本格式的指标：按路由的请求耗时直方图、各阶段耗时与读取字节数、缓存命中次数"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
 
 
 if __name__ == "__main__":
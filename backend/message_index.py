@@ -0,0 +1,111 @@
+"""会话消息分页 - 按文件维护可见消息的字节偏移索引
+
+首次打开会话时流式扫描一遍文件，只记录每条可见消息所在行的偏移、工具结果所在行的偏移
+以及会话信息（标题、时间、文件变更），不构建消息对象；活跃会话追加内容后只扫描新增的行。
+取某一页时只读取该页消息之间的字节范围，交给各来源的会话详情解析器构建消息，
+因此分页结果与完整详情一致。消息中的工具结果只是预览，完整结果同样按偏移单独读取。
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+from common import IncrementalParser, JsonlStream, JsonlTailCache, iter_jsonl_range, read_jsonl_record
+from models import MessagePage
+from records import MessageRecord, SessionRecord
+
+
+def new_message_index_state() -> dict:
+    """索引状态的公共部分；各来源可在此基础上增加字段"""
+    return {
+        "offsets": [],       # 每条可见消息所在行的字节偏移
+        "tool_results": {},  # 工具调用 ID -> 结果所在行的字节偏移
+    }
+
+
+def make_message_page(
+    session: SessionRecord,
+    messages: List[MessageRecord],
+    cursor: int,
+    total: int,
+) -> MessagePage:
+    """messages 为从 cursor 开始的一页消息；只转换这一页"""
+    end = cursor + len(messages)
+    with metrics.phase("model"):
+        return MessagePage(
+            messages=[m.to_model() for m in messages],
+            next_cursor=str(end) if end < total else None,
+            total=total,
+            session=session.to_model(include_messages=False) if cursor == 0 else None,
+        )
+
+
+def page_from_detail(detail: SessionRecord, cursor: int, limit: int) -> MessagePage:
+    """对已完整解析的会话详情分页（用于整体重写、无法按偏移读取的会话文件）"""
+    return make_message_page(detail, detail.messages[cursor:cursor + limit], cursor, len(detail.messages))
+
+
+class MessageIndex(JsonlTailCache):
+    """会话文件的消息偏移索引（内存缓存，LRU 淘汰）
+
+    Args:
+        indexer: 索引解析器；state 以 new_message_index_state() 为基础，
+            feed(state, offset, record) 需把可见消息的偏移追加到 state["offsets"]，
+            把工具结果的偏移记入 state["tool_results"]；
+            finish(state, path) 返回不含消息的 SessionRecord（无记录时返回 None）
+        detail: 会话详情解析器（state 需包含 messages 列表），用于构建某一页的消息
+        max_files: 最多缓存的文件数
+        name: 指标中的缓存名称
+    """
+
+    def __init__(
+        self, indexer: IncrementalParser, detail: IncrementalParser, max_files: int = 32, name: str = "messages"
+    ):
+        super().__init__(indexer, max_files, name)
+        self.detail = detail
+
+    def _consume(self, state: Any, stream: JsonlStream) -> None:
+        for record in stream:
+            self.parser.feed(state, stream.record_offset, record)
+
+    def _finish(self, state: Any, file_path: Path) -> Tuple[Optional[SessionRecord], List[int], Dict[str, int]]:
+        return self.parser.finish(state, file_path), list(state["offsets"]), dict(state["tool_results"])
+
+    def tool_result_record(self, file_path: Path, tool_id: str) -> Optional[dict]:
+        """按索引中的偏移只读取工具结果所在的一行；没有该工具结果时返回 None"""
+        _, _, tool_results = self.get(file_path)
+        offset = tool_results.get(tool_id)
+        if offset is None:
+            return None
+        return read_jsonl_record(file_path, offset)
+
+    def page(self, file_path: Path, cursor: int = 0, limit: int = 50) -> Optional[MessagePage]:
+        """返回从第 cursor 条消息开始的至多 limit 条消息；会话不存在时返回 None"""
+        session, offsets, tool_results = self.get(file_path)
+        if session is None:
+            return None
+
+        end = min(cursor + limit, len(offsets))
+        if cursor >= end:
+            return make_message_page(session, [], cursor, len(offsets))
+
+        state = self.detail.new_state()
+        stop = offsets[end] if end < len(offsets) else None
+        for record in iter_jsonl_range(file_path, offsets[cursor], stop):
+            self.detail.feed(state, record)
+        messages = state["messages"]
+
+        # 工具结果通常紧跟在调用之后（已在本页范围内），其余按偏移单独读取并回填
+        pending = {
+            tool_results[tool_call.id]
+            for message in messages
+            for tool_call in message.tool_calls or []
+            if tool_call.result is None and tool_call.id in tool_results
+        }
+        for offset in sorted(pending):
+            record = read_jsonl_record(file_path, offset)
+            if record is not None:
+                count = len(messages)
+                self.detail.feed(state, record)
+                del messages[count:]
+
+        return make_message_page(session, messages[:end - cursor], cursor, len(offsets))
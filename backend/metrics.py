@@ -0,0 +1,269 @@
+"""请求耗时分解与 Prometheus 指标
+
+每个请求在 contextvar 中持有一个 PhaseTimings，解析器和服务层用 phase(name) 或 record()
+把耗时（和读取的字节数）计入当前请求的各个阶段：
+    fs        列目录、stat（文件列表、签名对比、数据版本指纹、会话定位）
+    read      读取文件（不含 JSON 解码），字节数为实际读取的字节
+    json      JSON 解码
+    timestamp 时间戳解析（只统计未命中缓存的解析）
+    model     记录转换为 Pydantic 模型或响应结构
+    render    响应序列化
+    compress  响应压缩
+阶段之间互不包含；未计入任何阶段的时间为解析器逻辑、数据库查询、框架开销等。
+合并执行的计算（见 coalesce）在独立的 PhaseTimings 中统计，完成后计入每个等待它的请求。
+多进程扫描（scan_pool）在子进程中的耗时不计入。
+
+MetricsMiddleware 在响应头中加入 Server-Timing，并按路由累计请求耗时直方图、
+各阶段耗时/字节数；缓存命中情况由 count_cache 统计。render_metrics 输出 Prometheus 文本格式。
+
+环境变量：
+    SESSION_VIEWER_METRICS: 设为 off 关闭统计（不加 Server-Timing，/api/metrics 返回 404）
+"""
+import os
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+T = TypeVar("T")
+
+METRICS_ENABLED = os.environ.get("SESSION_VIEWER_METRICS", "on").lower() not in ("0", "off", "false", "no")
+
+# 请求耗时直方图的桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class PhaseTimings:
+    """单个请求（或一次合并执行的计算）各阶段的累计耗时（秒）和字节数"""
+    __slots__ = ("seconds", "bytes")
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.bytes: Dict[str, int] = {}
+
+    def add(self, name: str, seconds: float, nbytes: int = 0) -> None:
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        if nbytes:
+            self.bytes[name] = self.bytes.get(name, 0) + nbytes
+
+    def merge(self, other: "PhaseTimings") -> None:
+        for name, seconds in other.seconds.items():
+            self.add(name, seconds, other.bytes.get(name, 0))
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing 头的值（毫秒），读取的字节数放在 desc 中"""
+        items = []
+        for name, seconds in self.seconds.items():
+            item = f"{name};dur={seconds * 1000:.2f}"
+            if name in self.bytes:
+                item += f';desc="{self.bytes[name]} B"'
+            items.append(item)
+        items.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(items)
+
+
+_current: ContextVar[Optional[PhaseTimings]] = ContextVar("session_viewer_phase_timings", default=None)
+
+
+def clock() -> Callable[[], float]:
+    """热循环中使用的计时函数：不在请求中时返回不计时的函数（恒为 0），省去计时开销"""
+    return time.perf_counter if _current.get() is not None else float
+
+
+def record(name: str, seconds: float, nbytes: int = 0) -> None:
+    """把一段已测得的耗时计入当前请求（不在请求中时忽略）；热循环中先在局部累计再调用一次"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds, nbytes)
+
+
+class phase:
+    """with phase("fs"): ... 把代码块的耗时计入当前请求；读取字节数可在块内通过 nbytes 累加"""
+    __slots__ = ("name", "nbytes", "_start")
+
+    def __init__(self, name: str, nbytes: int = 0):
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self) -> "phase":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        record(self.name, time.perf_counter() - self._start, self.nbytes)
+
+
+def timed(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """装饰器：函数的耗时计入阶段 name"""
+    def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def collect(func: Callable[..., T], *args: Any) -> Tuple[T, PhaseTimings]:
+    """在新的 PhaseTimings 中执行 func(*args)（用于线程池中的计算），返回 (结果, 各阶段耗时)"""
+    timings = PhaseTimings()
+    token = _current.set(timings)
+    try:
+        return func(*args), timings
+    finally:
+        _current.reset(token)
+
+
+def merge(timings: PhaseTimings) -> None:
+    """把另一处统计的耗时计入当前请求"""
+    current = _current.get()
+    if current is not None and current is not timings:
+        current.merge(timings)
+
+
+# ---------- 全局累计 ----------
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+_lock = threading.Lock()
+_latency: Dict[Tuple[str, str], _Histogram] = {}
+_requests: Dict[Tuple[str, str, int], int] = {}
+_phase_seconds: Dict[Tuple[str, str], float] = {}
+_phase_bytes: Dict[Tuple[str, str], int] = {}
+_cache_counts: Dict[Tuple[str, str], int] = {}
+# 自行统计命中次数的缓存（如 lru_cache）：名称 -> 返回 (hits, misses) 的函数
+_cache_stats: Dict[str, Callable[[], Tuple[int, int]]] = {}
+
+
+def count_cache(cache: str, result: str) -> None:
+    """缓存访问计数，result 为 hit / miss（增量更新等可用其他取值）"""
+    if not METRICS_ENABLED:
+        return
+    key = (cache, result)
+    with _lock:
+        _cache_counts[key] = _cache_counts.get(key, 0) + 1
+
+
+def register_cache_stats(cache: str, stats: Callable[[], Tuple[int, int]]) -> None:
+    """登记自行统计命中次数的缓存，输出指标时读取"""
+    _cache_stats[cache] = stats
+
+
+def observe_request(route: str, method: str, status: int, seconds: float, timings: PhaseTimings) -> None:
+    with _lock:
+        histogram = _latency.get((route, method))
+        if histogram is None:
+            histogram = _latency[(route, method)] = _Histogram()
+        histogram.observe(seconds)
+        key = (route, method, status)
+        _requests[key] = _requests.get(key, 0) + 1
+        for name, value in timings.seconds.items():
+            _phase_seconds[(route, name)] = _phase_seconds.get((route, name), 0.0) + value
+        for name, value in timings.bytes.items():
+            _phase_bytes[(route, name)] = _phase_bytes.get((route, name), 0) + value
+
+
+def _labels(**labels: Any) -> str:
+    def escape(value: Any) -> str:
+        return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics() -> str:
+    """Prometheus 文本格式的全部指标"""
+    with _lock:
+        latency = {k: (list(h.counts), h.sum, h.count) for k, h in _latency.items()}
+        requests = dict(_requests)
+        phase_seconds = dict(_phase_seconds)
+        phase_bytes = dict(_phase_bytes)
+        cache_counts = dict(_cache_counts)
+    for cache, stats in _cache_stats.items():
+        hits, misses = stats()
+        cache_counts[(cache, "hit")] = hits
+        cache_counts[(cache, "miss")] = misses
+
+    lines: List[str] = [
+        "# HELP session_viewer_request_duration_seconds Request latency by route.",
+        "# TYPE session_viewer_request_duration_seconds histogram",
+    ]
+    for (route, method), (counts, total, count) in sorted(latency.items()):
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS, counts):
+            cumulative += n
+            labels = _labels(route=route, method=method, le=bound)
+            lines.append(f"session_viewer_request_duration_seconds_bucket{labels} {cumulative}")
+        lines.append(
+            f"session_viewer_request_duration_seconds_bucket{_labels(route=route, method=method, le='+Inf')} {count}"
+        )
+        lines.append(f"session_viewer_request_duration_seconds_sum{_labels(route=route, method=method)} {_number(total)}")
+        lines.append(f"session_viewer_request_duration_seconds_count{_labels(route=route, method=method)} {count}")
+
+    def counter(name: str, help_text: str, values: Dict[tuple, Any], label_names: Tuple[str, ...]) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for key, value in sorted(values.items()):
+            lines.append(f"{name}{_labels(**dict(zip(label_names, key)))} {_number(value)}")
+
+    counter("session_viewer_requests_total", "Requests by route and status.", requests, ("route", "method", "status"))
+    counter("session_viewer_phase_seconds_total", "Time spent in each request phase.", phase_seconds, ("route", "phase"))
+    counter("session_viewer_phase_bytes_total", "Bytes read in each request phase.", phase_bytes, ("route", "phase"))
+    counter("session_viewer_cache_requests_total", "Cache lookups by result.", cache_counts, ("cache", "result"))
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """为每个请求建立 PhaseTimings，加入 Server-Timing 响应头并累计指标（需为最外层的中间件）"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        timings = PhaseTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.server_timing(time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            # 按路由模板（而不是实际路径）区分，避免会话 ID 等使标签数量无限增长
+            route = getattr(scope.get("route"), "path", "unmatched")
+            observe_request(route, scope["method"], status, time.perf_counter() - start, timings)
@@ -1,4 +1,4 @@
-"""数据模型定义"""
+"""数据模型定义（API 响应）；解析和缓存时使用 records 中的轻量记录"""
 from datetime import datetime
 from typing import List, Optional, Any
 from pydantic import BaseModel
@@ -6,10 +6,12 @@ from pydantic import BaseModel
 
 class ToolCall(BaseModel):
     """工具调用"""
-    id: str
+    id: str  # 同时是获取完整结果的句柄
     name: str
     input: dict = {}
-    result: Optional[str] = None  # 工具执行结果
+    result: Optional[str] = None  # 工具执行结果（预览，见 records.TOOL_RESULT_PREVIEW_CHARS）
+    result_size: Optional[int] = None  # 完整结果的字节数（UTF-8）
+    result_truncated: bool = False  # result 是否只是完整结果的开头
 
 
 class Message(BaseModel):
@@ -41,6 +43,8 @@ class SessionSummary(BaseModel):
     message_count: int
     tool_calls: List[str] = []  # 使用的工具列表
     source: str = "claude"
+    # 较大的会话首次收录时只探测了开头和末尾，消息数和工具列表尚不完整（后台补全后为 False）
+    incomplete: bool = False
 
 
 class SessionDetail(BaseModel):
@@ -56,6 +60,14 @@ class SessionDetail(BaseModel):
     source: str = "claude"
 
 
+class MessagePage(BaseModel):
+    """会话消息分页"""
+    messages: List[Message]
+    next_cursor: Optional[str] = None  # 下一页游标，没有更多消息时为 None
+    total: int                         # 消息总数
+    session: Optional[SessionDetail] = None  # 第一页附带会话信息（messages 为空）
+
+
 class SearchResult(BaseModel):
     """搜索结果"""
     session_id: str
@@ -1,16 +1,24 @@
 """JSONL 解析器 - 解析 Claude Code 会话数据"""
-from datetime import datetime
+import os
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Optional, Dict, Any
-
-from models import (
-    Message, FileChange, SessionSummary, SessionDetail,
-    SearchResult, Project, ToolCall, TokenUsage, DailyUsage,
-    UsageSummary, UsageDetail
+from typing import Iterator, List, Optional
+
+from models import MessagePage, SearchResult, Project, UsageSummary, UsageDetail
+from records import ToolCallRecord, MessageRecord, FileChangeRecord, SummaryRecord, SessionRecord
+from compressor import Turn, TurnBuilder
+from common import (
+    parse_timestamp, epoch_seconds, iter_jsonl, iter_jsonl_matches, track_time_range, time_range,
+    IncrementalParser, JsonlTailCache,
 )
-from collections import defaultdict
-from datetime import date, timedelta
-from common import parse_timestamp, parse_jsonl_file
+from session_index import SessionCursor, SummaryIndex
+from corpus_version import CorpusVersion
+from search_index import SearchIndex
+from search_query import SearchQuery, make_snippet, scan_file_filter, scan_needles
+from session_locator import SessionLocator
+from usage_index import UsageIndex
+from message_index import MessageIndex, new_message_index_state
+from usage_rollup import new_usage_rollup, add_usage, copy_usage_rollup, summarize_usage, detail_usage
 
 
 # Claude Code 数据目录
@@ -66,18 +74,6 @@ def has_visible_content(message: dict) -> bool:
     return False
 
 
-def extract_tool_calls(messages: List[dict]) -> List[str]:
-    """提取会话中使用的工具列表"""
-    tools = set()
-    for msg in messages:
-        content = msg.get("message", {}).get("content", [])
-        if isinstance(content, list):
-            for item in content:
-                if isinstance(item, dict) and item.get("type") == "tool_use":
-                    tools.add(item.get("name", "unknown"))
-    return sorted(list(tools))
-
-
 def get_project_dirs() -> List[Path]:
     """获取所有项目目录"""
     if not PROJECTS_DIR.exists():
@@ -129,233 +125,453 @@ def project_path_to_name(encoded_path: str) -> str:
     return encoded_path
 
 
-def get_all_sessions() -> List[SessionSummary]:
-    """获取所有会话摘要"""
-    sessions = []
+def get_all_session_files() -> List[Path]:
+    """获取所有项目目录下的会话文件（不含 agent-* 文件，不排序）
 
+    用 scandir 的目录项判断文件类型，不逐个 stat（签名由索引的 diff 统一 stat）。
+    """
+    files = []
     for project_dir in get_project_dirs():
-        project_path = project_path_to_name(project_dir.name)
-        project_name = project_path.split("/")[-1] if "/" in project_path else project_path
+        with os.scandir(project_dir) as entries:
+            for entry in entries:
+                item = Path(entry.path)
+                if item.suffix == ".jsonl" and not item.stem.startswith("agent-") and entry.is_file():
+                    files.append(item)
+    return files
 
-        for session_file in get_session_files(project_dir):
-            records = parse_jsonl_file(session_file)
-            if not records:
-                continue
 
-            # 过滤出用户和助手消息
-            messages = [r for r in records if r.get("type") in ("user", "assistant")]
-            if not messages:
-                continue
+def _new_summary_state() -> dict:
+    return {"message_count": 0, "title": None, "tools": []}
 
-            # 提取首条用户消息作为标题
-            first_user_msg = next((m for m in messages if m.get("type") == "user"), None)
-            title = ""
-            if first_user_msg:
-                title = extract_content(first_user_msg)[:100]  # 截取前100字符
-                if len(extract_content(first_user_msg)) > 100:
-                    title += "..."
-
-            # 获取时间信息
-            timestamps = [parse_timestamp(r.get("timestamp", "")) for r in records if r.get("timestamp")]
-            created_at = min(timestamps) if timestamps else datetime.now()
-            updated_at = max(timestamps) if timestamps else datetime.now()
-
-            sessions.append(SessionSummary(
-                id=session_file.stem,
-                project_path=project_path,
-                project_name=project_name,
-                title=title or "(无标题)",
-                created_at=created_at,
-                updated_at=updated_at,
-                message_count=len(messages),
-                tool_calls=extract_tool_calls(records),
-                source="claude"
-            ))
-
-    # 按更新时间倒序排序
-    sessions.sort(key=lambda x: x.updated_at, reverse=True)
-    return sessions
-
-
-def get_session_detail(session_id: str) -> Optional[SessionDetail]:
-    """获取会话详情"""
-    # 在所有项目目录中查找该会话
-    for project_dir in get_project_dirs():
-        session_file = project_dir / f"{session_id}.jsonl"
-        if session_file.exists():
-            records = parse_jsonl_file(session_file)
-            if not records:
-                return None
 
-            project_path = project_path_to_name(project_dir.name)
-            project_name = project_path.split("/")[-1] if "/" in project_path else project_path
+def _feed_summary(state: dict, record: dict) -> None:
+    """累加一条记录到会话摘要状态（状态可 JSON 序列化，供摘要索引断点续读）"""
+    if record.get("timestamp"):
+        track_time_range(state, record["timestamp"])
 
-            # 第一遍：收集所有 tool_result
-            tool_results: Dict[str, str] = {}
-            for record in records:
-                if record.get("type") == "user":
-                    msg_content = record.get("message", {}).get("content", [])
-                    if isinstance(msg_content, list):
-                        for item in msg_content:
-                            if isinstance(item, dict) and item.get("type") == "tool_result":
-                                tool_id = item.get("tool_use_id", "")
-                                result_content = item.get("content", "")
-                                if tool_id:
-                                    # 截取结果，避免太长
-                                    if isinstance(result_content, str):
-                                        tool_results[tool_id] = result_content[:2000]
-                                        if len(result_content) > 2000:
-                                            tool_results[tool_id] += "\n... (truncated)"
-
-            # 第二遍：解析消息
-            messages = []
-            file_changes = []
+    record_type = record.get("type")
+    if record_type in ("user", "assistant"):
+        state["message_count"] += 1
+        # 提取首条用户消息作为标题
+        if record_type == "user" and state["title"] is None:
+            content = extract_content(record)
+            state["title"] = content[:100] + ("..." if len(content) > 100 else "")  # 截取前100字符
 
-            for record in records:
-                record_type = record.get("type")
-
-                if record_type in ("user", "assistant"):
-                    # 跳过只有 thinking 没有可见内容的消息
-                    if not has_visible_content(record):
-                        continue
-
-                    content = extract_content(record)
-                    tool_use = None
-                    tool_calls = None
-
-                    # 提取工具调用信息
-                    msg_content = record.get("message", {}).get("content", [])
-                    if isinstance(msg_content, list):
-                        tool_use_items = [
-                            item for item in msg_content
-                            if isinstance(item, dict) and item.get("type") == "tool_use"
-                        ]
-                        if tool_use_items:
-                            tool_use = tool_use_items
-                            # 构建完整的工具调用信息（包含结果）
-                            tool_calls = []
-                            for item in tool_use_items:
-                                tool_id = item.get("id", "")
-                                tool_calls.append(ToolCall(
-                                    id=tool_id,
-                                    name=item.get("name", "unknown"),
-                                    input=item.get("input", {}),
-                                    result=tool_results.get(tool_id)
-                                ))
-
-                    messages.append(Message(
-                        uuid=record.get("uuid", ""),
-                        type=record_type,
-                        content=content,
-                        timestamp=parse_timestamp(record.get("timestamp", "")),
-                        tool_use=tool_use if tool_use else None,
-                        tool_calls=tool_calls if tool_calls else None
-                    ))
-
-                elif record_type == "file-history-snapshot":
-                    snapshot = record.get("snapshot", {})
-                    backups = snapshot.get("trackedFileBackups", {})
-                    for file_path, info in backups.items():
-                        file_changes.append(FileChange(
-                            file_path=file_path,
-                            backup_file=info.get("backupFileName"),
-                            version=info.get("version", 1),
-                            timestamp=parse_timestamp(info.get("backupTime", ""))
-                        ))
-
-            # 获取标题
-            first_user_msg = next((m for m in messages if m.type == "user"), None)
-            title = first_user_msg.content[:100] if first_user_msg else "(无标题)"
-            if first_user_msg and len(first_user_msg.content) > 100:
-                title += "..."
-
-            # 获取时间
-            timestamps = [m.timestamp for m in messages]
-            created_at = min(timestamps) if timestamps else datetime.now()
-            updated_at = max(timestamps) if timestamps else datetime.now()
-
-            return SessionDetail(
-                id=session_id,
-                project_path=project_path,
-                project_name=project_name,
-                title=title,
-                created_at=created_at,
-                updated_at=updated_at,
-                messages=messages,
-                file_changes=file_changes,
-                source="claude"
-            )
+    # 提取会话中使用的工具
+    content = record.get("message", {}).get("content", [])
+    if isinstance(content, list):
+        for item in content:
+            if isinstance(item, dict) and item.get("type") == "tool_use":
+                name = item.get("name", "unknown")
+                if name not in state["tools"]:
+                    state["tools"].append(name)
+
+
+def _finish_summary(state: dict, session_file: Path) -> Optional[SummaryRecord]:
+    # 没有用户和助手消息的文件不展示
+    if not state["message_count"]:
+        return None
+
+    project_path = project_path_to_name(session_file.parent.name)
+    project_name = project_path.split("/")[-1] if "/" in project_path else project_path
+    created_at, updated_at = time_range(state)
+
+    return SummaryRecord(
+        id=session_file.stem,
+        project_path=project_path,
+        project_name=project_name,
+        title=state["title"] or "(无标题)",
+        created_at=created_at,
+        updated_at=updated_at,
+        message_count=state["message_count"],
+        tool_calls=sorted(state["tools"]),
+        source="claude"
+    )
+
+
+summary_parser = IncrementalParser(_new_summary_state, _feed_summary, _finish_summary)
+
+
+def _summary_head_done(state: dict) -> bool:
+    """探测文件开头时读到首条用户消息（标题）即可停止"""
+    return state["title"] is not None
+
+
+summary_index = SummaryIndex("claude", get_all_session_files, summary_parser, head_probe=_summary_head_done)
+
+# 会话列表、详情和统计共用的数据版本（统计包含 agent-* 文件）
+corpus_version = CorpusVersion("claude", get_all_jsonl_files, summary_index)
+
+
+def get_all_sessions(
+    limit: Optional[int] = None, project: Optional[str] = None, after: Optional[SessionCursor] = None
+) -> List[SummaryRecord]:
+    """获取所有会话摘要（按更新时间倒序，由摘要索引提供）；limit / project / after 见 SummaryIndex.sessions"""
+    return summary_index.sessions(limit=limit, project=project, after=after)
+
+
+def _new_detail_state() -> dict:
+    return {
+        "records": 0,
+        "messages": [],
+        "file_changes": [],
+        "tool_calls": {},    # tool_use_id -> ToolCallRecord，等待回填结果
+        "tool_results": {},  # tool_use_id -> 先于调用出现的结果
+    }
+
+
+def _feed_detail(state: dict, record: dict) -> None:
+    """累加一条记录到会话详情状态"""
+    state["records"] += 1
+    record_type = record.get("type")
+
+    # 收集 tool_result，回填到已出现的工具调用
+    if record_type == "user":
+        msg_content = record.get("message", {}).get("content", [])
+        if isinstance(msg_content, list):
+            for item in msg_content:
+                if isinstance(item, dict) and item.get("type") == "tool_result":
+                    tool_id = item.get("tool_use_id", "")
+                    result_content = item.get("content", "")
+                    if tool_id and isinstance(result_content, str):
+                        # ToolCallRecord 中只保留预览，完整结果不驻留内存
+                        tool_call = state["tool_calls"].get(tool_id)
+                        if tool_call is not None:
+                            tool_call.set_result(result_content)
+                        else:
+                            state["tool_results"][tool_id] = result_content
+
+    if record_type in ("user", "assistant"):
+        # 跳过只有 thinking 没有可见内容的消息
+        if not has_visible_content(record):
+            return
+
+        content = extract_content(record)
+        tool_use = None
+        tool_calls = None
+
+        # 提取工具调用信息
+        msg_content = record.get("message", {}).get("content", [])
+        if isinstance(msg_content, list):
+            tool_use_items = [
+                item for item in msg_content
+                if isinstance(item, dict) and item.get("type") == "tool_use"
+            ]
+            if tool_use_items:
+                tool_use = tool_use_items
+                # 构建完整的工具调用信息（结果可能稍后才出现）
+                tool_calls = []
+                for item in tool_use_items:
+                    tool_id = item.get("id", "")
+                    tool_call = ToolCallRecord(
+                        id=tool_id,
+                        name=item.get("name", "unknown"),
+                        input=item.get("input", {}),
+                    )
+                    tool_call.set_result(state["tool_results"].get(tool_id))
+                    state["tool_calls"][tool_id] = tool_call
+                    tool_calls.append(tool_call)
+
+        state["messages"].append(MessageRecord(
+            uuid=record.get("uuid", ""),
+            type=record_type,
+            content=content,
+            timestamp=parse_timestamp(record.get("timestamp", "")),
+            tool_use=tool_use if tool_use else None,
+            tool_calls=tool_calls if tool_calls else None
+        ))
+
+    elif record_type == "file-history-snapshot":
+        state["file_changes"].extend(_extract_file_changes(record))
+
+
+def _extract_file_changes(record: dict) -> List[FileChangeRecord]:
+    """从 file-history-snapshot 记录中提取文件变更"""
+    snapshot = record.get("snapshot", {})
+    backups = snapshot.get("trackedFileBackups", {})
+    return [
+        FileChangeRecord(
+            file_path=file_path,
+            backup_file=info.get("backupFileName"),
+            version=info.get("version", 1),
+            timestamp=parse_timestamp(info.get("backupTime", ""))
+        )
+        for file_path, info in backups.items()
+    ]
+
+
+def _finish_detail(state: dict, session_file: Path) -> Optional[SessionRecord]:
+    if not state["records"]:
+        return None
+
+    project_path = project_path_to_name(session_file.parent.name)
+    project_name = project_path.split("/")[-1] if "/" in project_path else project_path
+    messages = list(state["messages"])
+
+    # 获取标题
+    first_user_msg = next((m for m in messages if m.type == "user"), None)
+    title = first_user_msg.content[:100] if first_user_msg else "(无标题)"
+    if first_user_msg and len(first_user_msg.content) > 100:
+        title += "..."
+
+    # 获取时间
+    timestamps = [m.timestamp for m in messages]
+    created_at = min(timestamps) if timestamps else datetime.now()
+    updated_at = max(timestamps) if timestamps else datetime.now()
+
+    return SessionRecord(
+        id=session_file.stem,
+        project_path=project_path,
+        project_name=project_name,
+        title=title,
+        created_at=created_at,
+        updated_at=updated_at,
+        messages=messages,
+        file_changes=list(state["file_changes"]),
+        source="claude"
+    )
+
+
+detail_parser = IncrementalParser(_new_detail_state, _feed_detail, _finish_detail)
+
+# 最近打开的会话详情：活跃会话追加内容后只解析新增的行
+detail_cache = JsonlTailCache(detail_parser, max_files=8, name="claude_detail")
+
+
+def _new_message_index_state() -> dict:
+    state = new_message_index_state()
+    state.update({"records": 0, "title": None, "file_changes": []})
+    return state
+
+
+def _feed_message_index(state: dict, offset: int, record: dict) -> None:
+    """记录可见消息和工具结果所在行的偏移（判断条件与 _feed_detail 一致）"""
+    state["records"] += 1
+    record_type = record.get("type")
+
+    if record_type == "user":
+        msg_content = record.get("message", {}).get("content", [])
+        if isinstance(msg_content, list):
+            for item in msg_content:
+                if isinstance(item, dict) and item.get("type") == "tool_result" and item.get("tool_use_id"):
+                    state["tool_results"][item["tool_use_id"]] = offset
+
+    if record_type in ("user", "assistant"):
+        if not has_visible_content(record):
+            return
+        state["offsets"].append(offset)
+        track_time_range(state, record.get("timestamp", ""))
+        if state["title"] is None and record_type == "user":
+            content = extract_content(record)
+            state["title"] = content[:100] + ("..." if len(content) > 100 else "")
+
+    elif record_type == "file-history-snapshot":
+        state["file_changes"].extend(_extract_file_changes(record))
+
+
+def _finish_message_index(state: dict, session_file: Path) -> Optional[SessionRecord]:
+    """会话信息（不含消息），与 _finish_detail 一致"""
+    if not state["records"]:
+        return None
+
+    project_path = project_path_to_name(session_file.parent.name)
+    project_name = project_path.split("/")[-1] if "/" in project_path else project_path
+    created_at, updated_at = time_range(state)
+
+    return SessionRecord(
+        id=session_file.stem,
+        project_path=project_path,
+        project_name=project_name,
+        title=state["title"] or "(无标题)",
+        created_at=created_at,
+        updated_at=updated_at,
+        messages=[],
+        file_changes=list(state["file_changes"]),
+        source="claude"
+    )
+
+
+message_index = MessageIndex(
+    IncrementalParser(_new_message_index_state, _feed_message_index, _finish_message_index),
+    detail_parser,
+    name="claude_messages",
+)
+
+
+session_locator = SessionLocator(
+    lambda: [PROJECTS_DIR] + get_project_dirs(),
+    lambda: [f for project_dir in get_project_dirs() for f in project_dir.glob("*.jsonl")],
+)
+
+
+def find_session_file(session_id: str) -> Optional[Path]:
+    """按会话 ID 查找会话文件"""
+    return session_locator.find(session_id)
+
+
+def get_session_messages(session_id: str, cursor: int = 0, limit: int = 50) -> Optional[MessagePage]:
+    """分页获取会话消息"""
+    session_file = find_session_file(session_id)
+    if session_file is None:
+        return None
+    return message_index.page(session_file, cursor, limit)
 
+
+def get_session_detail(session_id: str) -> Optional[SessionRecord]:
+    """获取会话详情"""
+    session_file = find_session_file(session_id)
+    if session_file is None:
+        return None
+    return detail_cache.get(session_file)
+
+
+def get_session_tool_result(session_id: str, tool_id: str) -> Optional[str]:
+    """获取工具调用的完整结果（会话详情中只有预览）；按消息索引中的偏移只读取结果所在的一行"""
+    session_file = find_session_file(session_id)
+    if session_file is None:
+        return None
+    record = message_index.tool_result_record(session_file, tool_id)
+    msg_content = (record or {}).get("message", {}).get("content", [])
+    if isinstance(msg_content, list):
+        for item in msg_content:
+            if isinstance(item, dict) and item.get("type") == "tool_result" and item.get("tool_use_id") == tool_id:
+                result_content = item.get("content", "")
+                return result_content if isinstance(result_content, str) else None
     return None
 
 
-def search_sessions(query: str, limit: int = 50) -> List[SearchResult]:
-    """全文搜索会话"""
-    results = []
-    query_lower = query.lower()
+# 压缩上下文只需要 user 记录和含 text / tool_use 项的 assistant 记录；只有 thinking 的 assistant 记录、
+# 文件快照等其他记录不解码。预过滤只按字段值匹配，与键的顺序和空白无关
+CONTEXT_PREFILTER = (b'"user"', b'"text"', b'"tool_use"')
+
+
+def _feed_context(state: TurnBuilder, record: dict) -> None:
+    """按对话轮次累加可见消息（判断条件与 _feed_detail 一致），不处理工具结果"""
+    record_type = record.get("type")
+    if record_type not in ("user", "assistant") or not has_visible_content(record):
+        return
+    if record_type == "user":
+        state.add_user(extract_content(record))
+        return
+    msg_content = record.get("message", {}).get("content", [])
+    tools = [
+        (item.get("name", "unknown"), (item.get("input") or {}).get("file_path", ""))
+        for item in msg_content
+        if isinstance(item, dict) and item.get("type") == "tool_use"
+    ] if isinstance(msg_content, list) else []
+    state.add_assistant(extract_content(record), tools)
+
+
+# 最近压缩过的会话的对话轮次：活跃会话追加内容后只解析新增的行
+context_cache = JsonlTailCache(
+    IncrementalParser(TurnBuilder, _feed_context, lambda state, _path: state.turns(), prefilter=CONTEXT_PREFILTER),
+    max_files=8,
+    name="claude_context",
+)
+
+
+def get_session_turns(session_id: str) -> Optional[List[Turn]]:
+    """会话的对话轮次（用于压缩上下文），直接从原始记录构建，不构建会话详情"""
+    session_file = find_session_file(session_id)
+    if session_file is None:
+        return None
+    return context_cache.get(session_file)
+
+
+def _new_search_state() -> dict:
+    return {"docs": []}
+
+
+# 只有 user/assistant 记录包含可搜索的文本
+SEARCH_PREFILTER = (b'"user"', b'"assistant"')
+
+
+def _feed_search(state: dict, record: dict) -> None:
+    """提取可被全文索引的消息文本"""
+    record_type = record.get("type")
+    if record_type in ("user", "assistant"):
+        content = extract_content(record)
+        if content:
+            state["docs"].append((record_type, content, record.get("timestamp", "")))
+
+
+def _finish_search(state: dict, session_file: Path) -> str:
+    project_path = project_path_to_name(session_file.parent.name)
+    return project_path.split("/")[-1] if "/" in project_path else project_path
+
+
+search_index = SearchIndex(
+    "claude",
+    get_all_session_files,
+    IncrementalParser(_new_search_state, _feed_search, _finish_search, prefilter=SEARCH_PREFILTER),
+    summary_index,
+    title_ellipsis=False,
+)
+
+
+def search_sessions(query: SearchQuery, limit: int = 50) -> List[SearchResult]:
+    """全文搜索会话（优先使用全文索引，按相关度排序）"""
+    results = search_index.search(query, limit)
+    if results is not None:
+        return results
+    return list(iter_scan_sessions(query, limit))
+
+
+def iter_search_sessions(query: SearchQuery, limit: int = 50) -> Iterator[SearchResult]:
+    """流式全文搜索会话：每找到一条结果立即产出"""
+    if search_index.available:
+        return search_index.iter_search(query, limit)
+    return iter_scan_sessions(query, limit)
+
+
+def iter_scan_sessions(query: SearchQuery, limit: int = 50) -> Iterator[SearchResult]:
+    """逐文件扫描搜索会话（全文索引不可用时使用）"""
+    count = 0
+    # 先在原始字节中查找，只解码包含查询词的行
+    needles = scan_needles(query.expr)
+    titles = summary_index.titles()
+    may_match = scan_file_filter(query, summary_index)
 
     for project_dir in get_project_dirs():
         project_path = project_path_to_name(project_dir.name)
         project_name = project_path.split("/")[-1] if "/" in project_path else project_path
 
         for session_file in get_session_files(project_dir):
-            records = parse_jsonl_file(session_file)
-
-            # 获取会话标题
-            messages = [r for r in records if r.get("type") in ("user", "assistant")]
-            first_user_msg = next((m for m in messages if m.get("type") == "user"), None)
-            title = extract_content(first_user_msg)[:50] if first_user_msg else "(无标题)"
-
+            if not may_match(session_file):
+                continue
+            # 会话标题取自摘要索引
+            title = titles.get(str(session_file), "(无标题)")[:50]
+            if needles is None:
+                records = iter_jsonl(session_file, SEARCH_PREFILTER)
+            else:
+                records = iter_jsonl_matches(session_file, needles)
             for record in records:
-                if record.get("type") not in ("user", "assistant"):
+                message_type = record.get("type")
+                if message_type not in ("user", "assistant"):
+                    continue
+                if not query.accepts(message_type, epoch_seconds(record.get("timestamp"))):
                     continue
 
                 content = extract_content(record)
-                if query_lower in content.lower():
-                    # 提取匹配片段
-                    idx = content.lower().find(query_lower)
-                    start = max(0, idx - 50)
-                    end = min(len(content), idx + len(query) + 50)
-                    matched = content[start:end]
-                    if start > 0:
-                        matched = "..." + matched
-                    if end < len(content):
-                        matched = matched + "..."
-
-                    results.append(SearchResult(
+                if content and query.matches(content):
+                    yield SearchResult(
                         session_id=session_file.stem,
                         project_name=project_name,
                         title=title,
                         timestamp=parse_timestamp(record.get("timestamp", "")),
-                        matched_content=matched,
-                        message_type=record.get("type", "unknown"),
+                        matched_content=make_snippet(content, query),
+                        message_type=message_type,
                         source="claude"
-                    ))
+                    )
 
-                    if len(results) >= limit:
-                        return results
-
-    return results
+                    count += 1
+                    if count >= limit:
+                        return
 
 
 def get_all_projects() -> List[Project]:
-    """获取所有项目"""
-    projects = []
-
-    for project_dir in get_project_dirs():
-        project_path = project_path_to_name(project_dir.name)
-        project_name = project_path.split("/")[-1] if "/" in project_path else project_path
-        session_count = len(get_session_files(project_dir))
-
-        if session_count > 0:
-            projects.append(Project(
-                path=project_path,
-                name=project_name,
-                session_count=session_count
-            ))
-
-    projects.sort(key=lambda x: x.session_count, reverse=True)
-    return projects
+    """获取所有项目（按会话数量倒序，由摘要索引聚合）"""
+    return summary_index.projects()
 
 
 # Claude 模型定价 (per token)
@@ -481,197 +697,54 @@ def calculate_cost(usage: dict, model: str) -> float:
     return cost
 
 
-def get_usage_summary() -> UsageSummary:
-    """获取使用量摘要：今日、本月、总计"""
-    from datetime import timezone
-
-    # 使用本地时区的今天日期
-    now_local = datetime.now()
-    today = now_local.date()
-    first_of_month = today.replace(day=1)
-
-    today_usage = TokenUsage()
-    month_usage = TokenUsage()
-    total_usage = TokenUsage()
-
-    # 遍历所有 JSONL 文件（包括 agent 子文件）
-    for jsonl_file in get_all_jsonl_files():
-        records = parse_jsonl_file(jsonl_file)
-
-        for record in records:
-            if record.get("type") != "assistant":
-                continue
+def _feed_usage(rollup: dict, record: dict) -> None:
+    """累加一条 assistant 记录的 token 使用量到按日/按模型的聚合结果"""
+    if record.get("type") != "assistant":
+        return
+
+    msg = record.get("message", {})
+    usage = msg.get("usage", {})
+    if not usage:
+        return
+
+    timestamp_str = record.get("timestamp", "")
+    if not timestamp_str:
+        return
+
+    try:
+        # 将 UTC 时间转换为本地时间
+        ts_utc = parse_timestamp(timestamp_str)
+        if ts_utc.tzinfo is None:
+            ts_utc = ts_utc.replace(tzinfo=timezone.utc)
+        ts_date = ts_utc.astimezone().date()
+    except Exception:
+        return
+
+    model = msg.get("model", "")
+    add_usage(
+        rollup,
+        ts_date.isoformat(),
+        normalize_model_name(model),
+        usage.get("input_tokens", 0),
+        usage.get("output_tokens", 0),
+        usage.get("cache_creation_input_tokens", 0),
+        usage.get("cache_read_input_tokens", 0),
+        calculate_cost(usage, model),
+    )
 
-            msg = record.get("message", {})
-            usage = msg.get("usage", {})
-            if not usage:
-                continue
 
-            model = msg.get("model", "")
-            timestamp_str = record.get("timestamp", "")
-            if not timestamp_str:
-                continue
+# 统计所有 JSONL 文件（包括 agent 子文件），按文件持久化部分聚合，只解析新增的行
+usage_index = UsageIndex(
+    "claude", get_all_jsonl_files,
+    IncrementalParser(new_usage_rollup, _feed_usage, copy_usage_rollup, prefilter=(b'"usage"',))
+)
 
-            try:
-                # 将 UTC 时间转换为本地时间
-                ts_utc = parse_timestamp(timestamp_str)
-                if ts_utc.tzinfo is None:
-                    ts_utc = ts_utc.replace(tzinfo=timezone.utc)
-                ts_local = ts_utc.astimezone()
-                ts = ts_local.date()
-            except:
-                continue
 
-            input_tokens = usage.get("input_tokens", 0)
-            output_tokens = usage.get("output_tokens", 0)
-            cache_creation = usage.get("cache_creation_input_tokens", 0)
-            cache_read = usage.get("cache_read_input_tokens", 0)
-            cost = calculate_cost(usage, model)
-
-            # 总计
-            total_usage.input_tokens += input_tokens
-            total_usage.output_tokens += output_tokens
-            total_usage.cache_creation_tokens += cache_creation
-            total_usage.cache_read_tokens += cache_read
-            total_usage.cost_usd += cost
-
-            # 本月
-            if ts >= first_of_month:
-                month_usage.input_tokens += input_tokens
-                month_usage.output_tokens += output_tokens
-                month_usage.cache_creation_tokens += cache_creation
-                month_usage.cache_read_tokens += cache_read
-                month_usage.cost_usd += cost
-
-            # 今日
-            if ts == today:
-                today_usage.input_tokens += input_tokens
-                today_usage.output_tokens += output_tokens
-                today_usage.cache_creation_tokens += cache_creation
-                today_usage.cache_read_tokens += cache_read
-                today_usage.cost_usd += cost
-
-    # 计算 total_tokens
-    today_usage.total_tokens = (today_usage.input_tokens + today_usage.output_tokens +
-                                today_usage.cache_creation_tokens + today_usage.cache_read_tokens)
-    month_usage.total_tokens = (month_usage.input_tokens + month_usage.output_tokens +
-                                month_usage.cache_creation_tokens + month_usage.cache_read_tokens)
-    total_usage.total_tokens = (total_usage.input_tokens + total_usage.output_tokens +
-                                total_usage.cache_creation_tokens + total_usage.cache_read_tokens)
-
-    return UsageSummary(
-        today=today_usage,
-        this_month=month_usage,
-        total=total_usage
-    )
+def get_usage_summary() -> UsageSummary:
+    """获取使用量摘要：今日、本月、总计"""
+    return summarize_usage([usage_index.rollup()])
 
 
 def get_usage_detail(days: int = 30) -> UsageDetail:
     """获取详细使用量统计"""
-    from datetime import timezone
-
-    daily_data: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
-        "models": set(),
-        "input_tokens": 0,
-        "output_tokens": 0,
-        "cache_creation_tokens": 0,
-        "cache_read_tokens": 0,
-        "cost_usd": 0.0
-    })
-
-    model_data: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
-        "input_tokens": 0,
-        "output_tokens": 0,
-        "cache_creation_tokens": 0,
-        "cache_read_tokens": 0,
-        "total_tokens": 0,
-        "cost_usd": 0.0
-    })
-
-    today = datetime.now().date()
-    cutoff_date = today - timedelta(days=days)
-
-    # 遍历所有 JSONL 文件（包括 agent 子文件）
-    for jsonl_file in get_all_jsonl_files():
-        records = parse_jsonl_file(jsonl_file)
-
-        for record in records:
-            if record.get("type") != "assistant":
-                continue
-
-            msg = record.get("message", {})
-            usage = msg.get("usage", {})
-            if not usage:
-                continue
-
-            model = normalize_model_name(msg.get("model", "unknown"))
-            timestamp_str = record.get("timestamp", "")
-            if not timestamp_str:
-                continue
-
-            try:
-                # 将 UTC 时间转换为本地时间
-                ts_utc = parse_timestamp(timestamp_str)
-                if ts_utc.tzinfo is None:
-                    ts_utc = ts_utc.replace(tzinfo=timezone.utc)
-                ts_local = ts_utc.astimezone()
-                ts_date = ts_local.date()
-            except:
-                continue
-
-            if ts_date < cutoff_date:
-                continue
-
-            date_str = ts_date.isoformat()
-            input_tokens = usage.get("input_tokens", 0)
-            output_tokens = usage.get("output_tokens", 0)
-            cache_creation = usage.get("cache_creation_input_tokens", 0)
-            cache_read = usage.get("cache_read_input_tokens", 0)
-            cost = calculate_cost(usage, model)
-
-            # 按日统计
-            daily_data[date_str]["models"].add(model)
-            daily_data[date_str]["input_tokens"] += input_tokens
-            daily_data[date_str]["output_tokens"] += output_tokens
-            daily_data[date_str]["cache_creation_tokens"] += cache_creation
-            daily_data[date_str]["cache_read_tokens"] += cache_read
-            daily_data[date_str]["cost_usd"] += cost
-
-            # 按模型统计
-            model_data[model]["input_tokens"] += input_tokens
-            model_data[model]["output_tokens"] += output_tokens
-            model_data[model]["cache_creation_tokens"] += cache_creation
-            model_data[model]["cache_read_tokens"] += cache_read
-            model_data[model]["cost_usd"] += cost
-
-    # 转换为列表并排序
-    daily_usage = []
-    for date_str, data in sorted(daily_data.items(), reverse=True):
-        total = (data["input_tokens"] + data["output_tokens"] +
-                 data["cache_creation_tokens"] + data["cache_read_tokens"])
-        # 过滤掉 unknown 模型
-        models = sorted([m for m in data["models"] if m != "unknown"])
-        daily_usage.append(DailyUsage(
-            date=date_str,
-            models=models,
-            input_tokens=data["input_tokens"],
-            output_tokens=data["output_tokens"],
-            cache_creation_tokens=data["cache_creation_tokens"],
-            cache_read_tokens=data["cache_read_tokens"],
-            total_tokens=total,
-            cost_usd=data["cost_usd"]
-        ))
-
-    # 处理模型统计（过滤掉 unknown）
-    by_model = {}
-    for model, data in model_data.items():
-        if model == "unknown":
-            continue
-        data["total_tokens"] = (data["input_tokens"] + data["output_tokens"] +
-                                data["cache_creation_tokens"] + data["cache_read_tokens"])
-        by_model[model] = data
-
-    return UsageDetail(
-        daily_usage=daily_usage,
-        by_model=by_model
-    )
+    return detail_usage([usage_index.rollup()], days)
@@ -0,0 +1,241 @@
+"""解析与缓存使用的轻量记录
+
+解析器在逐行解析的热循环中只构建这些 __slots__ 记录（不做校验、没有实例 __dict__），
+会话详情缓存和摘要索引中保存的也是它们；只有在 API 边界、对最终要返回的那部分结果
+才调用 to_model() 转换为 models 中的 Pydantic 模型。
+完整会话详情可能有上万条消息，逐条构建模型的耗时超过解析本身，因此改用 to_dict()
+直接生成与模型 JSON 输出一致的结构。
+
+工具名、消息类型、项目路径/名称、来源等取值有限且大量重复的字符串会被驻留（sys.intern），
+同一会话或多个会话中的重复值共用一个对象。
+"""
+from datetime import datetime
+from sys import intern
+from typing import List, Optional
+
+from models import ToolCall, Message, FileChange, SessionSummary, SessionDetail
+
+
+def _json_datetime(value: datetime) -> str:
+    """与 Pydantic 的 JSON 输出一致：UTC 时间以 Z 结尾"""
+    text = value.isoformat()
+    return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+
+# 会话详情中的工具结果只保留开头作为预览，完整结果通过 /api/sessions/{id}/tool-results/{tool_id} 按需获取
+TOOL_RESULT_PREVIEW_CHARS = 2000
+
+
+class ToolCallRecord:
+    """工具调用（对应 ToolCall）"""
+    __slots__ = ("id", "name", "input", "result", "result_size", "result_truncated")
+
+    def __init__(self, id: str, name: str, input: dict):
+        self.id = id
+        self.name = intern(name)
+        self.input = input
+        self.result: Optional[str] = None
+        self.result_size: Optional[int] = None
+        self.result_truncated = False
+
+    def set_result(self, result: Optional[str]) -> None:
+        """设置工具执行结果：超过预览长度时只保留开头，并记录完整结果的大小"""
+        if result is None:
+            self.result, self.result_size, self.result_truncated = None, None, False
+            return
+        self.result_size = len(result.encode("utf-8"))
+        self.result_truncated = len(result) > TOOL_RESULT_PREVIEW_CHARS
+        self.result = result[:TOOL_RESULT_PREVIEW_CHARS]
+
+    def to_model(self) -> ToolCall:
+        # 字段在解析时已是目标类型，跳过校验
+        return ToolCall.model_construct(
+            id=self.id,
+            name=self.name,
+            input=self.input,
+            result=self.result,
+            result_size=self.result_size,
+            result_truncated=self.result_truncated,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "input": self.input,
+            "result": self.result,
+            "result_size": self.result_size,
+            "result_truncated": self.result_truncated,
+        }
+
+
+class MessageRecord:
+    """单条消息（对应 Message）"""
+    __slots__ = ("uuid", "type", "content", "timestamp", "tool_use", "tool_calls")
+
+    def __init__(
+        self,
+        uuid: str,
+        type: str,
+        content: str,
+        timestamp: datetime,
+        tool_use: Optional[List[dict]] = None,
+        tool_calls: Optional[List[ToolCallRecord]] = None,
+    ):
+        self.uuid = uuid
+        self.type = intern(type)
+        self.content = content
+        self.timestamp = timestamp
+        self.tool_use = tool_use
+        self.tool_calls = tool_calls
+
+    def to_model(self) -> Message:
+        return Message.model_construct(
+            uuid=self.uuid,
+            type=self.type,
+            content=self.content,
+            timestamp=self.timestamp,
+            tool_use=self.tool_use,
+            tool_calls=[t.to_model() for t in self.tool_calls] if self.tool_calls is not None else None,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "uuid": self.uuid,
+            "type": self.type,
+            "content": self.content,
+            "timestamp": _json_datetime(self.timestamp),
+            "tool_use": self.tool_use,
+            "tool_calls": [t.to_dict() for t in self.tool_calls] if self.tool_calls is not None else None,
+        }
+
+
+class FileChangeRecord:
+    """文件变更记录（对应 FileChange）"""
+    __slots__ = ("file_path", "backup_file", "version", "timestamp")
+
+    def __init__(self, file_path: str, backup_file: Optional[str], version: int, timestamp: datetime):
+        self.file_path = file_path
+        self.backup_file = backup_file
+        self.version = version
+        self.timestamp = timestamp
+
+    def to_model(self) -> FileChange:
+        return FileChange.model_construct(
+            file_path=self.file_path,
+            backup_file=self.backup_file,
+            version=self.version,
+            timestamp=self.timestamp,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "file_path": self.file_path,
+            "backup_file": self.backup_file,
+            "version": self.version,
+            "timestamp": _json_datetime(self.timestamp),
+        }
+
+
+class SummaryRecord:
+    """会话摘要（对应 SessionSummary）"""
+    __slots__ = (
+        "id", "project_path", "project_name", "title", "created_at", "updated_at",
+        "message_count", "tool_calls", "source", "incomplete",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        project_path: str,
+        project_name: str,
+        title: str,
+        created_at: datetime,
+        updated_at: datetime,
+        message_count: int,
+        tool_calls: List[str],
+        source: str,
+        incomplete: bool = False,
+    ):
+        self.id = id
+        self.project_path = intern(project_path)
+        self.project_name = intern(project_name)
+        self.title = title
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.message_count = message_count
+        self.tool_calls = [intern(name) for name in tool_calls]
+        self.source = intern(source)
+        self.incomplete = incomplete
+
+    def to_model(self) -> SessionSummary:
+        return SessionSummary.model_construct(
+            id=self.id,
+            project_path=self.project_path,
+            project_name=self.project_name,
+            title=self.title,
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+            message_count=self.message_count,
+            tool_calls=list(self.tool_calls),
+            source=self.source,
+            incomplete=self.incomplete,
+        )
+
+
+class SessionRecord:
+    """会话详情（对应 SessionDetail）；消息索引中的会话信息 messages 为空"""
+    __slots__ = (
+        "id", "project_path", "project_name", "title", "created_at", "updated_at",
+        "messages", "file_changes", "source",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        project_path: str,
+        project_name: str,
+        title: str,
+        created_at: datetime,
+        updated_at: datetime,
+        messages: List[MessageRecord],
+        file_changes: List[FileChangeRecord],
+        source: str,
+    ):
+        self.id = id
+        self.project_path = intern(project_path)
+        self.project_name = intern(project_name)
+        self.title = title
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.messages = messages
+        self.file_changes = file_changes
+        self.source = intern(source)
+
+    def to_model(self, include_messages: bool = True) -> SessionDetail:
+        """include_messages 为 False 时只转换会话信息（分页接口的第一页）"""
+        return SessionDetail.model_construct(
+            id=self.id,
+            project_path=self.project_path,
+            project_name=self.project_name,
+            title=self.title,
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+            messages=[m.to_model() for m in self.messages] if include_messages else [],
+            file_changes=[f.to_model() for f in self.file_changes],
+            source=self.source,
+        )
+
+    def to_dict(self) -> dict:
+        """与 to_model().model_dump(mode="json") 相同的结构，不构建模型"""
+        return {
+            "id": self.id,
+            "project_path": self.project_path,
+            "project_name": self.project_name,
+            "title": self.title,
+            "created_at": _json_datetime(self.created_at),
+            "updated_at": _json_datetime(self.updated_at),
+            "messages": [m.to_dict() for m in self.messages],
+            "file_changes": [f.to_dict() for f in self.file_changes],
+            "source": self.source,
+        }
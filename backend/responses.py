@@ -0,0 +1,123 @@
+"""响应序列化与压缩
+
+- FastJSONResponse：安装了 orjson 时用它序列化 JSON（会话详情可达数十 MB），否则使用标准库
+- CompressionMiddleware：按 Accept-Encoding 协商 br（需另行 `pip install brotli`）或 gzip，
+  只压缩超过阈值的一次性响应；流式响应（如流式搜索）原样转发，避免结果被缓冲
+
+环境变量：
+    SESSION_VIEWER_COMPRESS_MIN_SIZE: 压缩阈值（字节），默认 4096；设为 0 关闭压缩
+"""
+import gzip
+import os
+from typing import Any, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import metrics
+from common import orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESS_MIN_SIZE = int(os.environ.get("SESSION_VIEWER_COMPRESS_MIN_SIZE", "4096"))
+
+# 压缩级别取偏快的一档：大响应时压缩耗时与传输节省更平衡
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+class FastJSONResponse(JSONResponse):
+    """优先用 orjson 序列化的 JSONResponse"""
+
+    def render(self, content: Any) -> bytes:
+        with metrics.phase("render"):
+            if orjson is None:
+                return super().render(content)
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """按 Accept-Encoding 选择压缩格式（br 优先于 gzip，忽略 q=0 的格式）"""
+    accepted: List[str] = []
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.append(name.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """压缩超过 minimum_size 的一次性响应"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.minimum_size <= 0:
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        streaming = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, streaming
+            if message["type"] == "http.response.start":
+                # 等拿到响应体再决定是否压缩
+                start = message
+                return
+            if message["type"] != "http.response.body" or streaming or start is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            if message.get("more_body", False):
+                # 流式响应原样转发
+                streaming = True
+                await send(start)
+                await send(message)
+                return
+            # 分段响应（206）的内容是原始字节的一部分，不再压缩
+            if len(body) < self.minimum_size or "content-encoding" in headers or "content-range" in headers:
+                await send(start)
+                await send(message)
+                return
+
+            # 大响应的压缩可能耗时上百毫秒，放到线程池中执行，不阻塞事件循环
+            with metrics.phase("compress"):
+                body = await run_in_threadpool(compress, body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
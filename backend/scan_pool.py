@@ -0,0 +1,63 @@
+"""冷启动扫描的进程池 - 多个文件的解析分发到多个进程并行执行
+
+JSON 解码是 CPU 密集的，单进程冷启动扫描只能用到一个核。
+待解析文件较多时（首次建立索引、缓存被删除）按文件分发到进程池，各索引按顺序取回
+每个文件的解析结果后在主进程写入数据库；少量文件的增量更新仍在当前进程完成。
+
+环境变量：
+    SESSION_VIEWER_SCAN_WORKERS: 进程数，默认为 CPU 核数；设为 1 关闭并行
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterator, List, Optional
+
+SCAN_WORKERS = int(os.environ.get("SESSION_VIEWER_SCAN_WORKERS", "0")) or os.cpu_count() or 1
+
+# 少于该文件数时直接在当前进程解析（进程间传输的开销大于收益）
+MIN_PARALLEL_FILES = 16
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 服务进程中有后台线程，使用 spawn 避免 fork 继承锁和数据库连接
+            _pool = ProcessPoolExecutor(SCAN_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def map_files(func: Callable[..., Any], items: List[tuple]) -> Iterator[Any]:
+    """对每个参数元组调用 func，按 items 的顺序逐个产出结果
+
+    func 需为模块级函数，参数和返回值需可 pickle。
+    """
+    if SCAN_WORKERS <= 1 or len(items) < MIN_PARALLEL_FILES:
+        for args in items:
+            yield func(*args)
+        return
+
+    done = 0
+    try:
+        chunksize = max(1, len(items) // (SCAN_WORKERS * 8))
+        for result in _get_pool().map(func, *zip(*items), chunksize=chunksize):
+            yield result
+            done += 1
+    except BrokenProcessPool as e:
+        print(f"Error in scan worker pool, falling back to serial parsing: {e}")
+        shutdown_pool()
+        for args in items[done:]:
+            yield func(*args)
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,337 @@
+"""全文搜索索引 - SQLite FTS5（trigram 分词）
+
+trigram 分词对中英文都按子串匹配，与原先的 `query in content` 语义一致，
+并按 BM25 排序。每个文件记录读取进度，追加写入后只索引新增的消息。
+不足 3 个字符的查询（如两个汉字）无法使用 trigram 索引，退化为扫描已索引的消息文本。
+
+查询语法见 search_query：过滤条件（项目、角色、工具、时间）与 FTS 条件一起下推到 SQL，
+FTS/LIKE 只作为必要条件缩小候选，正则、取反等再对候选消息逐条判断。
+"""
+import json
+import threading
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import metrics
+from cache_db import connection, ensure_schema, diff_files, load_rows, read_connection
+from common import IncrementalParser, JsonlCheckpoint, JsonlStream, json_loads, parse_timestamp
+from models import SearchResult
+from scan_pool import map_files
+from search_query import SearchQuery, fts_match, like_conditions, make_snippet, session_conditions
+from session_index import SummaryIndex
+
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = [
+    """CREATE TABLE search_files (
+        path TEXT PRIMARY KEY,
+        source TEXT NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        project_name TEXT,
+        inode INTEGER,
+        offset INTEGER,
+        head BLOB,
+        state TEXT
+    )""",
+    "CREATE INDEX idx_search_files_source ON search_files (source)",
+    """CREATE TABLE search_docs (
+        id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL,
+        message_type TEXT,
+        timestamp TEXT,
+        content TEXT
+    )""",
+    "CREATE INDEX idx_search_docs_path ON search_docs (path)",
+    """CREATE VIRTUAL TABLE search_fts USING fts5(
+        content, content='search_docs', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER search_docs_ai AFTER INSERT ON search_docs BEGIN
+        INSERT INTO search_fts (rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER search_docs_ad AFTER DELETE ON search_docs BEGIN
+        INSERT INTO search_fts (search_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+]
+
+# 可被索引的消息：(message_type, content, timestamp)
+SearchDoc = Tuple[str, str, str]
+
+
+def _extract_docs(
+    extractor: Union[IncrementalParser, Callable[[Path], Tuple[str, List[SearchDoc]]]],
+    path: str,
+    previous: Optional[tuple],
+) -> tuple:
+    """解析单个文件，返回 (是否需要清空旧文档, project_name, docs, inode, offset, head, state)
+
+    模块级函数，可在扫描进程池中执行。
+    """
+    if not isinstance(extractor, IncrementalParser):
+        project_name, docs = extractor(Path(path))
+        return (True, project_name, docs, None, None, None, None)
+
+    checkpoint = None
+    state = None
+    if previous and previous[3] is not None:
+        checkpoint = JsonlCheckpoint(previous[0], previous[1], previous[2])
+        state = json_loads(previous[3])
+        state["docs"] = []
+    with JsonlStream(Path(path), checkpoint, extractor.prefilter) as stream:
+        reset = stream.reset
+        if reset or state is None:
+            state = extractor.new_state()
+        for record in stream:
+            extractor.feed(state, record)
+    checkpoint = stream.checkpoint
+    project_name = extractor.finish(state, Path(path))
+    docs = state.pop("docs")
+    if checkpoint is None:
+        return (True, project_name, docs, None, None, None, None)
+    return (reset, project_name, docs, checkpoint.inode, checkpoint.offset, checkpoint.head, json.dumps(state))
+
+
+class SearchIndex:
+    """单个来源的全文索引
+
+    Args:
+        source: 数据来源
+        list_files: 列出该来源所有会话文件
+        extractor: 对 JSONL 文件传入 IncrementalParser，
+            其 state 需包含 "docs" 列表（List[SearchDoc]，每次写入索引后清空），
+            finish(state, path) 返回项目名；其余 state 需可 JSON 序列化。
+            对整体重写的文件传入函数 path -> (project_name, docs)
+        summary_index: 同来源的摘要索引，用于获取会话标题
+        title_ellipsis: 标题截断到 50 字符时是否追加 "..."
+    """
+
+    def __init__(
+        self,
+        source: str,
+        list_files: Callable[[], List[Path]],
+        extractor: Union[IncrementalParser, Callable[[Path], Tuple[str, List[SearchDoc]]]],
+        summary_index: SummaryIndex,
+        title_ellipsis: bool = True,
+    ):
+        self.source = source
+        self.list_files = list_files
+        self.extractor = extractor
+        self.summary_index = summary_index
+        self.title_ellipsis = title_ellipsis
+        # 由后台监听维护时为 True，搜索时不再在请求中刷新
+        self.watched = False
+        # 并发请求同时刷新时只有一个在解析，其余等待后直接使用结果
+        self._refresh_lock = threading.Lock()
+        self._available: Optional[bool] = None
+
+    @property
+    def available(self) -> bool:
+        """当前 SQLite 是否支持 FTS5 trigram 分词"""
+        if self._available is None:
+            try:
+                ensure_schema("search_index", SCHEMA_VERSION,
+                              ["search_fts", "search_docs", "search_files"], _SCHEMA)
+                self._available = True
+            except sqlite3.OperationalError as e:
+                print(f"Full-text index unavailable, falling back to scanning: {e}")
+                self._available = False
+        return self._available
+
+    def diff(self, paths: Optional[List[Path]] = None) -> Tuple[Dict[str, Tuple[int, int]], List[str], List[str]]:
+        """对比文件签名，返回 (当前文件签名, 新增或变更的路径, 已删除的路径)
+
+        Args:
+            paths: 只检查这些已收录的文件（由后台监听传入）；为 None 时检查全部文件
+        """
+        if paths is None:
+            with metrics.phase("fs"):
+                return diff_files("search_files", self.source, self.list_files())
+        return diff_files("search_files", self.source, paths, indexed_only=True)
+
+    def refresh(self, paths: Optional[List[Path]] = None) -> None:
+        """索引新增/变更的文件，并删除已不存在文件的文档（paths 含义同 diff）"""
+        self.summary_index.refresh(paths)
+        if not self.available:
+            return
+        with self._refresh_lock:
+            signatures, changed, removed = self.diff(paths)
+            self._remove(removed)
+            self._index(signatures, changed)
+
+    def _remove(self, removed: List[str]) -> None:
+        if not removed:
+            return
+        with connection() as conn:
+            for path in removed:
+                conn.execute("DELETE FROM search_docs WHERE path = ?", (path,))
+                conn.execute("DELETE FROM search_files WHERE path = ?", (path,))
+
+    def _index(self, signatures: Dict[str, Tuple[int, int]], changed: List[str]) -> None:
+        if not changed:
+            return
+        previous: Dict[str, tuple] = {}
+        if isinstance(self.extractor, IncrementalParser):
+            previous = load_rows("search_files", "inode, offset, head, state", changed)
+
+        # 解析在锁外进行（文件较多时分发到进程池），每个文件单独提交
+        extracted = map_files(_extract_docs, [(self.extractor, path, previous.get(path)) for path in changed])
+        for path, (reset, project_name, docs, inode, offset, head, state) in zip(changed, extracted):
+            mtime_ns, size = signatures[path]
+            with connection() as conn:
+                if reset:
+                    conn.execute("DELETE FROM search_docs WHERE path = ?", (path,))
+                conn.executemany(
+                    "INSERT INTO search_docs (path, message_type, timestamp, content) VALUES (?, ?, ?, ?)",
+                    [(path, message_type, timestamp, content) for message_type, content, timestamp in docs]
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO search_files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, self.source, mtime_ns, size, project_name, inode, offset, head, state)
+                )
+
+    def _query(
+        self,
+        query: SearchQuery,
+        limit: int,
+        path: Optional[str] = None,
+        exclude: Optional[List[str]] = None,
+    ) -> List[SearchResult]:
+        """查询已索引的文档
+
+        Args:
+            path: 只查询该文件
+            exclude: 跳过这些文件（索引尚未更新）
+        """
+        columns = (
+            "d.content, d.message_type, d.timestamp, d.path, f.project_name, s.title "
+            "FROM search_docs d "
+            "JOIN search_files f ON f.path = d.path "
+            "LEFT JOIN session_summaries s ON s.path = d.path "
+        )
+        filters = ["f.source = ?"]
+        params: list = [self.source]
+        if path is not None:
+            filters.append("d.path = ?")
+            params.append(path)
+        if exclude:
+            filters.append("d.path NOT IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(exclude))
+
+        # 文件级：按修改时间和会话元数据跳过整个文件
+        if query.after is not None:
+            filters.append("f.mtime_ns >= ?")
+            params.append(int(query.after * 1e9))
+        session_filters, session_params = session_conditions(query)
+        filters += session_filters
+        params += session_params
+
+        # 消息级
+        if query.roles:
+            filters.append("d.message_type IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(query.roles)))
+        if query.after is not None:
+            filters.append("epoch(d.timestamp) >= ?")
+            params.append(query.after)
+        if query.before is not None:
+            filters.append("epoch(d.timestamp) < ?")
+            params.append(query.before)
+
+        match = fts_match(query.expr)
+        if match is not None:
+            sql = (
+                f"SELECT {columns} JOIN search_fts ON search_fts.rowid = d.id "
+                f"WHERE search_fts MATCH ? AND {' AND '.join(filters)} "
+                "ORDER BY bm25(search_fts), d.timestamp DESC, d.id"
+            )
+            params = [match] + params
+        else:
+            like, like_params = like_conditions(query.expr, "d.content")
+            if like is not None:
+                filters.append(like)
+                params += like_params
+            sql = f"SELECT {columns} WHERE {' AND '.join(filters)} ORDER BY d.timestamp DESC, d.id"
+
+        results = []
+        # FTS / LIKE 只是必要条件，逐条精确判断，凑满 limit 即停止读取（关闭游标，结束读事务）
+        with read_connection() as conn, closing(conn.execute(sql, params)) as rows:
+            for content, message_type, timestamp, path, project_name, title in rows:
+                if not query.matches(content):
+                    continue
+                title = title or "(无标题)"
+                if self.title_ellipsis and len(title) > 50:
+                    title = title[:50] + "..."
+                else:
+                    title = title[:50]
+                results.append(SearchResult(
+                    session_id=Path(path).stem,
+                    project_name=project_name,
+                    title=title,
+                    timestamp=parse_timestamp(timestamp),
+                    matched_content=make_snippet(content, query),
+                    message_type=message_type,
+                    source=self.source
+                ))
+                if len(results) >= limit:
+                    break
+        return results
+
+    def _may_match(self, query: SearchQuery, path: str, signatures: Dict[str, Tuple[int, int]]) -> bool:
+        """文件是否可能包含满足过滤条件的消息（按修改时间和会话摘要判断，用于跳过索引）"""
+        if query.skips_file(signatures[path][0] / 1e9):
+            return False
+        if not query.has_session_filters:
+            return True
+        conditions, params = session_conditions(query)
+        return path in self.summary_index.select_paths(["s.path = ?"] + conditions, [path] + params, refresh=False)
+
+    def search(self, query: SearchQuery, limit: int = 50) -> Optional[List[SearchResult]]:
+        """按相关度（BM25）返回搜索结果；索引不可用时返回 None"""
+        if not self.available:
+            return None
+        if not self.watched:
+            self.refresh()
+        return self._query(query, limit)
+
+    def iter_search(self, query: SearchQuery, limit: int = 50) -> Iterator[SearchResult]:
+        """流式搜索（需 available 为 True）：每找到一条结果立即产出
+
+        先按相关度产出已索引且未变化的文件中的结果，再逐个索引新增/变更的文件，
+        每索引完一个文件就产出其中的结果，因此冷启动时不必等整个来源索引完成。
+        凑满 limit 后停止，剩余文件留到下次请求再索引；按过滤条件不可能命中的文件也暂不索引。
+        """
+        if self.watched:
+            signatures, changed, removed = {}, [], []
+            summary_changed = set()
+        else:
+            signatures, changed, removed = self.diff()
+            # 会话标题：与待索引文件一起逐个更新，其余变化先行更新
+            _, summary_pending, summary_removed = self.summary_index.diff()
+            pending = set(changed)
+            self.summary_index.update_paths([p for p in summary_pending if p not in pending], summary_removed)
+            summary_changed = pending.intersection(summary_pending)
+        with self._refresh_lock:
+            self._remove(removed)
+
+        remaining = limit
+        for result in self._query(query, remaining, exclude=changed):
+            yield result
+            remaining -= 1
+
+        for path in changed:
+            if remaining <= 0:
+                return
+            if path in summary_changed:
+                self.summary_index.update_paths([path])
+            if not self._may_match(query, path, signatures):
+                continue
+            with self._refresh_lock:
+                # 等锁期间可能已被其他请求索引
+                indexed = load_rows("search_files", "mtime_ns, size", [path]).get(path)
+                if indexed != signatures[path]:
+                    self._index(signatures, [path])
+            for result in self._query(query, remaining, path=path):
+                yield result
+                remaining -= 1
@@ -0,0 +1,469 @@
+"""搜索查询语法 - 解析查询字符串，并生成各搜索路径可下推的条件
+
+    hello world          同一条消息中同时包含 hello 和 world（不区分大小写的子串匹配）
+    "hello world"        精确短语
+    a OR b / a AND b     或 / 与（相邻的词默认为与，AND 优先于 OR）
+    NOT a / -a           不包含（- 后须紧跟字母或数字；--force 等以 -- 开头的词按字面匹配，
+                         单横线参数如 -rf 需加引号 "-rf"）
+    ( ... )              分组
+    /fo+ba[rz]/          正则表达式（不区分大小写）；斜杠内须含正则元字符，/usr/bin/ 等路径按字面匹配
+    re:fo+ba[rz]         正则表达式的显式写法（含空格或括号时加引号：re:"(a|b) c"）
+    project:viewer       项目名或项目路径包含 viewer
+    role:user            消息角色：user / assistant
+    tool:Edit            会话中调用过 Edit 工具
+    after:2026-01-01     消息时间不早于该时间（日期为本地时间零点；也可写 7d / 12h 表示最近一段时间）
+    before:2026-02-01    消息时间早于该时间
+    source:codex         数据来源：claude / codex / gemini（all 为全部来源）
+
+字段的多个取值用逗号或 | 分隔，满足其一即可；同一字段出现多次时取值合并。
+过滤条件作用于整个查询，不能取反。
+
+过滤条件先于内容匹配执行：全文索引时与 FTS 条件一起下推到 SQL，按会话元数据（项目、工具、
+时间范围）和文件修改时间跳过整个文件；逐文件扫描时同样先跳过文件，再在原始字节中预过滤。
+内容条件会生成一个必要条件（FTS MATCH / LIKE / 字节预过滤）缩小候选，再对候选消息精确判断。
+"""
+import json
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional, Tuple, Union
+
+from common import search_needles
+
+
+SOURCES = ("claude", "codex", "gemini")
+ROLES = ("user", "assistant")
+
+_FIELDS = ("project", "role", "tool", "after", "before", "source")
+
+# trigram 分词要求 FTS 查询词至少 3 个字符
+TRIGRAM_MIN_CHARS = 3
+
+# 相对时间：7d / 12h / 30m
+_RELATIVE_TIME = re.compile(r"(\d+)([dhm])")
+_RELATIVE_UNITS = {"d": 86400, "h": 3600, "m": 60}
+
+
+class Term(NamedTuple):
+    """子串条件（text 已转为小写）"""
+    text: str
+
+
+class Regex(NamedTuple):
+    """正则条件"""
+    pattern: "re.Pattern[str]"
+
+
+class Not(NamedTuple):
+    operand: "Node"
+
+
+class And(NamedTuple):
+    operands: Tuple["Node", ...]
+
+
+class Or(NamedTuple):
+    operands: Tuple["Node", ...]
+
+
+Node = Union[Term, Regex, Not, And, Or]
+
+
+class SearchQuery(NamedTuple):
+    """解析后的查询"""
+    text: str                  # 原始查询字符串
+    expr: Optional[Node]       # 内容条件；只有过滤条件时为 None
+    projects: Tuple[str, ...]  # 小写
+    roles: Tuple[str, ...]
+    tools: Tuple[str, ...]     # 小写
+    sources: Tuple[str, ...]
+    after: Optional[float]     # Unix 时间戳
+    before: Optional[float]
+
+    def matches(self, content: str) -> bool:
+        """消息内容是否满足内容条件"""
+        return self.expr is None or _matches(self.expr, content, content.lower())
+
+    def accepts(self, role: str, timestamp: Optional[float]) -> bool:
+        """消息角色和时间（Unix 时间戳，未知时为 None）是否满足过滤条件"""
+        if self.roles and role not in self.roles:
+            return False
+        if self.after is None and self.before is None:
+            return True
+        if timestamp is None:
+            return False
+        if self.after is not None and timestamp < self.after:
+            return False
+        if self.before is not None and timestamp >= self.before:
+            return False
+        return True
+
+    def allows_source(self, source: str) -> bool:
+        return not self.sources or source in self.sources
+
+    def skips_file(self, mtime: float) -> bool:
+        """文件最后修改早于 after 时，其中不可能有满足条件的消息"""
+        return self.after is not None and mtime < self.after
+
+    @property
+    def has_session_filters(self) -> bool:
+        return bool(self.projects or self.tools) or self.after is not None or self.before is not None
+
+
+# ---------------------------------------------------------------------------
+# 解析
+# ---------------------------------------------------------------------------
+
+def _tokenize(text: str) -> List[Tuple[str, object]]:
+    """切分为 (类型, 值)：( ) AND OR NOT - TERM REGEX FILTER"""
+    tokens: List[Tuple[str, object]] = []
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if c.isspace():
+            i += 1
+        elif c in "()":
+            tokens.append((c, None))
+            i += 1
+        elif c == "-" and i + 1 < n and _is_word_char(text[i + 1]):
+            tokens.append(("NOT", None))
+            i += 1
+        elif c == '"':
+            phrase, i = _read_quoted(text, i)
+            if phrase:
+                tokens.append(("TERM", phrase))
+        elif c == "/" and _regex_end(text, i) > 0 and _REGEX_META.search(text[i + 1:_regex_end(text, i)]):
+            end = _regex_end(text, i)
+            tokens.append(("REGEX", _compile_regex(text[i + 1:end], text[i:end + 1])))
+            i = end + 1
+        else:
+            start = i
+            while i < n and not text[i].isspace() and text[i] not in '()"':
+                i += 1
+            word = text[start:i]
+            field, sep, value = word.partition(":")
+            if sep and not value and field.lower() in _FIELDS + ("re",) and i < n and text[i] == '"':
+                # 字段值可加引号：project:"my project"
+                value, i = _read_quoted(text, i)
+            if word in ("AND", "OR", "NOT"):
+                tokens.append((word, None))
+            elif sep and field.lower() == "re" and value:
+                tokens.append(("REGEX", _compile_regex(value, f"re:{value}")))
+            elif sep and field.lower() in _FIELDS and value:
+                tokens.append(("FILTER", (field.lower(), value)))
+            else:
+                tokens.append(("TERM", word))
+    return tokens
+
+
+def _read_quoted(text: str, start: int) -> Tuple[str, int]:
+    """读取从 start（引号）开始的带引号字符串，返回 (内容, 结束位置)；支持 \\" 转义，未闭合时读到末尾"""
+    chars = []
+    i = start + 1
+    while i < len(text):
+        c = text[i]
+        if c == "\\" and i + 1 < len(text) and text[i + 1] == '"':
+            chars.append('"')
+            i += 2
+            continue
+        if c == '"':
+            return "".join(chars), i + 1
+        chars.append(c)
+        i += 1
+    return "".join(chars), i
+
+
+def _is_word_char(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+# 斜杠内含这些字符之一才按正则处理，否则（如 /usr/bin/）是普通的词
+_REGEX_META = re.compile(r"[.^$*+?{}\[\]|()\\]")
+
+
+def _compile_regex(source: str, display: str) -> "re.Pattern":
+    try:
+        return re.compile(source, re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"无效的正则表达式 {display}: {e}")
+
+
+def _regex_end(text: str, start: int) -> int:
+    """/.../ 的结束斜杠位置：其后须为空白、右括号或结尾；不是正则（如路径 /usr/bin）时返回 -1"""
+    i = start + 1
+    while i < len(text):
+        if text[i] == "\\":
+            i += 2
+            continue
+        if text[i] == "/" and i > start + 1 and (i + 1 == len(text) or text[i + 1].isspace() or text[i + 1] == ")"):
+            return i
+        i += 1
+    return -1
+
+
+def _parse_time(field: str, value: str, now: float) -> float:
+    relative = _RELATIVE_TIME.fullmatch(value)
+    if relative:
+        return now - int(relative.group(1)) * _RELATIVE_UNITS[relative.group(2)]
+    try:
+        # 不带时区时按本地时间
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"无法识别的时间 {field}:{value}（示例：2026-01-01、2026-01-01T08:00、7d）")
+
+
+class _Parser:
+    def __init__(self, tokens: List[Tuple[str, object]]):
+        self.tokens = tokens
+        self.pos = 0
+        self.filters: List[Tuple[str, str]] = []
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def parse_or(self) -> Optional[Node]:
+        operands = [self.parse_and()]
+        while self.peek() == "OR":
+            self.pos += 1
+            operands.append(self.parse_and())
+        return _combine(Or, operands)
+
+    def parse_and(self) -> Optional[Node]:
+        operands = [self.parse_unary()]
+        while self.peek() not in (None, "OR", ")"):
+            if self.peek() == "AND":
+                self.pos += 1
+            operands.append(self.parse_unary())
+        return _combine(And, operands)
+
+    def parse_unary(self) -> Optional[Node]:
+        kind = self.peek()
+        if kind == "NOT":
+            self.pos += 1
+            operand = self.parse_unary()
+            if operand is None:
+                raise ValueError("NOT 之后需要内容条件（过滤条件不能取反）")
+            return Not(operand)
+        if kind is None:
+            raise ValueError("查询不完整")
+        kind, value = self.tokens[self.pos]
+        self.pos += 1
+        if kind == "(":
+            node = self.parse_or() if self.peek() != ")" else None
+            if self.peek() == ")":
+                self.pos += 1
+            return node
+        if kind == ")":
+            raise ValueError("括号不匹配")
+        if kind in ("AND", "OR"):
+            raise ValueError(f"{kind} 两侧都需要条件")
+        if kind == "TERM":
+            return Term(str(value).lower())
+        if kind == "REGEX":
+            return Regex(value)
+        self.filters.append(value)
+        return None
+
+
+def _combine(cls, operands: List[Optional[Node]]) -> Optional[Node]:
+    operands = [op for op in operands if op is not None]
+    if not operands:
+        return None
+    if len(operands) == 1:
+        return operands[0]
+    return cls(tuple(operands))
+
+
+def parse_query(text: str) -> SearchQuery:
+    """解析查询字符串；语法错误时抛出 ValueError（消息可直接展示给用户）"""
+    parser = _Parser(_tokenize(text))
+    expr = parser.parse_or()
+    if parser.pos < len(parser.tokens):
+        raise ValueError("括号不匹配")
+
+    values = {field: [] for field in _FIELDS}
+    for field, value in parser.filters:
+        values[field].extend(v.strip() for v in re.split(r"[,|]", value) if v.strip())
+
+    roles = tuple(dict.fromkeys(v.lower() for v in values["role"]))
+    for role in roles:
+        if role not in ROLES:
+            raise ValueError(f"未知的角色 role:{role}（可选 {' / '.join(ROLES)}）")
+    sources = tuple(dict.fromkeys(v.lower() for v in values["source"]))
+    if "all" in sources:
+        sources = SOURCES
+    for source in sources:
+        if source not in SOURCES:
+            raise ValueError(f"未知的来源 source:{source}（可选 {' / '.join(SOURCES)}）")
+
+    now = time.time()
+    after = max((_parse_time("after", v, now) for v in values["after"]), default=None)
+    before = min((_parse_time("before", v, now) for v in values["before"]), default=None)
+
+    query = SearchQuery(
+        text=text,
+        expr=expr,
+        projects=tuple(dict.fromkeys(v.lower() for v in values["project"])),
+        roles=roles,
+        tools=tuple(dict.fromkeys(v.lower() for v in values["tool"])),
+        sources=sources,
+        after=after,
+        before=before,
+    )
+    if expr is None and not parser.filters:
+        raise ValueError("搜索条件不能为空")
+    return query
+
+
+# ---------------------------------------------------------------------------
+# 匹配
+# ---------------------------------------------------------------------------
+
+def _matches(node: Node, content: str, lowered: str) -> bool:
+    if isinstance(node, Term):
+        return node.text in lowered
+    if isinstance(node, Regex):
+        return node.pattern.search(content) is not None
+    if isinstance(node, Not):
+        return not _matches(node.operand, content, lowered)
+    if isinstance(node, And):
+        return all(_matches(op, content, lowered) for op in node.operands)
+    return any(_matches(op, content, lowered) for op in node.operands)
+
+
+def _first_hit(node: Node, content: str, lowered: str) -> Optional[Tuple[int, int]]:
+    """不在 NOT 之下的条件中最靠前的命中位置"""
+    if isinstance(node, Term):
+        idx = lowered.find(node.text)
+        return (idx, idx + len(node.text)) if idx >= 0 else None
+    if isinstance(node, Regex):
+        match = node.pattern.search(content)
+        return match.span() if match else None
+    if isinstance(node, Not):
+        return None
+    hits = [hit for hit in (_first_hit(op, content, lowered) for op in node.operands) if hit is not None]
+    return min(hits) if hits else None
+
+
+def make_snippet(content: str, query: SearchQuery) -> str:
+    """截取首个匹配位置前后 50 个字符作为结果片段"""
+    hit = _first_hit(query.expr, content, content.lower()) if query.expr is not None else None
+    idx, hit_end = hit if hit is not None else (0, 0)
+    start = max(0, idx - 50)
+    end = min(len(content), hit_end + 50)
+    matched = content[start:end]
+    if start > 0:
+        matched = "..." + matched
+    if end < len(content):
+        matched = matched + "..."
+    return matched
+
+
+# ---------------------------------------------------------------------------
+# 下推：各路径用于缩小候选范围的必要条件（满足查询的消息一定满足它们）
+# ---------------------------------------------------------------------------
+
+def fts_match(node: Optional[Node]) -> Optional[str]:
+    """FTS5 MATCH 表达式；无法用索引约束时返回 None"""
+    if isinstance(node, Term):
+        if len(node.text) < TRIGRAM_MIN_CHARS:
+            return None
+        return '"' + node.text.replace('"', '""') + '"'
+    if isinstance(node, And):
+        parts = [p for p in (fts_match(op) for op in node.operands) if p is not None]
+        return " AND ".join(f"({p})" for p in parts) if parts else None
+    if isinstance(node, Or):
+        parts = [fts_match(op) for op in node.operands]
+        if any(p is None for p in parts):
+            return None
+        return " OR ".join(f"({p})" for p in parts)
+    # 正则、取反无法保证是必要条件
+    return None
+
+
+def like_conditions(node: Optional[Node], column: str) -> Tuple[Optional[str], list]:
+    """没有可用的 FTS 条件时（如查询词不足 3 个字符），用 LIKE 缩小候选；返回 (SQL, 参数)"""
+    if isinstance(node, Term):
+        pattern = "%" + node.text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return f"{column} LIKE ? ESCAPE '\\'", [pattern]
+    if isinstance(node, (And, Or)):
+        parts = [like_conditions(op, column) for op in node.operands]
+        if isinstance(node, And):
+            parts = [p for p in parts if p[0] is not None]
+            if not parts:
+                return None, []
+        elif any(p[0] is None for p in parts):
+            return None, []
+        joiner = " AND " if isinstance(node, And) else " OR "
+        return "(" + joiner.join(sql for sql, _ in parts) + ")", [v for _, params in parts for v in params]
+    return None, []
+
+
+def scan_needles(node: Optional[Node]) -> Optional[Tuple[bytes, ...]]:
+    """逐文件扫描时的字节预过滤（见 common.search_needles）；无法预过滤时返回 None"""
+    if isinstance(node, Term):
+        return search_needles(node.text)
+    if isinstance(node, And):
+        # 任取一个必要条件即可：选最长（通常最有区分度）的
+        candidates = [n for n in (scan_needles(op) for op in node.operands) if n is not None]
+        return max(candidates, key=lambda n: min(len(x) for x in n)) if candidates else None
+    if isinstance(node, Or):
+        parts = [scan_needles(op) for op in node.operands]
+        if any(p is None for p in parts):
+            return None
+        return tuple(sorted({needle for part in parts for needle in part}))
+    return None
+
+
+def session_conditions(query: SearchQuery, alias: str = "s") -> Tuple[List[str], list]:
+    """按会话摘要（session_summaries）跳过整个文件的 SQL 条件；返回 (条件列表, 参数)
+
+    时间条件用会话的时间范围判断：最后更新早于 after、开始时间不早于 before 的会话整体跳过。
+    """
+    conditions: List[str] = []
+    params: list = []
+    if query.projects:
+        parts = []
+        for project in query.projects:
+            pattern = "%" + project.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            parts.append(f"{alias}.project_name LIKE ? ESCAPE '\\' OR {alias}.project_path LIKE ? ESCAPE '\\'")
+            params += [pattern, pattern]
+        conditions.append("(" + " OR ".join(parts) + ")")
+    if query.tools:
+        # 只探测了开头和末尾的会话（complete = 0）工具列表不完整，不能据此跳过
+        conditions.append(
+            f"({alias}.complete = 0 OR EXISTS (SELECT 1 FROM json_each({alias}.tool_calls) AS t "
+            "WHERE lower(t.value) IN (SELECT value FROM json_each(?))))"
+        )
+        params.append(json.dumps(list(query.tools)))
+    if query.after is not None:
+        conditions.append(f"{alias}.updated_ts >= ?")
+        params.append(query.after)
+    if query.before is not None:
+        conditions.append(f"epoch({alias}.created_at) < ?")
+        params.append(query.before)
+    return conditions, params
+
+
+def scan_file_filter(query: SearchQuery, summary_index) -> Callable[[Path], bool]:
+    """逐文件扫描时按会话摘要和修改时间跳过文件，返回判断文件是否需要扫描的函数
+
+    summary_index 为同来源的 SummaryIndex，调用前应已刷新（如已调用 titles()）。
+    """
+    allowed = None
+    if query.has_session_filters:
+        conditions, params = session_conditions(query)
+        allowed = summary_index.select_paths(conditions, params, refresh=False)
+
+    def may_match(path: Path) -> bool:
+        if allowed is not None and str(path) not in allowed:
+            return False
+        if query.after is not None:
+            try:
+                return not query.skips_file(path.stat().st_mtime)
+            except OSError:
+                return False
+        return True
+
+    return may_match
@@ -0,0 +1,455 @@
+"""会话摘要索引 - 按 (path, mtime, size) 持久化每个会话文件的会话摘要
+
+只有新增或变更的文件才会重新解析，列表、项目和搜索标题都直接从索引读取。
+JSONL 文件还会保存读取进度和解析状态，追加写入后只解析新增的行。
+
+首次收录较大的 JSONL 文件时只探测开头和末尾：从开头读到标题等信息齐全为止，
+从末尾向前读取最后几条记录得到更新时间；此时消息数和工具列表只统计了读到的记录，
+由后台线程随后完整解析补全（补全后递增 generation，使 HTTP 缓存失效）。
+"""
+import base64
+import binascii
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+import metrics
+from cache_db import connection, ensure_schema, diff_files, file_signature, load_rows, read_connection
+from common import IncrementalParser, JsonlCheckpoint, JsonlStream, json_loads
+from models import Project
+from records import SummaryRecord
+from scan_pool import map_files
+
+
+SCHEMA_VERSION = 4
+
+_SCHEMA = [
+    """CREATE TABLE session_summaries (
+        path TEXT PRIMARY KEY,
+        source TEXT NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        session_id TEXT,
+        project_path TEXT,
+        project_name TEXT,
+        title TEXT,
+        created_at TEXT,
+        updated_at TEXT,
+        updated_ts REAL,
+        message_count INTEGER,
+        tool_calls TEXT,
+        inode INTEGER,
+        offset INTEGER,
+        head BLOB,
+        state TEXT,
+        complete INTEGER NOT NULL
+    )""",
+    # 会话列表按 (updated_ts, session_id) 倒序分页，按项目筛选时走第二个索引，翻到多深都只扫描一页的行
+    "CREATE INDEX idx_session_summaries_source ON session_summaries (source, updated_ts, session_id)",
+    "CREATE INDEX idx_session_summaries_project ON session_summaries (source, project_path, updated_ts, session_id)",
+]
+
+
+class SessionCursor(NamedTuple):
+    """会话列表的分页位置：上一页最后一个会话的 (更新时间戳, 会话 ID)，下一页从它之后开始
+
+    与列表的排序键一致，按元组比较即为列表顺序；对外编码为不透明的 URL 安全字符串。
+    """
+    updated_ts: float
+    session_id: str
+
+    @classmethod
+    def of(cls, session: SummaryRecord) -> "SessionCursor":
+        # 各来源时间戳的时区表示不一，统一按 Unix 时间
+        return cls(session.updated_at.timestamp(), session.id)
+
+    def encode(self) -> str:
+        raw = json.dumps([self.updated_ts, self.session_id], separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, text: str) -> "SessionCursor":
+        """解析 encode 的结果，格式不对时抛出 ValueError"""
+        try:
+            raw = base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+            updated_ts, session_id = json.loads(raw)
+        except (binascii.Error, TypeError, ValueError) as e:
+            raise ValueError(f"invalid session cursor: {text!r}") from e
+        if not isinstance(updated_ts, (int, float)) or isinstance(updated_ts, bool) or not isinstance(session_id, str):
+            raise ValueError(f"invalid session cursor: {text!r}")
+        return cls(float(updated_ts), session_id)
+
+
+# 不小于该大小的新文件只探测开头和末尾
+PROBE_MIN_SIZE = 256 * 1024
+# 探测开头时最多读取的字节数（读到标题等信息后即停止）
+PROBE_HEAD_BYTES = 64 * 1024
+# 从末尾向前读取的初始窗口；窗口内没有完整记录（最后一行很长）时逐步扩大
+PROBE_TAIL_BYTES = 16 * 1024
+PROBE_TAIL_MAX_BYTES = 4 * 1024 * 1024
+
+# 摘要探测：判断开头已读到的记录是否足够（如已有标题）
+HeadProbe = Callable[[Any], bool]
+
+_SUMMARY_COLUMNS = (
+    "session_id, project_path, project_name, title, created_at, updated_at, "
+    "message_count, tool_calls, source, complete"
+)
+
+
+def _summary_to_row(summary: Optional[SummaryRecord]) -> tuple:
+    """SummaryRecord -> 表字段；None 表示该文件没有可展示的会话"""
+    if summary is None:
+        return (None,) * 9
+    return (
+        summary.id,
+        summary.project_path,
+        summary.project_name,
+        summary.title,
+        summary.created_at.isoformat(),
+        summary.updated_at.isoformat(),
+        summary.updated_at.timestamp(),
+        summary.message_count,
+        json.dumps(summary.tool_calls),
+    )
+
+
+def _row_to_summary(row: tuple) -> SummaryRecord:
+    (
+        session_id, project_path, project_name, title, created_at, updated_at, message_count, tool_calls, source,
+        complete,
+    ) = row
+    return SummaryRecord(
+        id=session_id,
+        project_path=project_path,
+        project_name=project_name,
+        title=title,
+        created_at=datetime.fromisoformat(created_at),
+        updated_at=datetime.fromisoformat(updated_at),
+        message_count=message_count,
+        tool_calls=json.loads(tool_calls),
+        source=source,
+        incomplete=not complete,
+    )
+
+
+def _read_tail_records(f, start: int, size: int) -> List[dict]:
+    """读取 [start, size) 中末尾的若干完整记录"""
+    window = PROBE_TAIL_BYTES
+    while True:
+        tail_start = max(start, size - window)
+        f.seek(tail_start)
+        data = f.read(size - tail_start)
+        lines = data.split(b"\n")
+        if tail_start > start:
+            # 第一行可能不完整
+            lines = lines[1:]
+        records = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json_loads(line))
+            except ValueError:
+                continue
+        if records or tail_start == start or window >= PROBE_TAIL_MAX_BYTES:
+            return records
+        window *= 4
+
+
+def _probe_summary(builder: IncrementalParser, path: str, head_done: HeadProbe) -> Optional[SummaryRecord]:
+    """只读取文件开头和末尾生成摘要（消息数和工具列表只含读到的记录）"""
+    state = builder.new_state()
+    # 按读取的字节数限制开头的探测：预过滤跳过的行也计入，不会因为没有匹配的记录而读完整个文件
+    with JsonlStream(Path(path), prefilter=builder.prefilter, end=PROBE_HEAD_BYTES) as stream:
+        for record in stream:
+            builder.feed(state, record)
+            if head_done(state):
+                break
+    if stream.checkpoint is None:
+        return None
+    head_end = stream.checkpoint.offset
+
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size > head_end:
+                for record in _read_tail_records(f, head_end, size):
+                    builder.feed(state, record)
+    except OSError as e:
+        print(f"Error parsing {path}: {e}")
+    return builder.finish(state, Path(path))
+
+
+def _build_summary(
+    builder: Union[Callable[[Path], Optional[SummaryRecord]], IncrementalParser],
+    path: str,
+    previous: Optional[tuple],
+    head_probe: Optional[HeadProbe] = None,
+) -> tuple:
+    """解析单个文件，返回 (summary, inode, offset, head, state, complete)
+
+    previous 为上次保存的 (inode, offset, head, state)，可用时从断点继续解析；
+    没有断点且指定了 head_probe 时，较大的文件只探测开头和末尾（complete 为 False）。
+    模块级函数，可在扫描进程池中执行。
+    """
+    if not isinstance(builder, IncrementalParser):
+        return (builder(Path(path)), None, None, None, None, True)
+
+    checkpoint = None
+    state = None
+    if previous and previous[3] is not None:
+        checkpoint = JsonlCheckpoint(previous[0], previous[1], previous[2])
+        state = json_loads(previous[3])
+    elif head_probe is not None:
+        signature = file_signature(Path(path))
+        if signature is not None and signature[1] >= PROBE_MIN_SIZE:
+            return (_probe_summary(builder, path, head_probe), None, None, None, None, False)
+
+    with JsonlStream(Path(path), checkpoint, builder.prefilter) as stream:
+        if stream.reset or state is None:
+            state = builder.new_state()
+        for record in stream:
+            builder.feed(state, record)
+    checkpoint = stream.checkpoint
+    summary = builder.finish(state, Path(path))
+    if checkpoint is None:
+        return (summary, None, None, None, None, True)
+    return (summary, checkpoint.inode, checkpoint.offset, checkpoint.head, json.dumps(state), True)
+
+
+class SummaryIndex:
+    """单个来源（claude/codex/gemini）的摘要索引
+
+    Args:
+        source: 数据来源
+        list_files: 列出该来源所有会话文件
+        builder: 解析单个文件生成摘要的函数（无有效会话时返回 None）；
+            对追加写入的 JSONL 文件传入 IncrementalParser，状态需可 JSON 序列化
+        head_probe: 仅 IncrementalParser 可用；判断从开头读到的记录是否已足够（需为模块级函数），
+            指定后较大的新文件只探测开头和末尾，消息数和工具列表由后台补全
+    """
+
+    def __init__(
+        self,
+        source: str,
+        list_files: Callable[[], List[Path]],
+        builder: Union[Callable[[Path], Optional[SummaryRecord]], IncrementalParser],
+        head_probe: Optional[HeadProbe] = None,
+    ):
+        self.source = source
+        self.list_files = list_files
+        self.builder = builder
+        self.head_probe = head_probe
+        # 探测得到的摘要被补全的次数，用于 HTTP 缓存的版本号
+        self.generation = 0
+        self._completing = False
+        self._completion_lock = threading.Lock()
+        # 由后台监听维护时为 True，读取时不再在请求中刷新
+        self.watched = False
+        # 并发请求同时刷新时只有一个在解析，其余等待后直接使用结果
+        self._refresh_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _ensure_schema(self) -> None:
+        if not self._schema_ready:
+            ensure_schema("session_summaries", SCHEMA_VERSION, ["session_summaries"], _SCHEMA)
+            self._schema_ready = True
+
+    def diff(self, paths: Optional[List[Path]] = None) -> Tuple[Dict[str, Tuple[int, int]], List[str], List[str]]:
+        """对比文件签名，返回 (当前文件签名, 新增或变更的路径, 已删除的路径)
+
+        Args:
+            paths: 只检查这些已收录的文件（由后台监听传入）；为 None 时检查全部文件
+        """
+        self._ensure_schema()
+        if paths is None:
+            with metrics.phase("fs"):
+                return diff_files("session_summaries", self.source, self.list_files())
+        return diff_files("session_summaries", self.source, paths, indexed_only=True)
+
+    def refresh(self, paths: Optional[List[Path]] = None) -> None:
+        """只重新解析新增/变更的文件，并删除已不存在的文件（paths 含义同 diff）"""
+        with self._refresh_lock:
+            self._update(*self.diff(paths))
+
+    def update_paths(self, changed: List[str], removed: Optional[List[str]] = None) -> None:
+        """只更新指定的文件（如流式搜索逐个更新待索引文件的标题），与 refresh、后台补全互斥
+
+        等锁期间其他刷新可能已处理过这些文件：在锁内重新读取签名，只解析与表中记录仍不一致的文件。
+        """
+        with self._refresh_lock:
+            signatures = {}
+            for path in changed:
+                signature = file_signature(Path(path), fresh=True)
+                if signature is not None:
+                    signatures[path] = signature
+            indexed = load_rows("session_summaries", "mtime_ns, size", list(signatures))
+            self._update(
+                signatures,
+                [p for p, signature in signatures.items() if indexed.get(p) != signature],
+                (removed or []) + [p for p in changed if p not in signatures],
+            )
+
+    def _update(self, signatures: Dict[str, Tuple[int, int]], changed: List[str], removed: List[str]) -> None:
+        """按 diff 的结果更新索引（需持有 _refresh_lock）"""
+        if not changed and not removed:
+            return
+
+        previous: Dict[str, tuple] = {}
+        if isinstance(self.builder, IncrementalParser):
+            previous = load_rows("session_summaries", "inode, offset, head, state", changed)
+
+        # 解析在锁外进行（文件较多时分发到进程池），避免阻塞其他读请求
+        rows = []
+        built = map_files(
+            _build_summary, [(self.builder, path, previous.get(path), self.head_probe) for path in changed]
+        )
+        for path, (summary, inode, offset, head, state, complete) in zip(changed, built):
+            mtime_ns, size = signatures[path]
+            rows.append(
+                (path, self.source, mtime_ns, size) + _summary_to_row(summary)
+                + (inode, offset, head, state, int(complete))
+            )
+
+        with connection() as conn:
+            conn.executemany("DELETE FROM session_summaries WHERE path = ?", [(p,) for p in removed])
+            conn.executemany(
+                "INSERT OR REPLACE INTO session_summaries VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        if not all(row[-1] for row in rows):
+            self._start_completion()
+
+    def _start_completion(self) -> None:
+        """在后台线程中补全探测得到的摘要（同时只有一个线程）"""
+        with self._completion_lock:
+            if self._completing:
+                return
+            self._completing = True
+        threading.Thread(target=self._complete_pending, daemon=True).start()
+
+    def _complete_pending(self) -> None:
+        try:
+            # 一批中没有任何进展时停止（文件一直在变化），剩余的文件在下次刷新时从断点继续解析
+            while self.complete_pending():
+                pass
+        except Exception as e:
+            print(f"Error completing session summaries: {e}")
+        finally:
+            with self._completion_lock:
+                self._completing = False
+
+    def complete_pending(self, batch_size: int = 64) -> int:
+        """完整解析一批探测得到的摘要，返回有进展的文件数（已补全或首次保存了断点）
+
+        解析在锁外进行，已有断点的文件从断点继续。写入前文件未变化时补全摘要；
+        文件已变化（仍在追加写入）时只保存断点和解析状态——它们只覆盖已解析的字节，仍然有效，
+        refresh 检测到变化后从断点继续解析并补全，不再重新探测。
+        """
+        with connection() as conn:
+            pending = conn.execute(
+                "SELECT path, mtime_ns, size, inode, offset, head, state FROM session_summaries "
+                "WHERE source = ? AND complete = 0 LIMIT ?",
+                (self.source, batch_size)
+            ).fetchall()
+        if not pending:
+            return 0
+
+        built = map_files(_build_summary, [(self.builder, row[0], row[3:]) for row in pending])
+        completed = progressed = 0
+        for (path, mtime_ns, size, _, _, _, previous_state), (summary, inode, offset, head, state, _) in zip(
+            pending, built
+        ):
+            with self._refresh_lock, connection() as conn:
+                if file_signature(Path(path), fresh=True) == (mtime_ns, size):
+                    cursor = conn.execute(
+                        "UPDATE session_summaries SET session_id = ?, project_path = ?, project_name = ?, "
+                        "title = ?, created_at = ?, updated_at = ?, updated_ts = ?, message_count = ?, "
+                        "tool_calls = ?, inode = ?, offset = ?, head = ?, state = ?, complete = 1 "
+                        "WHERE path = ? AND mtime_ns = ? AND size = ? AND complete = 0",
+                        _summary_to_row(summary) + (inode, offset, head, state, path, mtime_ns, size)
+                    )
+                    completed += cursor.rowcount
+                elif state is not None:
+                    # 行可能已被 refresh 重新探测（签名不同），断点对当前文件同样有效
+                    cursor = conn.execute(
+                        "UPDATE session_summaries SET inode = ?, offset = ?, head = ?, state = ? "
+                        "WHERE path = ? AND complete = 0",
+                        (inode, offset, head, state, path)
+                    )
+                    if previous_state is None:
+                        progressed += cursor.rowcount
+        if completed:
+            self.generation += 1
+        return completed + progressed
+
+    def _prepare(self, refresh: bool) -> None:
+        """读取前准备：未由后台监听维护时在请求中刷新"""
+        if refresh and not self.watched:
+            self.refresh()
+        else:
+            self._ensure_schema()
+
+    def sessions(
+        self, refresh: bool = True, limit: Optional[int] = None, project: Optional[str] = None,
+        after: Optional[SessionCursor] = None,
+    ) -> List[SummaryRecord]:
+        """按更新时间倒序返回会话摘要
+
+        Args:
+            limit: 最多返回的条数，None 表示全部
+            project: 只返回该项目路径下的会话（精确匹配）
+            after: 只返回排在该位置之后的会话（键集分页，走索引定位，不跳过前面的行）
+        """
+        self._prepare(refresh)
+        where = "source = ? AND session_id IS NOT NULL"
+        params: list = [self.source]
+        if project:
+            where += " AND project_path = ?"
+            params.append(project)
+        if after is not None:
+            where += " AND (updated_ts, session_id) < (?, ?)"
+            params.extend(after)
+        sql = f"SELECT {_SUMMARY_COLUMNS} FROM session_summaries WHERE {where} ORDER BY updated_ts DESC, session_id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with read_connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [_row_to_summary(row) for row in rows]
+
+    def projects(self, refresh: bool = True) -> List[Project]:
+        """按项目聚合会话数量"""
+        self._prepare(refresh)
+        with read_connection() as conn:
+            rows = conn.execute(
+                "SELECT project_path, project_name, COUNT(*) AS session_count FROM session_summaries "
+                "WHERE source = ? AND session_id IS NOT NULL "
+                "GROUP BY project_path ORDER BY session_count DESC, project_path",
+                (self.source,)
+            ).fetchall()
+        return [Project(path=path, name=name, session_count=count) for path, name, count in rows]
+
+    def titles(self, refresh: bool = True) -> Dict[str, str]:
+        """文件路径 -> 会话标题，供搜索结果使用"""
+        self._prepare(refresh)
+        with read_connection() as conn:
+            rows = conn.execute(
+                "SELECT path, title FROM session_summaries WHERE source = ? AND session_id IS NOT NULL",
+                (self.source,)
+            ).fetchall()
+        return dict(rows)
+
+    def select_paths(self, conditions: List[str], params: list, refresh: bool = True) -> Set[str]:
+        """满足 SQL 条件（表别名 s）的会话文件路径，供搜索按会话元数据跳过整个文件"""
+        self._prepare(refresh)
+        where = " AND ".join(["s.source = ?", "s.session_id IS NOT NULL"] + conditions)
+        with read_connection() as conn:
+            rows = conn.execute(f"SELECT s.path FROM session_summaries AS s WHERE {where}", [self.source] + params)
+            return {row[0] for row in rows}
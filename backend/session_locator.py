@@ -0,0 +1,81 @@
+"""会话 ID -> 文件路径映射
+
+命中时只需一次 stat 确认文件仍存在；未命中时先比较目录 mtime，
+只有目录发生变化（新增/删除/重命名文件）才重新列目录建立映射。
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import metrics
+
+
+def walk_dirs(root: Path) -> List[Path]:
+    """列出 root 及其所有子目录（不 stat 文件）"""
+    if not root.exists():
+        return []
+    return [Path(dirpath) for dirpath, _, _ in os.walk(root)]
+
+
+def _mtime_ns(path: Path) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return -1
+
+
+class SessionLocator:
+    """单个来源的会话 ID -> 文件路径映射
+
+    Args:
+        list_dirs: 列出会话文件所在的所有目录（用于判断目录是否变化）
+        list_files: 列出所有会话文件（不需要排序）；ID 为文件名（不含扩展名），
+            重名时取最近修改的文件
+    """
+
+    def __init__(self, list_dirs: Callable[[], Iterable[Path]], list_files: Callable[[], Iterable[Path]]):
+        self.list_dirs = list_dirs
+        self.list_files = list_files
+        self._paths: Dict[str, Path] = {}
+        self._dir_signature: Optional[Tuple[Tuple[str, int], ...]] = None
+        # 由后台监听维护时为 True：未命中时不再比较目录签名，由监听在文件增删后重建
+        self.watched = False
+        self._lock = threading.Lock()
+
+    def _signature(self) -> Tuple[Tuple[str, int], ...]:
+        return tuple((str(d), _mtime_ns(d)) for d in self.list_dirs())
+
+    @metrics.timed("fs")
+    def rebuild(self) -> None:
+        """重新列目录建立映射"""
+        # 先记录目录签名再列文件：期间新增的文件会让下次签名比较失败并再次重建
+        signature = self._signature()
+        paths: Dict[str, Path] = {}
+        for path in self.list_files():
+            existing = paths.get(path.stem)
+            if existing is None or _mtime_ns(path) > _mtime_ns(existing):
+                paths[path.stem] = path
+        with self._lock:
+            self._paths = paths
+            self._dir_signature = signature
+
+    def find(self, session_id: str) -> Optional[Path]:
+        """查找会话文件；不存在时返回 None"""
+        with self._lock:
+            path = self._paths.get(session_id)
+            signature = self._dir_signature
+        if path is not None and path.exists():
+            metrics.count_cache("locator", "hit")
+            return path
+        metrics.count_cache("locator", "miss")
+        if self.watched and signature is not None:
+            return None
+        if signature is not None:
+            with metrics.phase("fs"):
+                unchanged = self._signature() == signature
+            if unchanged:
+                return None
+        self.rebuild()
+        with self._lock:
+            return self._paths.get(session_id)
@@ -1,46 +1,157 @@
-"""会话服务层：按来源聚合"""
-from typing import List, Optional
+"""会话服务层：按来源聚合
 
-from models import SessionSummary, SessionDetail, SearchResult, Project
+会话列表和详情返回 records 中的轻量记录，由 API 层对最终返回的部分转换为 Pydantic 模型。
+
+会话列表、搜索、项目和数据版本支持 source=all：各来源在独立的线程池中并发查询，
+会话列表和搜索结果按时间倒序做 k 路归并，只取前 limit 条（每个来源最多查询 limit 条）。
+会话列表按 SessionCursor 键集分页，游标同样下推到各来源，翻页不随页数变慢。
+"""
+import contextvars
+import heapq
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import metrics
+
+from models import MessagePage, SearchResult, Project
+from records import SummaryRecord, SessionRecord
+from compressor import compress_turns
+from session_index import SessionCursor
 from parser import (
     get_all_sessions as get_claude_sessions,
     get_session_detail as get_claude_session_detail,
+    get_session_messages as get_claude_session_messages,
+    get_session_tool_result as get_claude_session_tool_result,
+    get_session_turns as get_claude_session_turns,
     search_sessions as search_claude_sessions,
+    iter_search_sessions as iter_search_claude_sessions,
     get_all_projects as get_claude_projects,
+    find_session_file as find_claude_session_file,
+    PROJECTS_DIR, summary_index, search_index, usage_index, session_locator, detail_cache, message_index,
+    context_cache, corpus_version,
 )
 from codex_parser import (
     get_codex_sessions,
     get_codex_session_detail,
+    get_codex_session_messages,
+    get_codex_session_tool_result,
+    get_codex_session_turns,
     search_codex_sessions,
+    iter_search_codex_sessions,
     get_codex_projects,
+    find_codex_session_file,
+    CODEX_SESSIONS_DIR, codex_summary_index, codex_search_index, codex_usage_index,
+    codex_session_locator, codex_detail_cache, codex_message_index, codex_context_cache, codex_corpus_version,
 )
 from gemini_parser import (
     get_gemini_sessions,
     get_gemini_session_detail,
+    get_gemini_session_messages,
+    get_gemini_session_tool_result,
+    get_gemini_session_turns,
     search_gemini_sessions,
+    iter_search_gemini_sessions,
     get_gemini_projects,
+    find_gemini_session_file,
+    GEMINI_TMP_DIR, gemini_summary_index, gemini_search_index, gemini_usage_index, gemini_session_locator,
+    gemini_detail_cache,
+    gemini_corpus_version,
 )
+from corpus_version import CorpusVersion, Validators, combine_validators, file_validators
+from search_query import SOURCES, SearchQuery
+from watcher import WatchTarget
+
+T = TypeVar("T")
+
+ALL_SOURCES = "all"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
 
 
 def normalize_source(source: Optional[str]) -> str:
     if not source:
         return "claude"
     source = source.lower()
-    if source in ("claude", "codex", "gemini"):
+    if source in SOURCES:
         return source
     return "claude"
 
 
-def get_all_sessions(source: Optional[str] = None) -> List[SessionSummary]:
-    source = normalize_source(source)
-    if source == "codex":
-        return get_codex_sessions()
-    if source == "gemini":
-        return get_gemini_sessions()
-    return get_claude_sessions()
+def source_names(source: Optional[str]) -> List[str]:
+    """请求参数对应的来源列表：all 为全部来源，其他同 normalize_source"""
+    if source and source.lower() == ALL_SOURCES:
+        return list(SOURCES)
+    return [normalize_source(source)]
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(len(SOURCES), thread_name_prefix="session-viewer-sources")
+        return _executor
+
+
+def shutdown_source_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def map_sources(func: Callable[[str], T], names: List[str]) -> List[T]:
+    """对每个来源调用 func(name)，按 names 的顺序返回；多个来源时并发执行"""
+    if len(names) == 1:
+        return [func(names[0])]
+    futures = [
+        _get_executor().submit(contextvars.copy_context().run, metrics.collect, func, name) for name in names
+    ]
+    results = []
+    for future in futures:
+        result, timings = future.result()
+        metrics.merge(timings)
+        results.append(result)
+    return results
+
 
+_SESSIONS: Dict[str, Callable[..., List[SummaryRecord]]] = {
+    "claude": get_claude_sessions,
+    "codex": get_codex_sessions,
+    "gemini": get_gemini_sessions,
+}
 
-def get_session_detail(session_id: str, source: Optional[str] = None) -> Optional[SessionDetail]:
+
+def get_all_sessions(
+    source: Optional[str] = None, limit: Optional[int] = None, project: Optional[str] = None,
+    after: Optional[SessionCursor] = None,
+) -> List[SummaryRecord]:
+    """按更新时间倒序的会话摘要；limit / project / after 下推到各来源的摘要索引"""
+    names = source_names(source)
+    lists = map_sources(lambda name: _SESSIONS[name](limit=limit, project=project, after=after), names)
+    if len(lists) == 1:
+        return lists[0]
+    # 游标与摘要索引的 ORDER BY updated_ts DESC, session_id DESC 一致，各来源的结果可直接按它归并
+    return list(islice(heapq.merge(*lists, key=SessionCursor.of, reverse=True), limit))
+
+
+def get_session_page(
+    source: Optional[str] = None, limit: int = 100, project: Optional[str] = None,
+    after: Optional[SessionCursor] = None,
+) -> Tuple[List[SummaryRecord], Optional[SessionCursor]]:
+    """一页会话摘要和下一页的游标（没有下一页时为 None）；多查一条判断是否还有下一页"""
+    sessions = get_all_sessions(source, limit + 1, project, after)
+    if len(sessions) <= limit:
+        return sessions, None
+    return sessions[:limit], SessionCursor.of(sessions[limit - 1])
+
+
+def get_session_detail(session_id: str, source: Optional[str] = None) -> Optional[SessionRecord]:
     source = normalize_source(source)
     if source == "codex":
         return get_codex_session_detail(session_id)
@@ -49,19 +160,216 @@ def get_session_detail(session_id: str, source: Optional[str] = None) -> Optiona
     return get_claude_session_detail(session_id)
 
 
-def search_sessions(query: str, limit: int = 50, source: Optional[str] = None) -> List[SearchResult]:
+def get_session_messages(
+    session_id: str,
+    source: Optional[str] = None,
+    cursor: int = 0,
+    limit: int = 50,
+) -> Optional[MessagePage]:
     source = normalize_source(source)
     if source == "codex":
-        return search_codex_sessions(query, limit)
+        return get_codex_session_messages(session_id, cursor, limit)
     if source == "gemini":
-        return search_gemini_sessions(query, limit)
-    return search_claude_sessions(query, limit)
+        return get_gemini_session_messages(session_id, cursor, limit)
+    return get_claude_session_messages(session_id, cursor, limit)
 
 
-def get_all_projects(source: Optional[str] = None) -> List[Project]:
+def get_tool_result(session_id: str, tool_id: str, source: Optional[str] = None) -> Optional[str]:
+    """工具调用的完整结果；会话或工具结果不存在时返回 None"""
     source = normalize_source(source)
     if source == "codex":
-        return get_codex_projects()
+        return get_codex_session_tool_result(session_id, tool_id)
     if source == "gemini":
-        return get_gemini_projects()
-    return get_claude_projects()
+        return get_gemini_session_tool_result(session_id, tool_id)
+    return get_claude_session_tool_result(session_id, tool_id)
+
+
+def get_compressed_context(
+    session_id: str, source: Optional[str] = None, max_tokens: Optional[int] = None
+) -> Optional[str]:
+    """压缩后的会话上下文（Markdown），max_tokens 为 token 预算；会话不存在时返回 None
+
+    对话轮次由解析器直接从原始记录构建，不构建会话详情，也不读取工具结果。
+    """
+    source = normalize_source(source)
+    if source == "codex":
+        turns = get_codex_session_turns(session_id)
+    elif source == "gemini":
+        turns = get_gemini_session_turns(session_id)
+    else:
+        turns = get_claude_session_turns(session_id)
+    if turns is None:
+        return None
+    return compress_turns(turns, max_tokens)
+
+
+_SEARCH = {
+    "claude": search_claude_sessions,
+    "codex": search_codex_sessions,
+    "gemini": search_gemini_sessions,
+}
+
+_ITER_SEARCH = {
+    "claude": iter_search_claude_sessions,
+    "codex": iter_search_codex_sessions,
+    "gemini": iter_search_gemini_sessions,
+}
+
+
+def search_sources(query: SearchQuery, source: Optional[str] = None) -> List[str]:
+    """查询中的 source: 条件优先于请求参数"""
+    return list(query.sources) or source_names(source)
+
+
+def _result_order(result: SearchResult) -> tuple:
+    return result.timestamp.timestamp(), result.session_id
+
+
+def search_sessions(query: SearchQuery, limit: int = 50, source: Optional[str] = None) -> List[SearchResult]:
+    """单个来源按相关度排序；多个来源时各取前 limit 条，按时间倒序归并
+    （各来源的全文索引相互独立，相关度分数不可比较）"""
+    names = search_sources(query, source)
+    lists = map_sources(lambda name: _SEARCH[name](query, limit), names)
+    if len(lists) == 1:
+        return lists[0]
+    ordered = [sorted(results, key=_result_order, reverse=True) for results in lists]
+    return list(islice(heapq.merge(*ordered, key=_result_order, reverse=True), limit))
+
+
+logger = logging.getLogger(__name__)
+
+# 流式搜索中并发产出结果的来源线程结束时放入队列的标记
+_DONE = object()
+
+
+class SearchSourceError(Exception):
+    """某个来源的流式搜索失败；此前已产出的结果仍然有效，但不完整"""
+
+    def __init__(self, source: str):
+        super().__init__(f"Search failed for source {source}")
+        self.source = source
+
+
+def iter_search_sessions(query: SearchQuery, limit: int = 50, source: Optional[str] = None) -> Iterator[SearchResult]:
+    """流式搜索：每找到一条结果立即产出（顺序不保证按相关度）
+
+    多个来源时每个来源一个线程并发搜索，结果按到达顺序产出；取满 limit 条或调用方停止读取后，
+    各线程在产出下一条结果时退出。某个来源出错时抛出 SearchSourceError（其余来源随之停止）。
+    """
+    names = search_sources(query, source)
+    if len(names) == 1:
+        try:
+            yield from _ITER_SEARCH[names[0]](query, limit)
+        except Exception as e:
+            logger.exception("Error searching %s sessions", names[0])
+            raise SearchSourceError(names[0]) from e
+        return
+
+    results: "queue.Queue[object]" = queue.Queue()
+    stop = threading.Event()
+
+    def produce(name: str) -> None:
+        def run() -> None:
+            for result in _ITER_SEARCH[name](query, limit):
+                if stop.is_set():
+                    return
+                results.put(result)
+        try:
+            _, timings = metrics.collect(run)
+            results.put(timings)
+        except Exception:
+            logger.exception("Error searching %s sessions", name)
+            results.put(SearchSourceError(name))
+        finally:
+            results.put(_DONE)
+
+    # 流式响应可能持续很久，使用独立线程，不占用共享的来源线程池
+    for name in names:
+        threading.Thread(target=produce, args=(name,), daemon=True).start()
+    remaining, running = limit, len(names)
+    try:
+        while running and remaining > 0:
+            item = results.get()
+            if item is _DONE:
+                running -= 1
+            elif isinstance(item, SearchSourceError):
+                raise item
+            elif isinstance(item, metrics.PhaseTimings):
+                metrics.merge(item)
+            else:
+                yield item
+                remaining -= 1
+    finally:
+        stop.set()
+
+
+_PROJECTS: Dict[str, Callable[[], List[Project]]] = {
+    "claude": get_claude_projects,
+    "codex": get_codex_projects,
+    "gemini": get_gemini_projects,
+}
+
+_CORPUS_VERSIONS: Dict[str, CorpusVersion] = {
+    "claude": corpus_version,
+    "codex": codex_corpus_version,
+    "gemini": gemini_corpus_version,
+}
+
+
+def get_all_projects(source: Optional[str] = None) -> List[Project]:
+    """按会话数量倒序的项目列表；多个来源中路径相同的项目合并计数"""
+    lists = map_sources(lambda name: _PROJECTS[name](), source_names(source))
+    if len(lists) == 1:
+        return lists[0]
+    merged: Dict[str, Project] = {}
+    for project in (p for projects in lists for p in projects):
+        existing = merged.get(project.path)
+        if existing is None:
+            merged[project.path] = project.model_copy()
+        else:
+            existing.session_count += project.session_count
+    return sorted(merged.values(), key=lambda p: (-p.session_count, p.path))
+
+
+def get_corpus_validators(source: Optional[str] = None) -> Validators:
+    """来源数据版本对应的 HTTP 缓存校验值"""
+    parts = map_sources(lambda name: _CORPUS_VERSIONS[name].validators(), source_names(source))
+    return parts[0] if len(parts) == 1 else combine_validators(parts)
+
+
+def get_session_validators(session_id: str, source: Optional[str] = None) -> Optional[Validators]:
+    """会话文件对应的 HTTP 缓存校验值；会话不存在时返回 None"""
+    source = normalize_source(source)
+    if source == "codex":
+        session_file = find_codex_session_file(session_id)
+    elif source == "gemini":
+        session_file = find_gemini_session_file(session_id)
+    else:
+        session_file = find_claude_session_file(session_id)
+    if session_file is None:
+        return None
+    return file_validators(session_file)
+
+
+def get_watch_targets() -> List[WatchTarget]:
+    """后台监听的会话目录及其对应的索引和缓存"""
+    return [
+        WatchTarget(
+            PROJECTS_DIR,
+            [summary_index, search_index, usage_index, corpus_version],
+            [session_locator],
+            [detail_cache, message_index, context_cache],
+        ),
+        WatchTarget(
+            CODEX_SESSIONS_DIR,
+            [codex_summary_index, codex_search_index, codex_usage_index, codex_corpus_version],
+            [codex_session_locator],
+            [codex_detail_cache, codex_message_index, codex_context_cache],
+        ),
+        WatchTarget(
+            GEMINI_TMP_DIR,
+            [gemini_summary_index, gemini_search_index, gemini_usage_index, gemini_corpus_version],
+            [gemini_session_locator],
+            [gemini_detail_cache],
+        ),
+    ]
@@ -0,0 +1,28 @@
+"""测试环境：HOME 和缓存目录指向临时目录，关闭后台监听
+
+各来源的数据目录和缓存目录在导入后端模块时确定，因此需在导入任何测试模块之前设置。
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+TEST_ROOT = Path(tempfile.mkdtemp(prefix="session-viewer-test-"))
+
+os.environ["HOME"] = str(TEST_ROOT / "home")
+os.environ["SESSION_VIEWER_CACHE_DIR"] = str(TEST_ROOT / "cache")
+os.environ["SESSION_VIEWER_WATCH"] = "off"
+os.environ["SESSION_VIEWER_SCAN_WORKERS"] = "1"
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+
+@pytest.fixture(scope="session")
+def corpus() -> dict:
+    """在临时 HOME 下生成三个来源的小型会话数据，返回清单（含各来源的示例会话和工具结果）"""
+    from benchmarks.corpus import CorpusOptions, generate_corpus
+
+    return generate_corpus(Path(os.environ["HOME"]), CorpusOptions(sessions=12, messages=16, tool_result_size=800))
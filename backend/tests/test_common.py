@@ -0,0 +1,98 @@
+"""JsonlTailCache：追加写入时增量解析、解析不阻塞其他文件、解析出错时不留下半成品条目"""
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+from common import IncrementalParser, JsonlTailCache
+
+
+def _write(path: Path, *values: int) -> None:
+    with open(path, "a") as f:
+        for value in values:
+            f.write(json.dumps({"value": value}) + "\n")
+
+
+def _sum_parser(feed=None) -> IncrementalParser:
+    def default_feed(state, record):
+        state["total"] += record["value"]
+        state["records"] += 1
+
+    return IncrementalParser(lambda: {"total": 0, "records": 0}, feed or default_feed, lambda state, path: dict(state))
+
+
+def test_append_parses_only_new_lines(tmp_path: Path):
+    path = tmp_path / "a.jsonl"
+    _write(path, 1, 2)
+    cache = JsonlTailCache(_sum_parser(), max_files=2)
+    assert cache.get(path) == {"total": 3, "records": 2}
+    _write(path, 10)
+    assert cache.get(path) == {"total": 13, "records": 3}
+
+
+def test_lru_eviction(tmp_path: Path):
+    cache = JsonlTailCache(_sum_parser(), max_files=2)
+    paths = [tmp_path / f"{i}.jsonl" for i in range(3)]
+    for i, path in enumerate(paths):
+        _write(path, i)
+        cache.get(path)
+    assert list(cache._entries) == [str(p) for p in paths[1:]]
+
+
+def test_failed_parse_is_not_cached(tmp_path: Path):
+    path = tmp_path / "a.jsonl"
+    _write(path, 1, 2)
+    fail = [True]
+
+    def feed(state, record):
+        if fail[0]:
+            raise RuntimeError("boom")
+        state["total"] += record["value"]
+        state["records"] += 1
+
+    cache = JsonlTailCache(_sum_parser(feed))
+    with pytest.raises(RuntimeError):
+        cache.get(path)
+    assert not cache._entries
+
+    fail[0] = False
+    assert cache.get(path) == {"total": 3, "records": 2}
+    # 已缓存的条目解析新增的行出错时被丢弃，下次从头解析，不会重复累加
+    fail[0] = True
+    _write(path, 4)
+    with pytest.raises(RuntimeError):
+        cache.get(path)
+    assert not cache._entries
+    fail[0] = False
+    assert cache.get(path) == {"total": 7, "records": 3}
+
+
+def test_slow_parse_does_not_block_other_files(tmp_path: Path):
+    slow, fast = tmp_path / "slow.jsonl", tmp_path / "fast.jsonl"
+    _write(slow, 1)
+    _write(fast, 2)
+    started, release = threading.Event(), threading.Event()
+
+    def feed(state, record):
+        if record["value"] == 1:
+            started.set()
+            assert release.wait(5)
+        state["total"] += record["value"]
+        state["records"] += 1
+
+    cache = JsonlTailCache(_sum_parser(feed))
+    worker = threading.Thread(target=cache.get, args=(slow,))
+    worker.start()
+    results = []
+    try:
+        assert started.wait(5)
+        # slow.jsonl 仍在解析中，fast.jsonl 的请求不等它结束
+        reader = threading.Thread(target=lambda: results.append(cache.get(fast)))
+        reader.start()
+        reader.join(1)
+        assert results == [{"total": 2, "records": 1}]
+    finally:
+        release.set()
+        worker.join(5)
+    assert cache.get(slow) == {"total": 1, "records": 1}
@@ -0,0 +1,17 @@
+"""压缩上下文接口：token 预算的取值范围"""
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+
+
+@pytest.mark.parametrize("max_tokens, status", [(-1, 422), (-1000, 422), (1, 400), (255, 400)])
+def test_invalid_budget_is_rejected(max_tokens: int, status: int):
+    response = TestClient(app).get("/api/sessions/missing/context", params={"max_tokens": max_tokens})
+    assert response.status_code == status
+
+
+@pytest.mark.parametrize("max_tokens", [0, 256])
+def test_valid_budget_reaches_lookup(max_tokens: int):
+    response = TestClient(app).get("/api/sessions/missing/context", params={"max_tokens": max_tokens})
+    assert response.status_code == 404
@@ -0,0 +1,78 @@
+"""数据版本（ETag）：请求内与索引 diff 共用 stat，校验值包含响应格式版本"""
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+from cache_db import diff_files, file_signature, stat_scope
+from coalesce import run_coalesced
+from corpus_version import RESPONSE_VERSION, CorpusVersion, file_validators
+from session_index import SummaryIndex
+
+
+@pytest.fixture
+def files(tmp_path: Path):
+    paths = [tmp_path / "project" / f"{i}.jsonl" for i in range(5)]
+    paths[0].parent.mkdir()
+    for path in paths:
+        path.write_text("{}\n")
+    return paths
+
+
+@pytest.fixture
+def stat_calls(monkeypatch):
+    calls = []
+    real = os.stat
+
+    def counting(path, *args, **kwargs):
+        calls.append(str(path))
+        return real(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, "stat", counting)
+    return calls
+
+
+def test_validators_and_diff_share_stat(files, stat_calls, request):
+    version = CorpusVersion(f"etag-{request.node.name}", lambda: list(files))
+    # 建表，使 diff_files 可以查询（与摘要索引相同的表）
+    SummaryIndex(version.source, lambda: list(files), lambda path: None).refresh()
+    stat_calls.clear()
+    with stat_scope():
+        version.validators()
+        diff_files("session_summaries", version.source, files)
+    assert sorted(p for p in stat_calls if p.endswith(".jsonl")) == sorted(map(str, files))
+
+
+def test_scope_sees_first_stat_only(files):
+    path = files[0]
+    with stat_scope():
+        before = file_signature(path)
+        path.write_text("{}\n{}\n")
+        assert file_signature(path) == before
+        assert file_signature(path, fresh=True) != before
+    assert file_signature(path) != before
+
+
+def test_validators_change_with_files_and_carry_format_version(files, request):
+    version = CorpusVersion(f"etag-{request.node.name}", lambda: list(files))
+    first = version.validators()
+    assert f"-v{RESPONSE_VERSION}-" in first.etag
+    assert version.validators() == first
+    files[1].write_text("{}\n{}\n")
+    assert version.validators().etag != first.etag
+
+    assert file_validators(files[0]).etag.startswith(f'"v{RESPONSE_VERSION}-')
+    assert file_validators(files[0].with_name("missing.jsonl")) is None
+
+
+def test_scope_is_shared_with_coalesced_work(files, stat_calls):
+    """run_coalesced 在线程池中执行，需继承请求的 stat 缓存"""
+    async def handler():
+        with stat_scope():
+            file_signature(files[0])
+            await run_coalesced(("test-stat", str(files[0])), file_signature, files[0])
+
+    stat_calls.clear()
+    asyncio.run(handler())
+    assert stat_calls.count(str(files[0])) == 1
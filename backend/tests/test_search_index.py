@@ -0,0 +1,137 @@
+"""全文索引：BM25 排序、短词回退、增量索引，以及流式搜索逐个索引文件时更新会话标题"""
+import json
+import threading
+from pathlib import Path
+from typing import List
+
+import pytest
+
+import session_index
+from common import IncrementalParser
+from parser import SEARCH_PREFILTER, _feed_search, _finish_search, _new_search_state, summary_parser
+from search_index import SearchIndex
+from search_query import parse_query
+from session_index import SummaryIndex
+
+
+def _write_session(path: Path, title: str, answers: List[str]) -> None:
+    records = [{
+        "type": "user", "timestamp": "2026-01-01T00:00:00Z",
+        "message": {"role": "user", "content": title},
+    }]
+    for i, answer in enumerate(answers, 1):
+        records.append({
+            "type": "assistant", "timestamp": f"2026-01-01T00:00:{i:02d}Z",
+            "message": {"role": "assistant", "content": [{"type": "text", "text": answer}]},
+        })
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+@pytest.fixture
+def project_dir(tmp_path: Path) -> Path:
+    return tmp_path / "-tmp-viewer"
+
+
+@pytest.fixture
+def index(project_dir: Path, request) -> SearchIndex:
+    # 各测试的来源名不同，共用同一个缓存数据库时互不影响
+    source = f"search-{request.node.name}"
+    list_files = lambda: sorted(project_dir.glob("*.jsonl"))
+    summaries = SummaryIndex(source, list_files, summary_parser)
+    extractor = IncrementalParser(_new_search_state, _feed_search, _finish_search, prefilter=SEARCH_PREFILTER)
+    index = SearchIndex(source, list_files, extractor, summaries, title_ellipsis=False)
+    assert index.available
+    return index
+
+
+def test_streamed_results_have_titles(index: SearchIndex, project_dir: Path):
+    _write_session(project_dir / "a.jsonl", "first session", ["the cache database"])
+    _write_session(project_dir / "b.jsonl", "second session", ["another database query"])
+    results = list(index.iter_search(parse_query("database"), limit=10))
+    assert sorted((r.session_id, r.title) for r in results) == [("a", "first session"), ("b", "second session")]
+
+    # 文件重写后再次流式搜索：标题随摘要一起更新
+    _write_session(project_dir / "b.jsonl", "renamed session", ["database again"])
+    results = list(index.iter_search(parse_query("again"), limit=10))
+    assert [(r.session_id, r.title) for r in results] == [("b", "renamed session")]
+
+
+def test_update_paths_skips_files_already_refreshed(index: SearchIndex, project_dir: Path, monkeypatch):
+    path = project_dir / "a.jsonl"
+    _write_session(path, "first session", ["answer"])
+    summaries = index.summary_index
+    summaries.refresh()
+
+    parsed = []
+    map_files = session_index.map_files
+    monkeypatch.setattr(
+        session_index, "map_files", lambda func, items: (parsed.extend(items), map_files(func, items))[1]
+    )
+    # 等锁期间已被其他刷新处理：签名与表中记录一致，不再解析
+    summaries.update_paths([str(path)])
+    assert parsed == []
+
+    path.unlink()
+    summaries.update_paths([str(path)])
+    assert summaries.sessions(refresh=False) == []
+
+
+def test_update_paths_waits_for_refresh_lock(index: SearchIndex, project_dir: Path):
+    path = project_dir / "a.jsonl"
+    _write_session(path, "first session", ["answer"])
+    summaries = index.summary_index
+
+    with summaries._refresh_lock:
+        worker = threading.Thread(target=summaries.update_paths, args=([str(path)],))
+        worker.start()
+        worker.join(0.2)
+        assert worker.is_alive()
+        assert summaries.sessions(refresh=False) == []
+    worker.join(5)
+    assert [s.title for s in summaries.sessions(refresh=False)] == ["first session"]
+
+
+def _search(index: SearchIndex, text: str, limit: int = 10) -> List[str]:
+    return [r.matched_content for r in index.search(parse_query(text), limit)]
+
+
+def test_results_ranked_by_bm25(index: SearchIndex, project_dir: Path):
+    # 匹配度高的消息时间更早，排序不能只按时间
+    _write_session(project_dir / "a.jsonl", "first", [
+        "refactor refactor the parser",
+        "a long answer about many things " * 20 + "with one mention of refactor",
+    ])
+    _write_session(project_dir / "b.jsonl", "second", ["unrelated text"])
+    # 词频高、内容短的消息排在前面
+    first, second = _search(index, "refactor")
+    assert first == "refactor refactor the parser"
+    assert second.endswith("one mention of refactor")
+    assert _search(index, "refactor", limit=1) == ["refactor refactor the parser"]
+
+
+def test_short_terms_and_filters(index: SearchIndex, project_dir: Path):
+    _write_session(project_dir / "a.jsonl", "修复数据库索引", ["数据库已经修复"])
+    # 不足 3 个字符无法使用 trigram 索引，按 LIKE 查找
+    assert sorted(_search(index, "修复")) == ["修复数据库索引", "数据库已经修复"]
+    assert _search(index, "修复 role:assistant") == ["数据库已经修复"]
+    assert _search(index, "数据库 -已经") == ["修复数据库索引"]
+    assert _search(index, "数据库 project:other") == []
+
+
+def test_index_follows_appends_and_removals(index: SearchIndex, project_dir: Path):
+    path = project_dir / "a.jsonl"
+    _write_session(path, "first", ["initial answer"])
+    assert _search(index, "answer") == ["initial answer"]
+
+    with open(path, "a") as f:
+        f.write(json.dumps({
+            "type": "assistant", "timestamp": "2026-01-02T00:00:00Z",
+            "message": {"role": "assistant", "content": [{"type": "text", "text": "appended answer"}]},
+        }) + "\n")
+    assert sorted(_search(index, "answer")) == ["appended answer", "initial answer"]
+
+    path.unlink()
+    assert _search(index, "answer") == []
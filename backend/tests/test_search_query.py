@@ -0,0 +1,125 @@
+"""搜索查询语法：词法（取反、正则、引号）、优先级、过滤条件，以及下推的必要条件"""
+import time
+
+import pytest
+
+from search_query import (
+    And, Not, Or, Regex, Term, fts_match, like_conditions, make_snippet, parse_query, scan_needles,
+)
+
+
+@pytest.mark.parametrize("text, expr", [
+    ("hello", Term("hello")),
+    ("Hello World", And((Term("hello"), Term("world")))),
+    ('"Hello World"', Term("hello world")),
+    ("a OR b c", Or((Term("a"), And((Term("b"), Term("c")))))),
+    ("a AND b OR c", Or((And((Term("a"), Term("b"))), Term("c")))),
+    ("(a OR b) c", And((Or((Term("a"), Term("b"))), Term("c")))),
+    ("-a b", And((Not(Term("a")), Term("b")))),
+    ("NOT a", Not(Term("a"))),
+    # 以 -- 或非字母数字开头的参数按字面匹配，单横线参数需加引号
+    ("--force", Term("--force")),
+    ('"-rf"', Term("-rf")),
+    ("-", Term("-")),
+    ("a -", And((Term("a"), Term("-")))),
+])
+def test_expression(text, expr):
+    assert parse_query(text).expr == expr
+
+
+def test_negation_needs_word_char():
+    assert parse_query("-v").expr == Not(Term("v"))
+    assert parse_query("-_x").expr == Not(Term("_x"))
+    assert parse_query("-.env").expr == Term("-.env")
+
+
+def test_slashes_are_regex_only_with_metacharacters():
+    assert parse_query("/usr/bin/").expr == Term("/usr/bin/")
+    assert parse_query("/usr/bin").expr == Term("/usr/bin")
+    regex = parse_query("/fo+ba[rz]/").expr
+    assert isinstance(regex, Regex)
+    assert regex.pattern.search("xFOOBAZ") and not regex.pattern.search("fbar")
+
+
+def test_explicit_regex():
+    assert isinstance(parse_query("re:ab").expr, Regex)
+    quoted = parse_query('re:"(a|b) c"').expr
+    assert isinstance(quoted, Regex) and quoted.pattern.pattern == "(a|b) c"
+    # 不加引号时括号不属于正则
+    assert parse_query("re:a (b)").expr == And((parse_query("re:a").expr, Term("b")))
+    with pytest.raises(ValueError, match="正则"):
+        parse_query('re:"("')
+    with pytest.raises(ValueError, match="正则"):
+        parse_query("/a(/")
+
+
+def test_filters():
+    query = parse_query('fix project:"My Project" role:user tool:Edit,Write source:codex|gemini')
+    assert query.expr == Term("fix")
+    assert query.projects == ("my project",)
+    assert query.roles == ("user",)
+    assert query.tools == ("edit", "write")
+    assert query.sources == ("codex", "gemini")
+    assert parse_query("x source:all").sources == ("claude", "codex", "gemini")
+    # 只有过滤条件也是有效的查询
+    assert parse_query("tool:Bash").expr is None
+
+
+def test_time_filters():
+    query = parse_query("after:2026-01-01 after:2026-02-01 before:2026-03-01 x")
+    assert query.after == pytest.approx(time.mktime((2026, 2, 1, 0, 0, 0, 0, 0, -1)))
+    assert query.before == pytest.approx(time.mktime((2026, 3, 1, 0, 0, 0, 0, 0, -1)))
+    recent = parse_query("after:7d x").after
+    assert recent == pytest.approx(time.time() - 7 * 86400, abs=5)
+    assert query.accepts("user", query.after) and not query.accepts("user", query.before)
+    assert not query.accepts("user", None)
+
+
+@pytest.mark.parametrize("text, message", [
+    ("", "不完整"),
+    ("()", "不能为空"),
+    ("(a", None),
+    ("a)", "括号"),
+    ("a OR", "不完整"),
+    ("OR a", "OR"),
+    ("-tool:Edit", "不能取反"),
+    ("role:bot x", "角色"),
+    ("source:cursor x", "来源"),
+    ("after:yesterday x", "时间"),
+])
+def test_errors(text, message):
+    if message is None:
+        # 缺少的右括号按结尾补齐
+        assert parse_query(text).expr == Term("a")
+        return
+    with pytest.raises(ValueError, match=message):
+        parse_query(text)
+
+
+def test_matches():
+    query = parse_query('"cache db" -error OR /time ?out/')
+    assert query.matches("the Cache DB is ready")
+    assert not query.matches("cache db error")
+    assert query.matches("request timeout")
+
+
+def test_pushdown_is_a_necessary_condition():
+    assert fts_match(parse_query("hello world").expr) == '("hello") AND ("world")'
+    assert fts_match(parse_query('say "a \\"quoted\\" b"').expr) == '("say") AND ("a ""quoted"" b")'
+    # 不足 3 个字符、正则、取反都不能用 trigram 索引约束，OR 中任一分支不能约束时整体不能约束
+    assert fts_match(parse_query("数据").expr) is None
+    assert fts_match(parse_query("hello -world").expr) == '("hello")'
+    assert fts_match(parse_query("hello OR 数据").expr) is None
+
+    sql, params = like_conditions(parse_query("数据 OR 50%").expr, "c")
+    assert sql == "(c LIKE ? ESCAPE '\\' OR c LIKE ? ESCAPE '\\')"
+    assert params == ["%数据%", "%50\\%%"]
+    assert scan_needles(parse_query("/a.b/").expr) is None
+    assert scan_needles(parse_query("ab abcdef").expr) == scan_needles(parse_query("abcdef").expr)
+
+
+def test_snippet_centers_on_first_hit():
+    content = "x" * 100 + "needle" + "y" * 100
+    snippet = make_snippet(content, parse_query("needle"))
+    assert snippet == "..." + "x" * 50 + "needle" + "y" * 50 + "..."
+    assert make_snippet("short", parse_query("-absent")) == "short"
@@ -0,0 +1,57 @@
+"""流式搜索：某个来源出错时不静默结束，而是以错误结束流"""
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import session_service
+from main import app
+from models import SearchResult
+from search_query import parse_query
+from session_service import SearchSourceError, iter_search_sessions
+
+
+def _result(source: str) -> SearchResult:
+    return SearchResult(
+        session_id=f"{source}-1", project_name="viewer", title="title",
+        timestamp=datetime(2026, 1, 1, tzinfo=timezone.utc), matched_content="hit",
+        message_type="user", source=source,
+    )
+
+
+def _failing(query, limit):
+    raise RuntimeError("index corrupted")
+    yield  # 与各来源的 iter_search 一样是生成器，调用时不立即出错
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    """claude 正常返回一条结果，codex 出错，gemini 没有结果"""
+    monkeypatch.setattr(session_service, "_ITER_SEARCH", {
+        "claude": lambda query, limit: iter([_result("claude")]),
+        "codex": _failing,
+        "gemini": lambda query, limit: iter([]),
+    })
+
+
+def test_failing_source_raises(sources):
+    with pytest.raises(SearchSourceError) as excinfo:
+        list(iter_search_sessions(parse_query("hit"), 10, "all"))
+    assert excinfo.value.source == "codex"
+
+    with pytest.raises(SearchSourceError):
+        list(iter_search_sessions(parse_query("hit"), 10, "codex"))
+    assert [r.source for r in iter_search_sessions(parse_query("hit"), 10, "claude")] == ["claude"]
+
+
+def test_stream_ends_with_error(sources):
+    client = TestClient(app)
+    lines = client.get("/api/search/stream", params={"q": "hit", "source": "codex"}).text.splitlines()
+    assert [json.loads(line) for line in lines] == [{"error": "Search failed for source codex", "source": "codex"}]
+
+    events = client.get("/api/search/stream", params={"q": "hit", "source": "codex", "format": "sse"}).text
+    assert "event: error" in events and "event: done" not in events
+
+    events = client.get("/api/search/stream", params={"q": "hit", "source": "claude", "format": "sse"}).text
+    assert events.count("event: result") == 1 and events.endswith("event: done\ndata: {}\n\n")
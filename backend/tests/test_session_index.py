@@ -0,0 +1,125 @@
+"""摘要索引：较大文件的探测、后台补全，以及补全期间文件继续追加写入"""
+import json
+from pathlib import Path
+
+import pytest
+
+import session_index
+from common import JsonlStream
+from parser import _summary_head_done, summary_parser
+from session_index import PROBE_HEAD_BYTES, PROBE_MIN_SIZE, SummaryIndex
+
+FILLER = "x" * 1000
+
+
+def _user(index: int) -> dict:
+    return {
+        "type": "user", "timestamp": f"2026-01-01T00:{index // 60:02d}:{index % 60:02d}Z",
+        "message": {"role": "user", "content": f"question {index}"},
+    }
+
+
+def _assistant(index: int, tool: str = None) -> dict:
+    content = [{"type": "text", "text": FILLER}]
+    if tool:
+        content.append({"type": "tool_use", "id": f"tool-{index}", "name": tool, "input": {}})
+    return {
+        "type": "assistant", "timestamp": f"2026-01-01T01:{index // 60:02d}:{index % 60:02d}Z",
+        "message": {"role": "assistant", "content": content},
+    }
+
+
+def _append(path: Path, records: list) -> None:
+    with open(path, "a") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+@pytest.fixture
+def session_file(tmp_path: Path) -> Path:
+    """超过 PROBE_MIN_SIZE 的会话：只有中间的一条 assistant 消息调用了工具"""
+    path = tmp_path / "-tmp-project" / "probe-session.jsonl"
+    path.parent.mkdir()
+    records = [_user(0)] + [_assistant(i, "Bash" if i == 150 else None) for i in range(1, 300)]
+    _append(path, records)
+    assert path.stat().st_size >= PROBE_MIN_SIZE
+    return path
+
+
+@pytest.fixture
+def index(session_file: Path, monkeypatch) -> SummaryIndex:
+    index = SummaryIndex(f"probe-{session_file.parent.parent.name}", lambda: [session_file],
+                         summary_parser, head_probe=_summary_head_done)
+    # 由测试显式调用 complete_pending
+    monkeypatch.setattr(index, "_start_completion", lambda: None)
+    return index
+
+
+def _only_session(index: SummaryIndex):
+    sessions = index.sessions(refresh=False)
+    assert len(sessions) == 1
+    return sessions[0]
+
+
+def test_probe_then_complete(index: SummaryIndex):
+    index.refresh()
+    probed = _only_session(index)
+    assert probed.incomplete
+    assert probed.title == "question 0"
+    assert probed.message_count < 300
+    assert "Bash" not in probed.tool_calls
+
+    assert index.complete_pending() == 1
+    completed = _only_session(index)
+    assert not completed.incomplete
+    assert completed.message_count == 300
+    assert completed.tool_calls == ["Bash"]
+    assert index.complete_pending() == 0
+
+
+def test_completion_keeps_checkpoint_when_file_grows(index: SummaryIndex, session_file: Path, monkeypatch):
+    index.refresh()
+    assert _only_session(index).incomplete
+
+    # 完整解析结束后、写入前文件继续追加
+    map_files = session_index.map_files
+
+    def map_then_append(func, items):
+        results = list(map_files(func, items))
+        _append(session_file, [_user(300), _assistant(301, "Read")])
+        return iter(results)
+
+    monkeypatch.setattr(session_index, "map_files", map_then_append)
+    assert index.complete_pending() == 1
+    monkeypatch.setattr(session_index, "map_files", map_files)
+    assert _only_session(index).incomplete
+    # 已保存断点的行再次补全失败时不算进展，后台补全循环会停止
+    _append(session_file, [_assistant(302)])
+    monkeypatch.setattr(session_index, "map_files", map_then_append)
+    assert index.complete_pending() == 0
+    monkeypatch.setattr(session_index, "map_files", map_files)
+
+    # refresh 从断点继续解析（不重新探测），得到完整的摘要
+    index.refresh()
+    refreshed = _only_session(index)
+    assert not refreshed.incomplete
+    assert refreshed.message_count == 305
+    assert refreshed.tool_calls == ["Bash", "Read"]
+
+
+def test_append_to_completed_file_stays_complete(index: SummaryIndex, session_file: Path):
+    index.refresh()
+    index.complete_pending()
+    _append(session_file, [_user(300), _assistant(301, "Edit")])
+    index.refresh()
+    summary = _only_session(index)
+    assert not summary.incomplete
+    assert summary.message_count == 302
+    assert summary.tool_calls == ["Bash", "Edit"]
+
+
+def test_head_probe_limit_counts_skipped_lines(session_file: Path):
+    """预过滤跳过所有行时，探测开头也只读取 PROBE_HEAD_BYTES 左右"""
+    with JsonlStream(session_file, prefilter=(b"no-such-needle",), end=PROBE_HEAD_BYTES) as stream:
+        assert list(stream) == []
+    assert PROBE_HEAD_BYTES <= stream.checkpoint.offset < PROBE_HEAD_BYTES + 2 * len(FILLER)
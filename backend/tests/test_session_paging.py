@@ -0,0 +1,94 @@
+"""会话列表分页：SessionCursor 键集分页跨来源归并，翻页不重复、不遗漏"""
+from datetime import datetime, timezone
+from typing import List
+
+import pytest
+from fastapi.testclient import TestClient
+
+import session_service
+from main import app
+from records import SummaryRecord
+from session_index import SessionCursor
+from session_service import get_session_page
+
+
+def _pages(client: TestClient, params: dict) -> List[List[dict]]:
+    pages, cursor = [], None
+    while True:
+        response = client.get("/api/sessions", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return pages
+
+
+def _key(session: dict):
+    return datetime.fromisoformat(session["updated_at"]).timestamp(), session["id"]
+
+
+@pytest.mark.parametrize("limit", [1, 7, 36, 500])
+def test_paging_across_sources(corpus, limit):
+    client = TestClient(app)
+    everything = client.get("/api/sessions", params={"source": "all", "limit": 500}).json()
+    assert {s["source"] for s in everything} == {"claude", "codex", "gemini"}
+    assert [_key(s) for s in everything] == sorted(map(_key, everything), reverse=True)
+
+    pages = _pages(client, {"source": "all", "limit": limit})
+    assert all(0 < len(page) <= limit for page in pages)
+    assert [s["id"] for page in pages for s in page] == [s["id"] for s in everything]
+
+
+def test_paging_with_project_filter(corpus):
+    client = TestClient(app)
+    project = client.get("/api/sessions", params={"source": "all", "limit": 1}).json()[0]["project_path"]
+    everything = client.get("/api/sessions", params={"source": "all", "project": project, "limit": 500}).json()
+    pages = _pages(client, {"source": "all", "project": project, "limit": 2})
+    assert [s["id"] for page in pages for s in page] == [s["id"] for s in everything]
+    assert {s["project_path"] for s in everything} == {project}
+
+
+def _record(session_id: str, updated_at: datetime, source: str) -> SummaryRecord:
+    return SummaryRecord(session_id, "/tmp/viewer", "viewer", "title", updated_at, updated_at, 1, [], source)
+
+
+def test_ties_across_sources(monkeypatch):
+    """更新时间相同的会话按会话 ID 区分先后，分页边界落在相同时间上也不重复、不遗漏"""
+    same = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    later = datetime(2026, 1, 2, tzinfo=timezone.utc)
+    data = {
+        "claude": [_record("c2", later, "claude"), _record("c1", same, "claude"), _record("a", same, "claude")],
+        "codex": [_record("c3", same, "codex"), _record("b", same, "codex")],
+        "gemini": [],
+    }
+
+    def listing(name):
+        # 与摘要索引的查询一致：按 (updated_ts, session_id) 倒序，取游标之后的部分
+        def sessions(limit=None, project=None, after=None):
+            rows = [r for r in data[name] if after is None or SessionCursor.of(r) < after]
+            return rows[:limit]
+        return sessions
+
+    monkeypatch.setattr(session_service, "_SESSIONS", {name: listing(name) for name in data})
+    seen, after = [], None
+    while True:
+        page, after = get_session_page("all", 2, after=after)
+        seen.extend(r.id for r in page)
+        if after is None:
+            break
+    assert seen == ["c2", "c3", "c1", "b", "a"]
+
+
+def test_cursor_encoding():
+    cursor = SessionCursor(1767225600.5, "会话-1")
+    assert SessionCursor.decode(cursor.encode()) == cursor
+    assert "=" not in cursor.encode()
+    for text in ("", "not-base64!", SessionCursor(1.0, "x").encode()[:-2], "WyJ4IiwxXQ", "WzEsMl0"):
+        with pytest.raises(ValueError):
+            SessionCursor.decode(text)
+
+
+def test_invalid_cursor_is_rejected():
+    response = TestClient(app).get("/api/sessions", params={"source": "all", "cursor": "WzEsMl0"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
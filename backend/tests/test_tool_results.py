@@ -0,0 +1,78 @@
+"""工具结果接口：Range（按 UTF-8 字节）与 If-Range"""
+import pytest
+from fastapi.testclient import TestClient
+
+from main import _parse_range, app
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=5-", (5, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=90-500", (90, 99)),
+    ("bytes=100-", (100, 100)),
+    ("bytes=-0", (100, 100)),
+    ("bytes=5-2", None),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+    ("bytes=a-b", None),
+])
+def test_parse_range(header, expected):
+    assert _parse_range(header, 100) == expected
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    return TestClient(app)
+
+
+@pytest.fixture(params=["claude", "codex", "gemini"])
+def tool_result(request, corpus, client):
+    sample = corpus["samples"][request.param]
+    url = f"/api/sessions/{sample['session_id']}/tool-results/{sample['tool_id']}"
+    full = client.get(url, params={"source": request.param})
+    assert full.status_code == 200 and full.headers["accept-ranges"] == "bytes"
+    assert len(full.content) == sample["tool_result_size"]
+    return url, {"source": request.param}, full
+
+
+def test_range(tool_result, client):
+    url, params, full = tool_result
+    size = len(full.content)
+    response = client.get(url, params=params, headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == full.content[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{size}"
+
+    response = client.get(url, params=params, headers={"Range": "bytes=-5"})
+    assert response.status_code == 206 and response.content == full.content[-5:]
+
+    response = client.get(url, params=params, headers={"Range": f"bytes={size}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{size}"
+
+    # 多段 Range 不支持，返回完整内容
+    response = client.get(url, params=params, headers={"Range": "bytes=0-1,5-6"})
+    assert response.status_code == 200 and response.content == full.content
+
+
+def test_if_range(tool_result, client):
+    url, params, full = tool_result
+    etag, last_modified = full.headers["etag"], full.headers["last-modified"]
+    for validator in (etag, last_modified):
+        response = client.get(url, params=params, headers={"Range": "bytes=0-9", "If-Range": validator})
+        assert response.status_code == 206 and response.content == full.content[:10]
+
+    # 版本已变化：忽略 Range，返回完整内容
+    response = client.get(url, params=params, headers={"Range": "bytes=0-9", "If-Range": '"v0-stale"'})
+    assert response.status_code == 200 and response.content == full.content
+
+    response = client.get(url, params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_missing_tool_result(corpus, client):
+    sample = corpus["samples"]["claude"]
+    response = client.get(f"/api/sessions/{sample['session_id']}/tool-results/missing", params={"source": "claude"})
+    assert response.status_code == 404
@@ -0,0 +1,178 @@
+"""使用量聚合索引 - 持久化每个文件的按日/按模型部分聚合
+
+每个文件在 usage_partials 中保存 (日期, 模型) -> token/费用 的部分和；
+统计接口直接在 SQLite 中 GROUP BY 合并，不再读取任何会话文件。
+文件签名 (mtime_ns, size) 不变则跳过；追加写入的 JSONL 文件只解析新增的行，
+并把增量累加到已有的部分和上。
+"""
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+import metrics
+from cache_db import connection, ensure_schema, diff_files, load_rows, read_connection
+from common import IncrementalParser, JsonlCheckpoint, JsonlStream
+from scan_pool import map_files
+from usage_rollup import UsageRollup
+
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = [
+    """CREATE TABLE usage_files (
+        path TEXT PRIMARY KEY,
+        source TEXT NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        inode INTEGER,
+        offset INTEGER,
+        head BLOB
+    )""",
+    "CREATE INDEX idx_usage_files_source ON usage_files (source)",
+    """CREATE TABLE usage_partials (
+        path TEXT NOT NULL,
+        source TEXT NOT NULL,
+        date TEXT NOT NULL,
+        model TEXT NOT NULL,
+        input_tokens INTEGER NOT NULL,
+        output_tokens INTEGER NOT NULL,
+        cache_creation_tokens INTEGER NOT NULL,
+        cache_read_tokens INTEGER NOT NULL,
+        cost_usd REAL NOT NULL,
+        PRIMARY KEY (path, date, model)
+    )""",
+    "CREATE INDEX idx_usage_partials_source ON usage_partials (source, date)",
+]
+
+
+def _extract_usage(
+    extractor: Union[IncrementalParser, Callable[[Path], UsageRollup]],
+    path: str,
+    previous: Optional[tuple],
+) -> tuple:
+    """解析单个文件，返回 (是否需要清空旧部分和, 本次新增的聚合结果, inode, offset, head)
+
+    模块级函数，可在扫描进程池中执行。
+    """
+    if not isinstance(extractor, IncrementalParser):
+        return (True, extractor(Path(path)), None, None, None)
+
+    checkpoint = None
+    if previous and previous[1] is not None:
+        checkpoint = JsonlCheckpoint(*previous)
+    fresh = checkpoint is None
+    rollup = extractor.new_state()
+    with JsonlStream(Path(path), checkpoint, extractor.prefilter) as stream:
+        for record in stream:
+            extractor.feed(rollup, record)
+    checkpoint = stream.checkpoint
+    if checkpoint is None:
+        return (True, rollup, None, None, None)
+    return (stream.reset or fresh, rollup, checkpoint.inode, checkpoint.offset, checkpoint.head)
+
+
+class UsageIndex:
+    """单个来源的使用量聚合索引
+
+    Args:
+        source: 数据来源
+        list_files: 列出该来源所有需要统计的文件
+        extractor: 对 JSONL 文件传入 IncrementalParser（new_state 返回空的 UsageRollup，
+            feed 累加一条记录）；聚合结果可直接相加，因此只需保存读取进度。
+            对整体重写的文件传入函数 path -> UsageRollup
+        skip_unknown: 按模型统计时是否过滤 unknown 模型（见 detail_usage）
+    """
+
+    def __init__(
+        self,
+        source: str,
+        list_files: Callable[[], List[Path]],
+        extractor: Union[IncrementalParser, Callable[[Path], UsageRollup]],
+        skip_unknown: bool = True,
+    ):
+        self.source = source
+        self.list_files = list_files
+        self.extractor = extractor
+        self.skip_unknown = skip_unknown
+        # 由后台监听维护时为 True，读取时不再在请求中刷新
+        self.watched = False
+        # 并发请求同时刷新时只有一个在解析，其余等待后直接使用结果
+        self._refresh_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _ensure_schema(self) -> None:
+        if not self._schema_ready:
+            ensure_schema("usage_index", SCHEMA_VERSION, ["usage_partials", "usage_files"], _SCHEMA)
+            self._schema_ready = True
+
+    def refresh(self, paths: Optional[List[Path]] = None) -> None:
+        """对比文件签名，只重新统计新增/变更的文件，并删除已不存在文件的部分和
+
+        Args:
+            paths: 只检查这些已收录的文件（由后台监听传入）；为 None 时检查全部文件
+        """
+        with self._refresh_lock:
+            self._refresh(paths)
+
+    def _refresh(self, paths: Optional[List[Path]]) -> None:
+        self._ensure_schema()
+        if paths is None:
+            with metrics.phase("fs"):
+                signatures, changed, removed = diff_files("usage_files", self.source, self.list_files())
+        else:
+            signatures, changed, removed = diff_files("usage_files", self.source, paths, indexed_only=True)
+        if not changed and not removed:
+            return
+
+        previous: Dict[str, tuple] = {}
+        if isinstance(self.extractor, IncrementalParser):
+            previous = load_rows("usage_files", "inode, offset, head", changed)
+
+        with connection() as conn:
+            for path in removed:
+                conn.execute("DELETE FROM usage_partials WHERE path = ?", (path,))
+                conn.execute("DELETE FROM usage_files WHERE path = ?", (path,))
+
+        # 解析在锁外进行（文件较多时分发到进程池），每个文件单独提交
+        extracted = map_files(_extract_usage, [(self.extractor, path, previous.get(path)) for path in changed])
+        for path, (reset, rollup, inode, offset, head) in zip(changed, extracted):
+            mtime_ns, size = signatures[path]
+            with connection() as conn:
+                if reset:
+                    conn.execute("DELETE FROM usage_partials WHERE path = ?", (path,))
+                conn.executemany(
+                    "INSERT INTO usage_partials VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (path, date, model) DO UPDATE SET "
+                    "input_tokens = input_tokens + excluded.input_tokens, "
+                    "output_tokens = output_tokens + excluded.output_tokens, "
+                    "cache_creation_tokens = cache_creation_tokens + excluded.cache_creation_tokens, "
+                    "cache_read_tokens = cache_read_tokens + excluded.cache_read_tokens, "
+                    "cost_usd = cost_usd + excluded.cost_usd",
+                    [
+                        (path, self.source, date_str, model, *totals)
+                        for date_str, by_model in rollup.items()
+                        for model, totals in by_model.items()
+                    ]
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO usage_files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (path, self.source, mtime_ns, size, inode, offset, head)
+                )
+
+    def rollup(self) -> UsageRollup:
+        """合并该来源所有文件的部分和，返回一个整体的聚合结果"""
+        if self.watched:
+            self._ensure_schema()
+        else:
+            self.refresh()
+        merged: UsageRollup = {}
+        with read_connection() as conn:
+            rows = conn.execute(
+                "SELECT date, model, SUM(input_tokens), SUM(output_tokens), "
+                "SUM(cache_creation_tokens), SUM(cache_read_tokens), SUM(cost_usd) "
+                "FROM usage_partials WHERE source = ? GROUP BY date, model",
+                (self.source,)
+            ).fetchall()
+        for date_str, model, *totals in rows:
+            merged.setdefault(date_str, {})[model] = totals
+        return merged
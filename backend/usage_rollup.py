@@ -0,0 +1,160 @@
+"""使用量汇总 - 每个文件先聚合为 {日期: {模型: [input, output, cache_creation, cache_read, cost]}}，再合并出各类统计"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sys import intern
+from typing import Any, Dict, Iterable, List, Sequence, Union
+
+from models import TokenUsage, DailyUsage, UsageSummary, UsageDetail
+
+
+# 单个文件的聚合结果：{ "YYYY-MM-DD": { model: [input, output, cache_creation, cache_read, cost] } }
+UsageRollup = Dict[str, Dict[str, List[float]]]
+
+
+def new_usage_rollup() -> UsageRollup:
+    return {}
+
+
+def add_usage(
+    rollup: UsageRollup,
+    date_str: str,
+    model: str,
+    input_tokens: int,
+    output_tokens: int,
+    cache_creation: int,
+    cache_read: int,
+    cost: float,
+) -> None:
+    """累加一条使用记录（date_str 为本地日期）"""
+    by_model = rollup.setdefault(date_str, {})
+    totals = by_model.get(model)
+    if totals is None:
+        # 模型名在各日期、各文件间大量重复，驻留后共用一个字符串
+        by_model[intern(model)] = [input_tokens, output_tokens, cache_creation, cache_read, cost]
+        return
+    totals[0] += input_tokens
+    totals[1] += output_tokens
+    totals[2] += cache_creation
+    totals[3] += cache_read
+    totals[4] += cost
+
+
+def copy_usage_rollup(rollup: UsageRollup, _file: Any = None) -> UsageRollup:
+    """复制聚合结果，避免调用方读取时缓存仍在累加"""
+    return {date_str: {m: list(t) for m, t in by_model.items()} for date_str, by_model in rollup.items()}
+
+
+def _add_to_token_usage(usage: TokenUsage, totals: List[float]) -> None:
+    usage.input_tokens += totals[0]
+    usage.output_tokens += totals[1]
+    usage.cache_creation_tokens += totals[2]
+    usage.cache_read_tokens += totals[3]
+    usage.cost_usd += totals[4]
+
+
+def summarize_usage(rollups: Iterable[UsageRollup]) -> UsageSummary:
+    """合并各文件的聚合结果：今日、本月、总计"""
+    # 使用本地时区的今天日期
+    today = datetime.now().date().isoformat()
+    first_of_month = datetime.now().date().replace(day=1).isoformat()
+
+    today_usage = TokenUsage()
+    month_usage = TokenUsage()
+    total_usage = TokenUsage()
+
+    for rollup in rollups:
+        for date_str, by_model in rollup.items():
+            for totals in by_model.values():
+                _add_to_token_usage(total_usage, totals)
+                if date_str >= first_of_month:
+                    _add_to_token_usage(month_usage, totals)
+                if date_str == today:
+                    _add_to_token_usage(today_usage, totals)
+
+    for usage in (today_usage, month_usage, total_usage):
+        usage.total_tokens = (usage.input_tokens + usage.output_tokens +
+                              usage.cache_creation_tokens + usage.cache_read_tokens)
+
+    return UsageSummary(
+        today=today_usage,
+        this_month=month_usage,
+        total=total_usage
+    )
+
+
+def detail_usage(
+    rollups: Iterable[UsageRollup], days: int = 30, skip_unknown: Union[bool, Sequence[bool]] = True
+) -> UsageDetail:
+    """合并各文件的聚合结果：按日、按模型统计
+
+    Args:
+        rollups: 各文件的聚合结果
+        days: 统计天数
+        skip_unknown: 是否在模型列表和按模型统计中过滤 unknown 模型（其用量仍计入每日合计）；
+            合并多个来源时可按 rollups 的顺序逐个指定
+    """
+    rollups = list(rollups)
+    skips = [skip_unknown] * len(rollups) if isinstance(skip_unknown, bool) else list(skip_unknown)
+    daily_data: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
+        "models": set(),
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cache_creation_tokens": 0,
+        "cache_read_tokens": 0,
+        "cost_usd": 0.0
+    })
+
+    model_data: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cache_creation_tokens": 0,
+        "cache_read_tokens": 0,
+        "total_tokens": 0,
+        "cost_usd": 0.0
+    })
+
+    cutoff = (datetime.now().date() - timedelta(days=days)).isoformat()
+
+    for rollup, skip in zip(rollups, skips):
+        for date_str, by_model in rollup.items():
+            if date_str < cutoff:
+                continue
+            for model, totals in by_model.items():
+                listed = not (skip and model == "unknown")
+                targets = (daily_data[date_str], model_data[model]) if listed else (daily_data[date_str],)
+                for data in targets:
+                    data["input_tokens"] += totals[0]
+                    data["output_tokens"] += totals[1]
+                    data["cache_creation_tokens"] += totals[2]
+                    data["cache_read_tokens"] += totals[3]
+                    data["cost_usd"] += totals[4]
+                if listed:
+                    daily_data[date_str]["models"].add(model)
+
+    # 转换为列表并排序
+    daily_usage = []
+    for date_str, data in sorted(daily_data.items(), reverse=True):
+        total = (data["input_tokens"] + data["output_tokens"] +
+                 data["cache_creation_tokens"] + data["cache_read_tokens"])
+        models = sorted(data["models"])
+        daily_usage.append(DailyUsage(
+            date=date_str,
+            models=models,
+            input_tokens=data["input_tokens"],
+            output_tokens=data["output_tokens"],
+            cache_creation_tokens=data["cache_creation_tokens"],
+            cache_read_tokens=data["cache_read_tokens"],
+            total_tokens=total,
+            cost_usd=data["cost_usd"]
+        ))
+
+    by_model = {}
+    for model, data in model_data.items():
+        data["total_tokens"] = (data["input_tokens"] + data["output_tokens"] +
+                                data["cache_creation_tokens"] + data["cache_read_tokens"])
+        by_model[model] = data
+
+    return UsageDetail(
+        daily_usage=daily_usage,
+        by_model=by_model
+    )
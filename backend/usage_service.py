@@ -1,14 +1,31 @@
-"""使用量服务层：按来源聚合"""
-from typing import Optional
+"""使用量服务层：按来源聚合（source=all 时并发读取各来源的聚合结果后合并）"""
+from typing import Dict, List, Optional
 
 from models import UsageSummary, UsageDetail
-from parser import get_usage_summary as get_claude_usage_summary, get_usage_detail as get_claude_usage_detail
-from codex_parser import get_codex_usage_summary, get_codex_usage_detail
-from gemini_parser import get_gemini_usage_summary, get_gemini_usage_detail
-from session_service import normalize_source
+from parser import (
+    get_usage_summary as get_claude_usage_summary, get_usage_detail as get_claude_usage_detail, usage_index,
+)
+from codex_parser import get_codex_usage_summary, get_codex_usage_detail, codex_usage_index
+from gemini_parser import get_gemini_usage_summary, get_gemini_usage_detail, gemini_usage_index
+from session_service import map_sources, normalize_source, source_names
+from usage_index import UsageIndex
+from usage_rollup import UsageRollup, summarize_usage, detail_usage
+
+_USAGE_INDEXES: Dict[str, UsageIndex] = {
+    "claude": usage_index,
+    "codex": codex_usage_index,
+    "gemini": gemini_usage_index,
+}
+
+
+def _rollups(names: List[str]) -> List[UsageRollup]:
+    return map_sources(lambda name: _USAGE_INDEXES[name].rollup(), names)
 
 
 def get_usage_summary(source: Optional[str] = None) -> UsageSummary:
+    names = source_names(source)
+    if len(names) > 1:
+        return summarize_usage(_rollups(names))
     source = normalize_source(source)
     if source == "codex":
         return get_codex_usage_summary()
@@ -18,6 +35,10 @@ def get_usage_summary(source: Optional[str] = None) -> UsageSummary:
 
 
 def get_usage_detail(days: int = 30, source: Optional[str] = None) -> UsageDetail:
+    names = source_names(source)
+    if len(names) > 1:
+        # unknown 模型是否列出按来源各自决定（Gemini 列出），与单来源时一致
+        return detail_usage(_rollups(names), days, [_USAGE_INDEXES[name].skip_unknown for name in names])
     source = normalize_source(source)
     if source == "codex":
         return get_codex_usage_detail(days)
@@ -0,0 +1,213 @@
+"""后台文件监听 - 会话目录变化时在后台更新索引和缓存
+
+优先使用 watchdog（Linux 下基于 inotify，需另行 `pip install watchdog`），
+未安装时退化为定时轮询。变化的路径放入队列，由后台线程合并后只更新受影响的文件；
+新增/删除/重命名文件时重新扫描该来源。开始监听后，请求中不再遍历会话目录。
+
+环境变量：
+    SESSION_VIEWER_WATCH: auto（默认）/ inotify / poll / off
+    SESSION_VIEWER_POLL_INTERVAL: 轮询间隔秒数，默认 2
+"""
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+
+WATCH_MODE = os.environ.get("SESSION_VIEWER_WATCH", "auto").lower()
+POLL_INTERVAL = float(os.environ.get("SESSION_VIEWER_POLL_INTERVAL", "2"))
+
+# 收到变化后等待片刻，合并同一次写入产生的多个事件
+DEBOUNCE_SECONDS = 0.2
+
+
+class WatchTarget(NamedTuple):
+    """单个来源的监听配置
+
+    Attributes:
+        root: 会话根目录
+        indexes: 需要保持最新的索引，需提供 refresh(paths=None) 方法和 watched 属性
+        locators: 会话 ID -> 路径映射，文件增删后重建
+        caches: 内存缓存，文件删除后丢弃（需提供 discard(path) 方法）
+    """
+    root: Path
+    indexes: List[Any]
+    locators: List[Any] = []
+    caches: List[Any] = []
+
+
+# 队列元素：(路径, 是否为新增/删除/重命名)
+_Change = Tuple[Path, bool]
+
+
+class _EventHandler(FileSystemEventHandler):
+    """把 watchdog 事件转换为队列元素"""
+
+    def __init__(self, changes: "queue.Queue[Optional[_Change]]"):
+        self.changes = changes
+
+    def on_any_event(self, event) -> None:
+        if event.event_type in ("opened", "closed", "closed_no_write"):
+            return
+        if event.is_directory and event.event_type == "modified":
+            return
+        structural = event.event_type != "modified"
+        self.changes.put((Path(event.src_path), structural))
+        dest_path = getattr(event, "dest_path", None)
+        if dest_path:
+            self.changes.put((Path(dest_path), True))
+
+
+def _snapshot(root: Path) -> Dict[str, Tuple[int, int]]:
+    """轮询用：root 下所有文件的 (mtime_ns, size)"""
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files[path] = (st.st_mtime_ns, st.st_size)
+    return files
+
+
+class Watcher:
+    """后台监听器：监听线程（watchdog 或轮询）产生变化，处理线程更新索引
+
+    Args:
+        targets: 各来源的监听配置
+        mode: auto / inotify / poll
+        poll_interval: 轮询间隔秒数
+    """
+
+    def __init__(self, targets: List[WatchTarget], mode: str = WATCH_MODE, poll_interval: float = POLL_INTERVAL):
+        self.targets = targets
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.changes: "queue.Queue[Optional[_Change]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._observer = None
+        # 实际被监听的来源（watchdog 只能监听已存在的目录）
+        self._watched: List[WatchTarget] = []
+
+    def start(self) -> None:
+        use_observer = Observer is not None and self.mode in ("auto", "inotify")
+        if self.mode == "inotify" and Observer is None:
+            print("watchdog is not installed, falling back to polling")
+
+        if use_observer:
+            self._observer = Observer()
+            handler = _EventHandler(self.changes)
+            for target in self.targets:
+                if target.root.exists():
+                    self._observer.schedule(handler, str(target.root), recursive=True)
+                    self._watched.append(target)
+            self._observer.daemon = True
+            self._observer.start()
+        else:
+            # 轮询可以发现之后才创建的根目录
+            self._watched = list(self.targets)
+            self._spawn(self._poll_loop)
+
+        self._spawn(self._process_loop)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.changes.put(None)
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=2)
+        for thread in self._threads:
+            thread.join(timeout=2)
+        for target in self._watched:
+            for item in target.indexes + target.locators:
+                item.watched = False
+
+    def _spawn(self, run) -> None:
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _poll_loop(self) -> None:
+        snapshots = {str(t.root): _snapshot(t.root) for t in self._watched}
+        while not self._stop.wait(self.poll_interval):
+            for root, previous in snapshots.items():
+                current = _snapshot(Path(root))
+                for path, signature in current.items():
+                    old = previous.get(path)
+                    if old != signature:
+                        self.changes.put((Path(path), old is None))
+                for path in previous.keys() - current.keys():
+                    self.changes.put((Path(path), True))
+                snapshots[root] = current
+
+    def _process_loop(self) -> None:
+        # 先完整刷新一次，之后只处理变化（期间发生的变化已在队列中）
+        for target in self._watched:
+            try:
+                for index in target.indexes:
+                    index.refresh()
+                    index.watched = True
+                for locator in target.locators:
+                    locator.rebuild()
+                    locator.watched = True
+            except Exception as e:
+                print(f"Error building index for {target.root}: {e}")
+
+        while not self._stop.is_set():
+            change = self.changes.get()
+            if change is None:
+                break
+            time.sleep(DEBOUNCE_SECONDS)
+            batch = dict([change])
+            while True:
+                try:
+                    change = self.changes.get_nowait()
+                except queue.Empty:
+                    break
+                if change is None:
+                    self._stop.set()
+                    break
+                path, structural = change
+                batch[path] = batch.get(path, False) or structural
+            self._apply(batch)
+
+    def _apply(self, batch: Dict[Path, bool]) -> None:
+        for target in self._watched:
+            paths = [p for p in batch if p == target.root or target.root in p.parents]
+            if not paths:
+                continue
+            structural = any(batch[p] for p in paths)
+            try:
+                for index in target.indexes:
+                    # 新增文件需要按各索引自己的规则重新列文件；其余只检查已收录的文件
+                    index.refresh(None if structural else paths)
+                if structural:
+                    for locator in target.locators:
+                        locator.rebuild()
+                    for path in paths:
+                        if not path.exists():
+                            for cache in target.caches:
+                                cache.discard(path)
+            except Exception as e:
+                print(f"Error refreshing index for {target.root}: {e}")
+
+
+def start_watcher(targets: List[WatchTarget]) -> Optional[Watcher]:
+    """按 SESSION_VIEWER_WATCH 启动后台监听；off 时返回 None（请求中自行刷新）"""
+    if WATCH_MODE == "off":
+        return None
+    watcher = Watcher(targets)
+    watcher.start()
+    return watcher
@@ -2,22 +2,26 @@ import { useMemo } from 'react';
 
 interface HighlightTextProps {
   text: string;
-  highlight: string;
+  highlight: string | string[];
   className?: string;
 }
 
 export function HighlightText({ text, highlight, className }: HighlightTextProps) {
   const parts = useMemo(() => {
-    if (!highlight.trim()) {
+    const terms = (Array.isArray(highlight) ? highlight : [highlight]).filter((term) => term.trim());
+    if (!terms.length) {
       return [{ text, isHighlight: false }];
     }
 
-    const regex = new RegExp(`(${escapeRegExp(highlight)})`, 'gi');
+    // 长词优先，避免被其中包含的短词截断
+    const sorted = [...terms].sort((a, b) => b.length - a.length);
+    const regex = new RegExp(`(${sorted.map(escapeRegExp).join('|')})`, 'gi');
     const splitText = text.split(regex);
+    const lowered = new Set(terms.map((term) => term.toLowerCase()));
 
     return splitText.map((part, index) => ({
       text: part,
-      isHighlight: part.toLowerCase() === highlight.toLowerCase(),
+      isHighlight: lowered.has(part.toLowerCase()),
       key: index,
     }));
   }, [text, highlight]);
@@ -6,7 +6,8 @@ import {
   CheckCircle2, Copy, Check, ClipboardList, Zap, Globe, HelpCircle,
   ListTodo, FolderSearch, FileSearch, ExternalLink
 } from 'lucide-react';
-import type { Message, ToolCall } from '../lib/api';
+import type { Message, ToolCall, SourceFilter } from '../lib/api';
+import { getToolResult } from '../lib/api';
 import { formatDateTime, cn } from '../lib/utils';
 import { DiffViewer } from './DiffViewer';
 import { CodeViewer } from './CodeViewer';
@@ -33,9 +34,11 @@ function normalizePlanContent(content: string): string {
 
 interface MessageBubbleProps {
   message: Message;
+  sessionId?: string;
+  source?: SourceFilter;
 }
 
-export function MessageBubble({ message }: MessageBubbleProps) {
+export function MessageBubble({ message, sessionId, source }: MessageBubbleProps) {
   const isUser = message.type === 'user';
   const [copied, setCopied] = useState(false);
 
@@ -118,7 +121,7 @@ export function MessageBubble({ message }: MessageBubbleProps) {
         {message.tool_calls && message.tool_calls.length > 0 && (
           <div className="mt-3 space-y-2">
             {message.tool_calls.map((tool) => (
-              <ToolCallCard key={tool.id} tool={tool} />
+              <ToolCallCard key={tool.id} tool={tool} sessionId={sessionId} source={source} />
             ))}
           </div>
         )}
@@ -129,10 +132,34 @@ export function MessageBubble({ message }: MessageBubbleProps) {
 
 interface ToolCallCardProps {
   tool: ToolCall;
+  sessionId?: string;
+  source?: SourceFilter;
 }
 
-function ToolCallCard({ tool }: ToolCallCardProps) {
+function formatBytes(size: number): string {
+  if (size < 1024) return `${size} B`;
+  if (size < 1024 * 1024) return `${(size / 1024).toFixed(1)} KB`;
+  return `${(size / 1024 / 1024).toFixed(1)} MB`;
+}
+
+function ToolCallCard({ tool: original, sessionId, source }: ToolCallCardProps) {
   const [expanded, setExpanded] = useState(false);
+  // 详情中的结果只是预览，完整结果按需加载
+  const [full, setFull] = useState<string | null>(null);
+  const [loadingFull, setLoadingFull] = useState(false);
+  const tool: ToolCall = full !== null ? { ...original, result: full, result_truncated: false } : original;
+
+  const loadFull = async () => {
+    if (!sessionId || loadingFull) return;
+    setLoadingFull(true);
+    try {
+      setFull(await getToolResult(sessionId, original.id, source));
+    } catch (err) {
+      console.error(err);
+    } finally {
+      setLoadingFull(false);
+    }
+  };
   const hasResult = tool.result !== null && tool.result !== undefined;
 
   // 根据工具类型获取图标和颜色
@@ -487,6 +514,17 @@ function ToolCallCard({ tool }: ToolCallCardProps) {
               )}
             </>
           )}
+          {tool.result_truncated && sessionId && (
+            <button
+              onClick={loadFull}
+              disabled={loadingFull}
+              className="w-full px-3 py-1.5 text-xs text-blue-600 hover:bg-blue-50 border-t border-gray-200 rounded-b-lg disabled:text-gray-400"
+            >
+              {loadingFull
+                ? '加载中...'
+                : `加载完整结果${tool.result_size ? `（${formatBytes(tool.result_size)}）` : ''}`}
+            </button>
+          )}
         </div>
       )}
     </div>
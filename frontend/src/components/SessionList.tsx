@@ -57,9 +57,12 @@ function SessionItem({ session }: { session: SessionSummary }) {
               <Folder className="w-3 h-3" />
               {session.project_name}
             </span>
-            <span className="flex items-center gap-1">
+            <span
+              className="flex items-center gap-1"
+              title={session.incomplete ? '会话较大，消息数和工具列表仍在后台统计中' : undefined}
+            >
               <MessageSquare className="w-3 h-3" />
-              {session.message_count} 条消息
+              {session.message_count}{session.incomplete ? '+' : ''} 条消息
             </span>
             <span className="flex items-center gap-1">
               <Clock className="w-3 h-3" />
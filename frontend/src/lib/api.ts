@@ -16,13 +16,16 @@ export interface SessionSummary {
   message_count: number;
   tool_calls: string[];
   source?: SourceFilter;
+  incomplete?: boolean;
 }
 
 export interface ToolCall {
   id: string;
   name: string;
   input: Record<string, unknown>;
-  result?: string | null;
+  result?: string | null;  // 预览（最多 2000 字符）
+  result_size?: number | null;  // 完整结果的 UTF-8 字节数
+  result_truncated?: boolean;
 }
 
 export interface Message {
@@ -57,6 +60,18 @@ export interface SessionDetail {
   source?: SourceFilter;
 }
 
+export interface MessagePage {
+  messages: Message[];
+  next_cursor: string | null;
+  total: number;
+  session?: SessionDetail | null;
+}
+
+export interface SessionPage {
+  sessions: SessionSummary[];
+  next_cursor: string | null;
+}
+
 export interface SearchResult {
   session_id: string;
   project_name: string;
@@ -116,17 +131,22 @@ export interface SessionContext {
 }
 
 /**
- * 获取会话列表
+ * 获取一页会话列表（下一页的游标在响应头 X-Next-Cursor 中）
  */
-export async function getSessions(project?: string, source?: SourceFilter): Promise<SessionSummary[]> {
-  const params = new URLSearchParams();
+export async function getSessions(
+  project?: string,
+  source?: SourceFilter,
+  cursor?: string | null,
+  limit: number = 100
+): Promise<SessionPage> {
+  const params = new URLSearchParams({ limit: String(limit) });
   if (project) params.set('project', project);
   if (source) params.set('source', source);
+  if (cursor) params.set('cursor', cursor);
 
-  const url = `${API_BASE}/sessions${params.toString() ? '?' + params.toString() : ''}`;
-  const response = await fetch(url);
+  const response = await fetch(`${API_BASE}/sessions?${params.toString()}`);
   if (!response.ok) throw new Error('Failed to fetch sessions');
-  return response.json();
+  return { sessions: await response.json(), next_cursor: response.headers.get('X-Next-Cursor') };
 }
 
 /**
@@ -141,6 +161,35 @@ export async function getSession(id: string, source?: SourceFilter): Promise<Ses
   return response.json();
 }
 
+/**
+ * 获取工具调用的完整结果（详情中只带预览）
+ */
+export async function getToolResult(sessionId: string, toolId: string, source?: SourceFilter): Promise<string> {
+  const params = new URLSearchParams();
+  if (source) params.set('source', source);
+  const query = params.toString() ? '?' + params.toString() : '';
+  const response = await fetch(`${API_BASE}/sessions/${sessionId}/tool-results/${encodeURIComponent(toolId)}${query}`);
+  if (!response.ok) throw new Error('Failed to fetch tool result');
+  return response.text();
+}
+
+/**
+ * 分页获取会话消息（第一页附带会话信息）
+ */
+export async function getSessionMessages(
+  id: string,
+  source?: SourceFilter,
+  cursor?: string | null,
+  limit: number = 50
+): Promise<MessagePage> {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (source) params.set('source', source);
+  if (cursor) params.set('cursor', cursor);
+  const response = await fetch(`${API_BASE}/sessions/${id}/messages?${params.toString()}`);
+  if (!response.ok) throw new Error('Failed to fetch session messages');
+  return response.json();
+}
+
 /**
  * 搜索会话
  */
@@ -152,6 +201,43 @@ export async function searchSessions(query: string, source?: SourceFilter): Prom
   return response.json();
 }
 
+/**
+ * 流式搜索会话：每收到一条结果调用一次 onResult（NDJSON，每行一个结果）
+ * 某个来源出错时最后一行为 {"error": ...}，抛出异常（已收到的结果保留，但不完整）
+ */
+export async function streamSearchSessions(
+  query: string,
+  source: SourceFilter | undefined,
+  onResult: (result: SearchResult) => void,
+  signal?: AbortSignal
+): Promise<void> {
+  const params = new URLSearchParams({ q: query });
+  if (source) params.set('source', source);
+  const response = await fetch(`${API_BASE}/search/stream?${params.toString()}`, { signal });
+  if (!response.ok || !response.body) {
+    // 查询语法错误时返回 400，detail 为可直接展示的说明
+    const error = await response.json().catch(() => null);
+    throw new Error(typeof error?.detail === 'string' ? error.detail : 'Failed to search');
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value, { stream: !done });
+    const lines = buffer.split('\n');
+    buffer = done ? '' : lines.pop() ?? '';
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const item = JSON.parse(line);
+      if (typeof item.error === 'string') throw new Error(item.error);
+      onResult(item);
+    }
+    if (done) return;
+  }
+}
+
 /**
  * 获取项目列表
  */
@@ -5,6 +5,32 @@ export function cn(...inputs: ClassValue[]) {
   return twMerge(clsx(inputs));
 }
 
+/**
+ * 提取搜索查询中需要高亮的词（跳过运算符、字段过滤、取反的词和正则表达式）
+ */
+export function searchTerms(query: string): string[] {
+  const tokens = query.match(/[A-Za-z]+:"[^"]*"?|-?"[^"]*"?|[^\s()]+/g) ?? [];
+  const terms: string[] = [];
+  let negated = false;
+  for (const token of tokens) {
+    if (token === 'NOT') {
+      negated = true;
+      continue;
+    }
+    // 与后端规则一致：- 紧跟字母或数字才是排除（--flag 按字面匹配），斜杠内含正则元字符才是正则
+    const skip = negated
+      || token === 'AND' || token === 'OR'
+      || /^-[\p{L}\p{N}_]/u.test(token)
+      || /^(project|role|tool|after|before|source|re):/i.test(token)
+      || (token.length > 2 && token.startsWith('/') && token.endsWith('/') && /[.^$*+?{}[\]|()\\]/.test(token.slice(1, -1)));
+    negated = false;
+    if (skip) continue;
+    const term = token.startsWith('"') ? token.replace(/^"|"$/g, '') : token;
+    if (term) terms.push(term);
+  }
+  return terms;
+}
+
 /**
  * 格式化日期
  */
@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { FolderOpen, Search as SearchIcon } from 'lucide-react';
 import { SessionList } from '../components/SessionList';
@@ -11,16 +11,17 @@ import { UsageStats } from '../components/UsageStats';
 import {
   getSessions,
   getProjects,
-  searchSessions,
+  streamSearchSessions,
   type SessionSummary,
   type Project,
   type SearchResult,
   type SourceFilter,
 } from '../lib/api';
-import { cn, formatDate, getGroupId } from '../lib/utils';
+import { cn, formatDate, getGroupId, searchTerms } from '../lib/utils';
 
 const VIEW_MODE_KEY = 'claude-session-viewer-view-mode';
 const SOURCE_FILTER_KEY = 'claude-session-viewer-source';
+const PAGE_SIZE = 100;
 
 export function Home() {
   const navigate = useNavigate();
@@ -28,8 +29,17 @@ export function Home() {
   const [projects, setProjects] = useState<Project[]>([]);
   const [searchResults, setSearchResults] = useState<SearchResult[] | null>(null);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const sentinelRef = useRef<HTMLDivElement | null>(null);
+  // 切换来源或项目后丢弃旧列表尚未返回的请求
+  const requestIdRef = useRef(0);
   const [selectedProject, setSelectedProject] = useState<string | null>(null);
   const [searchQuery, setSearchQuery] = useState('');
+  const [searching, setSearching] = useState(false);
+  const [searchError, setSearchError] = useState<string | null>(null);
+  // 新的搜索开始时中止上一次仍在接收的结果流
+  const searchAbortRef = useRef<AbortController | null>(null);
   const [sourceFilter, setSourceFilter] = useState<SourceFilter>(() => {
     const saved = localStorage.getItem(SOURCE_FILTER_KEY);
     return (saved === 'claude' || saved === 'codex' || saved === 'gemini') ? saved : 'claude';
@@ -55,6 +65,7 @@ export function Home() {
     setSourceFilter(source);
     localStorage.setItem(SOURCE_FILTER_KEY, source);
     setSelectedProject(null);
+    searchAbortRef.current?.abort();
     setSearchResults(null);
     setSearchQuery('');
   }, []);
@@ -76,42 +87,93 @@ export function Home() {
   // 加载会话列表
   useEffect(() => {
     async function load() {
+      const requestId = ++requestIdRef.current;
       setLoading(true);
+      setNextCursor(null);
       try {
-        const [sessionsData, projectsData] = await Promise.all([
-          getSessions(selectedProject || undefined, sourceFilter),
+        const [page, projectsData] = await Promise.all([
+          getSessions(selectedProject || undefined, sourceFilter, null, PAGE_SIZE),
           getProjects(sourceFilter),
         ]);
-        setSessions(sessionsData);
+        if (requestId !== requestIdRef.current) return;
+        setSessions(page.sessions);
+        setNextCursor(page.next_cursor);
         setProjects(projectsData);
       } catch (error) {
         console.error('Failed to load data:', error);
       } finally {
-        setLoading(false);
+        if (requestId === requestIdRef.current) setLoading(false);
       }
     }
     load();
   }, [selectedProject, sourceFilter]);
 
-  // 搜索处理
+  const loadMore = useCallback(async () => {
+    if (!nextCursor || loadingMore) return;
+
+    const requestId = requestIdRef.current;
+    setLoadingMore(true);
+    try {
+      const page = await getSessions(selectedProject || undefined, sourceFilter, nextCursor, PAGE_SIZE);
+      if (requestId !== requestIdRef.current) return;
+      setSessions((prev) => [...prev, ...page.sessions]);
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      console.error('Failed to load more sessions:', error);
+    } finally {
+      if (requestId === requestIdRef.current) setLoadingMore(false);
+    }
+  }, [selectedProject, sourceFilter, nextCursor, loadingMore]);
+
+  // 滚动到列表底部附近时加载下一页
+  useEffect(() => {
+    const sentinel = sentinelRef.current;
+    if (!sentinel || !nextCursor || searchResults !== null) return;
+
+    const observer = new IntersectionObserver(
+      (entries) => {
+        if (entries[0]?.isIntersecting) loadMore();
+      },
+      { rootMargin: '800px 0px' }
+    );
+    observer.observe(sentinel);
+    return () => observer.disconnect();
+  }, [nextCursor, loadMore, searchResults]);
+
+  // 搜索处理：结果逐条到达，收到即显示
   const handleSearch = useCallback(async (query: string) => {
+    searchAbortRef.current?.abort();
     setSearchQuery(query);
+    setSearchError(null);
     if (!query.trim()) {
       setSearchResults(null);
+      setSearching(false);
       return;
     }
 
-    setLoading(true);
+    const controller = new AbortController();
+    searchAbortRef.current = controller;
+    setSearchResults([]);
+    setSearching(true);
     try {
-      const results = await searchSessions(query, sourceFilter);
-      setSearchResults(results);
+      await streamSearchSessions(
+        query,
+        sourceFilter,
+        (result) => setSearchResults((prev) => [...(prev ?? []), result]),
+        controller.signal
+      );
     } catch (error) {
-      console.error('Search failed:', error);
+      if (!controller.signal.aborted) {
+        console.error('Search failed:', error);
+        setSearchError(error instanceof Error ? error.message : String(error));
+      }
     } finally {
-      setLoading(false);
+      if (searchAbortRef.current === controller) setSearching(false);
     }
   }, [sourceFilter]);
 
+  useEffect(() => () => searchAbortRef.current?.abort(), []);
+
   return (
     <div className="min-h-screen bg-gray-50">
       {/* 头部 */}
@@ -165,7 +227,7 @@ export function Home() {
                 </button>
               </div>
               <div className="text-sm text-gray-500">
-                共 {sessions.length} 个会话
+                {nextCursor ? `已加载 ${sessions.length} 个会话` : `共 ${sessions.length} 个会话`}
               </div>
             </div>
           </div>
@@ -174,7 +236,7 @@ export function Home() {
           <div className="mt-4">
             <SearchBar
               onSearch={handleSearch}
-              placeholder="搜索会话内容、代码、关键词..."
+              placeholder='搜索会话内容、代码、关键词...（支持 "短语" OR -排除 /正则/ re:正则 project: role: tool: after: before:；--flag 按字面搜索，"-rf" 加引号）'
             />
           </div>
         </div>
@@ -256,17 +318,22 @@ export function Home() {
                   <h2 className="flex items-center gap-2 text-sm font-medium text-gray-700">
                     <SearchIcon className="w-4 h-4" />
                     搜索结果: "{searchQuery}"
-                    <span className="text-gray-400">({searchResults.length} 条)</span>
+                    <span className="text-gray-400">({searchResults.length} 条{searching ? '，搜索中…' : ''})</span>
+                    {searchError && searchResults.length > 0 && (
+                      <span className="text-red-500">结果不完整：{searchError}</span>
+                    )}
                   </h2>
                 </div>
-                {loading ? (
-                  <div className="flex items-center justify-center py-12">
-                    <div className="animate-spin rounded-full h-8 w-8 border-b-2 border-blue-600"></div>
-                  </div>
-                ) : searchResults.length === 0 ? (
-                  <div className="text-center py-12 text-gray-500">
-                    没有找到匹配的结果
-                  </div>
+                {searchResults.length === 0 ? (
+                  searching ? (
+                    <div className="flex items-center justify-center py-12">
+                      <div className="animate-spin rounded-full h-8 w-8 border-b-2 border-blue-600"></div>
+                    </div>
+                  ) : (
+                    <div className="text-center py-12 text-gray-500">
+                      {searchError ?? '没有找到匹配的结果'}
+                    </div>
+                  )
                 ) : (
                   <div className="divide-y divide-gray-200">
                     {searchResults.map((result, index) => (
@@ -296,7 +363,7 @@ export function Home() {
                         <div className="text-sm text-gray-900 line-clamp-2">
                           <HighlightText
                             text={result.matched_content}
-                            highlight={searchQuery}
+                            highlight={searchTerms(searchQuery)}
                           />
                         </div>
                       </div>
@@ -317,6 +384,11 @@ export function Home() {
                 <SessionList sessions={sessions} loading={loading} />
               </div>
             )}
+            {searchResults === null && nextCursor && (
+              <div ref={sentinelRef} className="flex justify-center py-4">
+                <div className="animate-spin rounded-full h-6 w-6 border-b-2 border-blue-600"></div>
+              </div>
+            )}
           </main>
         </div>
       </div>
@@ -1,40 +1,91 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef, useCallback } from 'react';
 import { useParams, Link, useSearchParams } from 'react-router-dom';
 import { ArrowLeft, Folder, Clock, FileText, MessageSquare } from 'lucide-react';
 import { MessageBubble } from '../components/MessageBubble';
 import { CopyContextButton } from '../components/CopyContextButton';
-import { getSession, type SessionDetail, type SourceFilter } from '../lib/api';
+import { getSessionMessages, type Message, type SessionDetail, type SourceFilter } from '../lib/api';
 import { formatDateTime, cn } from '../lib/utils';
 
+// 每页加载的消息数
+const PAGE_SIZE = 50;
+
 export function Session() {
   const { id } = useParams<{ id: string }>();
   const [searchParams] = useSearchParams();
   const source = (searchParams.get('source') as SourceFilter) || 'claude';
   const [session, setSession] = useState<SessionDetail | null>(null);
+  const [messages, setMessages] = useState<Message[]>([]);
+  const [total, setTotal] = useState(0);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [activeTab, setActiveTab] = useState<'messages' | 'files'>('messages');
+  const sentinelRef = useRef<HTMLDivElement | null>(null);
+  // 切换会话后丢弃旧会话尚未返回的请求
+  const requestIdRef = useRef(0);
 
   useEffect(() => {
     async function load() {
       if (!id) return;
 
+      const requestId = ++requestIdRef.current;
       setLoading(true);
       setError(null);
+      setMessages([]);
+      setNextCursor(null);
 
       try {
-        const data = await getSession(id, source);
-        setSession(data);
+        const page = await getSessionMessages(id, source, null, PAGE_SIZE);
+        if (requestId !== requestIdRef.current) return;
+        setSession(page.session ?? null);
+        setMessages(page.messages);
+        setTotal(page.total);
+        setNextCursor(page.next_cursor);
       } catch (err) {
+        if (requestId !== requestIdRef.current) return;
         setError('加载会话失败');
         console.error(err);
       } finally {
-        setLoading(false);
+        if (requestId === requestIdRef.current) setLoading(false);
       }
     }
     load();
   }, [id, source]);
 
+  const loadMore = useCallback(async () => {
+    if (!id || !nextCursor || loadingMore) return;
+
+    const requestId = requestIdRef.current;
+    setLoadingMore(true);
+    try {
+      const page = await getSessionMessages(id, source, nextCursor, PAGE_SIZE);
+      if (requestId !== requestIdRef.current) return;
+      setMessages((prev) => [...prev, ...page.messages]);
+      setTotal(page.total);
+      setNextCursor(page.next_cursor);
+    } catch (err) {
+      console.error(err);
+    } finally {
+      if (requestId === requestIdRef.current) setLoadingMore(false);
+    }
+  }, [id, source, nextCursor, loadingMore]);
+
+  // 滚动到列表底部附近时加载下一页
+  useEffect(() => {
+    const sentinel = sentinelRef.current;
+    if (!sentinel || !nextCursor || activeTab !== 'messages') return;
+
+    const observer = new IntersectionObserver(
+      (entries) => {
+        if (entries[0]?.isIntersecting) loadMore();
+      },
+      { rootMargin: '800px 0px' }
+    );
+    observer.observe(sentinel);
+    return () => observer.disconnect();
+  }, [nextCursor, loadMore, activeTab]);
+
   if (loading) {
     return (
       <div className="min-h-screen bg-gray-50 flex items-center justify-center">
@@ -88,7 +139,7 @@ export function Session() {
               </span>
               <span className="flex items-center gap-1">
                 <MessageSquare className="w-4 h-4" />
-                {session.messages.length} 条消息
+                {total} 条消息
               </span>
             </div>
           </div>
@@ -136,9 +187,14 @@ export function Session() {
       <main className="max-w-4xl mx-auto px-4 py-6">
         {activeTab === 'messages' ? (
           <div className="space-y-6">
-            {session.messages.map((message) => (
-              <MessageBubble key={message.uuid} message={message} />
+            {messages.map((message, index) => (
+              <MessageBubble key={message.uuid || index} message={message} sessionId={id} source={source} />
             ))}
+            {nextCursor && (
+              <div ref={sentinelRef} className="flex justify-center py-4">
+                <div className="animate-spin rounded-full h-6 w-6 border-b-2 border-blue-600"></div>
+              </div>
+            )}
           </div>
         ) : (
           <FileChangesPanel changes={session.file_changes} />